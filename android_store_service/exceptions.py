@@ -18,17 +18,45 @@ import json
 from json import JSONDecodeError
 
 from googleapiclient.errors import HttpError
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import (
+    LengthRequired,
+    NotFound,
+    ServiceUnavailable,
+    TooManyRequests,
+)
 
 
 class NotFoundException(NotFound):
     pass
 
 
+class TooManyRequestsException(TooManyRequests):
+    pass
+
+
+class ServiceUnavailableException(ServiceUnavailable):
+    pass
+
+
+class LengthRequiredException(LengthRequired):
+    pass
+
+
 class BadRequestException(Exception):
     pass
 
 
+class TrackPromotionException(Exception):
+    def __init__(self, errors):
+        """
+        Raised when some tracks of an edit could not be updated.
+
+        :param errors: HttpError of each track that failed, by track
+        """
+        super().__init__(f"Failed to update tracks: {', '.join(errors)}")
+        self.errors = errors
+
+
 def parse_httperror(error: HttpError) -> dict:
     try:
         return json.loads(error.content)
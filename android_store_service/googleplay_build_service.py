@@ -13,16 +13,102 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+import contextlib
+import logging
+import threading
+import time
 
-import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUpload
 
-from googleapiclient.discovery import build
-from oauth2client.service_account import ServiceAccountCredentials
+from android_store_service import exceptions
+from android_store_service.utils import (
+    cache_utils,
+    circuit_breaker,
+    concurrency_utils,
+    config_utils,
+    credentials_utils,
+    discovery_utils,
+    edit_pool,
+    http_transport,
+    media_uploads,
+    metrics_utils,
+    rate_limiter,
+    retry_utils,
+    track_cache,
+)
 
-from android_store_service.utils import config_utils
+_services = None
+_services_lock = threading.Lock()
 
-_NUM_RETRIES = 3
+_edits = None
+_edits_lock = threading.Lock()
+
+_commit_hooks = []
+
+
+def on_commit(hook):
+    """
+    Registers hook to be called with the package name after an edit of the
+    package is committed. Returns hook, so that it can be used as a decorator.
+    """
+    _commit_hooks.append(hook)
+    return hook
+
+
+@on_commit
+def _invalidate_edits(package_name):
+    edit_pool.bump_generation(package_name)
+    _edit_pool().clear(package_name)
+
+
+on_commit(track_cache.invalidate)
+
+
+def _is_rejected_edit(error):
+    """
+    Returns whether Play rejected the edit of a request with error, rather
+    than the request being throttled or not allowed.
+    """
+    status = error.resp.status
+    return 400 <= status < 500 and status not in (403, 429)
+
+
+def _edit_pool():
+    global _edits
+    with _edits_lock:
+        if _edits is None:
+            _edits = edit_pool.EditPool(
+                config_utils.get_config("EDIT_POOL_SIZE", 0),
+                config_utils.get_config("EDIT_POOL_PACKAGES", 32),
+                config_utils.get_config("EDIT_POOL_EXPIRY_MARGIN", 600),
+            )
+        return _edits
+
+
+def invalidate_services(package_name=None):
+    """
+    Drops pooled publisher services, only those of package_name if given.
+
+    Services built from a secret that has since changed on disk are rebuilt
+    anyway. This makes a rotation take effect for all packages at once.
+    """
+    services = _service_pool()
+    for key in services.keys():
+        if package_name is None or key[0] == package_name:
+            services.pop(key)
+
+
+def _service_pool():
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = cache_utils.TTLCache(
+                config_utils.get_config("PUBLISHER_SERVICE_POOL_SIZE", 32),
+                config_utils.get_config("PUBLISHER_SERVICE_TTL", 3600),
+            )
+        return _services
 
 
 class GooglePlayBuildService:
@@ -35,15 +121,38 @@ class GooglePlayBuildService:
             False if data will be edited (e.g. upload binary).
         """
         self.package_name = package_name
+        self.viewer = viewer
+        self.secret = None
         self.service = self.build_publisher_service(viewer)
+        self._pooled_edits = set()
 
     def build_publisher_service(self, viewer):
-        scopes = ["https://www.googleapis.com/auth/androidpublisher"]
-        secret = self._select_secret(viewer)
-        secrets = json.loads(config_utils.get_secret(secret))
-        credentials = ServiceAccountCredentials.from_json_keyfile_dict(secrets, scopes)
-        http = credentials.authorize(httplib2.Http())
-        return build("androidpublisher", "v3", http=http, cache_discovery=False)
+        """
+        Returns a publisher service for the package, reusing the one pooled for
+        the package and role unless its secret has changed since.
+
+        Services are shared between threads, their requests go through the
+        thread-safe connection pool of http_transport.
+        """
+        secret = self.secret = self._select_secret(viewer)
+        version = config_utils.secret_version(secret)
+        key = (self.package_name, viewer)
+        services = _service_pool()
+        pooled = services.get(key)
+        if pooled is not None and pooled[:2] == (secret, version):
+            metrics_utils.ffwd_metric("publisher-service-pool", 1, {"result": "hit"})
+            return pooled[2]
+
+        metrics_utils.ffwd_metric("publisher-service-pool", 1, {"result": "miss"})
+        logging.info(f"Building publisher service for {self.package_name}")
+        service = self._build_service(secret)
+        services.set(key, (secret, version, service))
+        return service
+
+    def _build_service(self, secret):
+        credentials = credentials_utils.get_credentials(secret)
+        http = credentials.authorize(http_transport.get_http())
+        return build_from_document(discovery_utils.load_document(), http=http)
 
     def _select_secret(self, viewer):
         if config_utils.secret_exists(self.package_name):
@@ -56,91 +165,255 @@ class GooglePlayBuildService:
             return "googleplayapiaccess"
 
     def create_edit(self):
+        return self._insert_edit()[0]
+
+    def checkout_edit(self):
+        """
+        Returns the id of an open edit for the exclusive use of the caller,
+        taken from the edit pool if one is ready.
+
+        The pool is refilled once an edit of the package is committed, as
+        committing deletes the other open edits of the package.
+        """
+        key = (self.package_name, self.viewer, self.secret)
+        edit_id = _edit_pool().checkout(key)
+        result = "miss" if edit_id is None else "hit"
+        metrics_utils.ffwd_metric("edit-pool", 1, {"result": result})
+        if edit_id is None:
+            return self.create_edit()
+        self._pooled_edits.add(edit_id)
+        return edit_id
+
+    def replace_rejected_edit(self, edit_id, error):
+        """
+        Returns the id of a fresh edit to retry with if edit_id was taken from
+        the edit pool and Play rejected it with error, e.g. because another
+        client committed an edit of the package since. Returns None otherwise.
+        """
+        if edit_id not in self._pooled_edits or not _is_rejected_edit(error):
+            return None
+        self._pooled_edits.discard(edit_id)
+        logging.warning(f"Replacing edit {edit_id} of {self.package_name}: {error}")
+        metrics_utils.ffwd_metric("edit-pool-rejected", 1)
+        # The other edits pooled with it are most likely deleted as well.
+        pool = _edit_pool()
+        pool.clear(self.package_name)
+        pool.refill((self.package_name, self.viewer, self.secret), self._insert_edit)
+        return self.create_edit()
+
+    def shared_edit(self):
+        """
+        Returns the id of an open edit that callers only reading from the
+        package share, until it expires or an edit of the package is committed.
+        """
+        pool = _edit_pool()
+        key = (self.package_name, self.viewer, self.secret)
+        edit_id = pool.peek(key)
+        if edit_id is not None:
+            metrics_utils.ffwd_metric("edit-pool", 1, {"result": "hit"})
+            return edit_id
+
+        metrics_utils.ffwd_metric("edit-pool", 1, {"result": "miss"})
+        edit_generation = edit_pool.generation(self.package_name)
+        edit_id, expires_at = self._insert_edit()
+        pool.put(key, edit_id, expires_at, edit_generation)
+        return edit_id
+
+    def _insert_edit(self):
+        """Creates an edit, returning its id and expiry time."""
         edit_request = self.service.edits().insert(
             body={}, packageName=self.package_name
         )
-        result = edit_request.execute(num_retries=_NUM_RETRIES)
-        return result["id"]
+        result = self._execute(edit_request, "edits.insert")
+        expires_at = int(result.get("expiryTimeSeconds", 0)) or time.time() + 3600
+        return result["id"], expires_at
 
     def promote_to_track(self, edit_id, version_codes, track):
         body = {
             "track": track,
             "releases": [{"status": "completed", "versionCodes": version_codes}],
         }
-        return (
+        update_request = (
             self.service.edits()
             .tracks()
             .update(
                 editId=edit_id, track=track, packageName=self.package_name, body=body
             )
-            .execute(num_retries=_NUM_RETRIES)
         )
+        return self._execute(update_request, "edits.tracks.update")
+
+    def promote_to_tracks(self, edit_id, version_codes, tracks):
+        """
+        Promotes version_codes to each of tracks, updating up to
+        TRACK_CONCURRENCY tracks at once.
+
+        All tracks are attempted. If any failed, a TrackPromotionException with
+        the error of each failed track is raised.
+        """
+
+        def promote(track):
+            try:
+                return self.promote_to_track(edit_id, version_codes, track)
+            except HttpError as e:
+                return e
+
+        results = concurrency_utils.map_concurrently(
+            promote, tracks, config_utils.get_config("TRACK_CONCURRENCY", 1)
+        )
+        errors = {
+            track: result
+            for track, result in zip(tracks, results)
+            if isinstance(result, HttpError)
+        }
+        if errors:
+            raise exceptions.TrackPromotionException(errors)
+        return results
 
     def validate_edit(self, edit_id):
-        validate_request = (
-            self.service.edits()
-            .validate(editId=edit_id, packageName=self.package_name)
-            .execute(num_retries=_NUM_RETRIES)
+        validate_request = self.service.edits().validate(
+            editId=edit_id, packageName=self.package_name
         )
-        return validate_request
+        return self._execute(validate_request, "edits.validate")
 
     def commit_edit(self, edit_id):
-        commit_request = (
-            self.service.edits()
-            .commit(editId=edit_id, packageName=self.package_name)
-            .execute(num_retries=_NUM_RETRIES)
+        commit_request = self.service.edits().commit(
+            editId=edit_id, packageName=self.package_name
         )
-        return commit_request
+        result = self._execute(commit_request, "edits.commit")
+        for hook in _commit_hooks:
+            # The commit went through on Play, so bookkeeping errors are only logged.
+            try:
+                hook(self.package_name)
+            except Exception:
+                logging.exception(f"Commit hook failed for {self.package_name}")
+        key = (self.package_name, self.viewer, self.secret)
+        _edit_pool().refill(key, self._insert_edit)
+        return result
 
     def upload_apk(self, edit_id, apk_file_path):
-        apk_response = (
-            self.service.edits()
-            .apks()
-            .upload(
-                media_mime_type="application/octet-stream",
-                editId=edit_id,
-                packageName=self.package_name,
-                media_body=apk_file_path,
+        with self._media_body(apk_file_path) as media_body:
+            apk_response = self._upload(
+                self.service.edits()
+                .apks()
+                .upload(
+                    media_mime_type="application/octet-stream",
+                    editId=edit_id,
+                    packageName=self.package_name,
+                    media_body=media_body,
+                ),
+                "edits.apks.upload",
             )
-            .execute(num_retries=_NUM_RETRIES)
-        )
         return apk_response["versionCode"]
 
     def upload_bundle(self, edit_id, bundle_file_path):
-        bundle_response = (
-            self.service.edits()
-            .bundles()
-            .upload(
-                media_mime_type="application/octet-stream",
-                editId=edit_id,
-                packageName=self.package_name,
-                media_body=bundle_file_path,
+        with self._media_body(bundle_file_path) as media_body:
+            bundle_response = self._upload(
+                self.service.edits()
+                .bundles()
+                .upload(
+                    media_mime_type="application/octet-stream",
+                    editId=edit_id,
+                    packageName=self.package_name,
+                    media_body=media_body,
+                ),
+                "edits.bundles.upload",
             )
-            .execute(num_retries=_NUM_RETRIES)
-        )
         return bundle_response["versionCode"]
 
     def list_tracks(self, edit_id):
-        tracks_response = (
+        try:
+            return self._list_tracks(edit_id)
+        except HttpError as err:
+            if not self._discard_shared_edit(edit_id, err):
+                raise
+        # The shared edit was deleted on Play, e.g. by a commit of another
+        # client, so the tracks are listed once more from a fresh one.
+        return self._list_tracks(self.shared_edit())
+
+    def _list_tracks(self, edit_id):
+        list_request = (
             self.service.edits()
             .tracks()
             .list(editId=edit_id, packageName=self.package_name)
-            .execute(num_retries=_NUM_RETRIES)
         )
+        tracks_response = self._execute(list_request, "edits.tracks.list")
         return tracks_response["tracks"]
 
+    def _discard_shared_edit(self, edit_id, error):
+        """
+        Drops edit_id from the edit pool if it is pooled and Play rejected it
+        with error. Returns whether it was dropped.
+        """
+        if not _is_rejected_edit(error):
+            return False
+        key = (self.package_name, self.viewer, self.secret)
+        if not _edit_pool().discard(key, edit_id):
+            return False
+        logging.warning(f"Discarding edit {edit_id} of {self.package_name}: {error}")
+        metrics_utils.ffwd_metric("edit-pool-rejected", 1)
+        return True
+
     def upload_deobfuscation_file(self, edit_id, version_code, deobfuscation_file):
-        deobfuscation_response = (
-            self.service.edits()
-            .deobfuscationfiles()
-            .upload(
-                editId=edit_id,
-                packageName=self.package_name,
-                apkVersionCode=version_code,
-                deobfuscationFileType="proguard",
-                media_mime_type="application/octet-stream",
-                media_body=deobfuscation_file,
+        with self._media_body(deobfuscation_file) as media_body:
+            deobfuscation_response = self._upload(
+                self.service.edits()
+                .deobfuscationfiles()
+                .upload(
+                    editId=edit_id,
+                    packageName=self.package_name,
+                    apkVersionCode=version_code,
+                    deobfuscationFileType="proguard",
+                    media_mime_type="application/octet-stream",
+                    media_body=media_body,
+                ),
+                "edits.deobfuscationfiles.upload",
             )
-            .execute(num_retries=_NUM_RETRIES)
-        )
         return deobfuscation_response["deobfuscationFile"]
+
+    def _execute(self, request, operation):
+        """
+        Executes request under the retry policy. Each attempt takes a token
+        from the rate limiter of the service account and goes through the
+        circuit breaker, which is checked first so that no token is spent
+        while the circuit is open.
+        """
+
+        def attempt():
+            breaker = circuit_breaker.get_breaker()
+            breaker.check()
+            rate_limiter.acquire(self.secret)
+            with breaker.guard():
+                return request.execute()
+
+        return retry_utils.call(attempt, operation)
+
+    def _upload(self, request, operation):
+        breaker = circuit_breaker.get_breaker()
+        breaker.check()
+        rate_limiter.acquire(self.secret)
+        with breaker.guard(timed=False):
+            return media_uploads.upload(request, operation)
+
+    @contextlib.contextmanager
+    def _media_body(self, media):
+        """
+        Yields media as a resumable upload, opening it if it is a file path.
+        Opened files and streamed links are closed once the upload is over.
+        """
+        if isinstance(media, media_uploads.LinkMediaUpload):
+            try:
+                yield media
+            finally:
+                media.close()
+            return
+        if isinstance(media, MediaUpload):
+            yield media
+            return
+        media_body = media_uploads.AdaptiveMediaFileUpload(
+            media,
+            chunksize=config_utils.get_config("UPLOAD_CHUNK_SIZE", 8 * 1024**2),
+        )
+        try:
+            yield media_body
+        finally:
+            media_body.stream().close()
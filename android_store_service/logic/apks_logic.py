@@ -20,6 +20,7 @@ from googleapiclient.errors import HttpError
 from android_store_service import exceptions
 from android_store_service.googleplay_build_service import GooglePlayBuildService
 from android_store_service.logic import shared_logic
+from android_store_service.utils import concurrency_utils, config_utils
 
 
 def upload_apks(package_name, tracks, apks, dry_run):
@@ -34,27 +35,41 @@ def upload_apks(package_name, tracks, apks, dry_run):
         )
 
         google_play_service = GooglePlayBuildService(package_name)
-        edit_id = google_play_service.create_edit()
 
-        for apk_to_upload in apks_to_upload:
-
-            version_code = google_play_service.upload_apk(
-                edit_id, apk_to_upload["binary_path"]
-            )
-
-            if apk_to_upload["deobfuscation_path"]:
-                google_play_service.upload_deobfuscation_file(
-                    edit_id, version_code, apk_to_upload["deobfuscation_path"]
+        def release(edit_id):
+            def upload_apk(apk_to_upload):
+                version_code = google_play_service.upload_apk(
+                    edit_id, apk_to_upload["binary_path"]
                 )
 
-            version_codes.append(version_code)
+                if apk_to_upload["deobfuscation_path"]:
+                    google_play_service.upload_deobfuscation_file(
+                        edit_id, version_code, apk_to_upload["deobfuscation_path"]
+                    )
 
-        for track in tracks:
-            google_play_service.promote_to_track(edit_id, version_codes, track)
+                return version_code
+
+            version_codes = concurrency_utils.map_concurrently(
+                upload_apk,
+                apks_to_upload,
+                config_utils.get_config("UPLOAD_CONCURRENCY", 1),
+            )
 
-        google_play_service.validate_edit(edit_id)
-        if not dry_run:
-            google_play_service.commit_edit(edit_id)
+            google_play_service.promote_to_tracks(edit_id, version_codes, tracks)
+
+            google_play_service.validate_edit(edit_id)
+            if not dry_run:
+                google_play_service.commit_edit(edit_id)
+            return version_codes
+
+        edit_id = google_play_service.checkout_edit()
+        try:
+            version_codes = release(edit_id)
+        except HttpError as err:
+            edit_id = google_play_service.replace_rejected_edit(edit_id, err)
+            if edit_id is None:
+                raise
+            version_codes = release(edit_id)
     except HttpError as err:
         message = "APK specifies a version code that has already been used."
         error = exceptions.parse_httperror(err).get("error", {})
@@ -19,6 +19,7 @@ from googleapiclient.errors import HttpError
 from android_store_service import exceptions
 from android_store_service.googleplay_build_service import GooglePlayBuildService
 from android_store_service.logic import shared_logic
+from android_store_service.utils import concurrency_utils, config_utils
 
 
 def upload_bundles(package_name, tracks, bundles, dry_run):
@@ -33,27 +34,41 @@ def upload_bundles(package_name, tracks, bundles, dry_run):
         )
 
         google_play_service = GooglePlayBuildService(package_name)
-        edit_id = google_play_service.create_edit()
 
-        for bundle_to_upload in bundles_to_upload:
-
-            version_code = google_play_service.upload_bundle(
-                edit_id, bundle_to_upload["binary_path"]
-            )
-
-            if bundle_to_upload["deobfuscation_path"]:
-                google_play_service.upload_deobfuscation_file(
-                    edit_id, version_code, bundle_to_upload["deobfuscation_path"]
+        def release(edit_id):
+            def upload_bundle(bundle_to_upload):
+                version_code = google_play_service.upload_bundle(
+                    edit_id, bundle_to_upload["binary_path"]
                 )
 
-            version_codes.append(version_code)
+                if bundle_to_upload["deobfuscation_path"]:
+                    google_play_service.upload_deobfuscation_file(
+                        edit_id, version_code, bundle_to_upload["deobfuscation_path"]
+                    )
 
-        for track in tracks:
-            google_play_service.promote_to_track(edit_id, version_codes, track)
+                return version_code
+
+            version_codes = concurrency_utils.map_concurrently(
+                upload_bundle,
+                bundles_to_upload,
+                config_utils.get_config("UPLOAD_CONCURRENCY", 1),
+            )
 
-        google_play_service.validate_edit(edit_id)
-        if not dry_run:
-            google_play_service.commit_edit(edit_id)
+            google_play_service.promote_to_tracks(edit_id, version_codes, tracks)
+
+            google_play_service.validate_edit(edit_id)
+            if not dry_run:
+                google_play_service.commit_edit(edit_id)
+            return version_codes
+
+        edit_id = google_play_service.checkout_edit()
+        try:
+            version_codes = release(edit_id)
+        except HttpError as err:
+            edit_id = google_play_service.replace_rejected_edit(edit_id, err)
+            if edit_id is None:
+                raise
+            version_codes = release(edit_id)
     except HttpError as err:
         message = "APK specifies a version code that has already been used."
         error = exceptions.parse_httperror(err).get("error", {})
@@ -13,14 +13,31 @@
 # limitations under the License.
 
 import base64
+import contextlib
+import hashlib
 import shutil
 import tempfile
 
+from googleapiclient.http import MediaUpload
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import artifact_store
+from android_store_service.utils.file_utils import StagedFile
+
 
 def create_temporary_directory():
     return tempfile.mkdtemp()
 
 
+@contextlib.contextmanager
+def temporary_directory():
+    directory = create_temporary_directory()
+    try:
+        yield directory
+    finally:
+        delete_temporary_dir(directory)
+
+
 def store_base64_as_text_file(directory, content):
     fd, path = tempfile.mkstemp(dir=directory)
     with open(path, "w+") as f:
@@ -30,18 +47,28 @@ def store_base64_as_text_file(directory, content):
 
 def store_base64_as_binary_file(directory, b64_content):
     fd, path = tempfile.mkstemp(dir=directory)
+    content = base64.decodebytes(b64_content.encode())
     with open(path, "wb") as f:
-        f.write(base64.decodebytes(b64_content.encode()))
-    return path
+        f.write(content)
+    return StagedFile(
+        path,
+        sha1=hashlib.sha1(content).hexdigest(),
+        sha256=hashlib.sha256(content).hexdigest(),
+    )
 
 
 def store_binaries_to_directory(directory, binaries):
     binary_paths = []
     for binary in binaries:
-        binary_path = store_base64_as_binary_file(directory, binary["media_body"])
+        binary_path = _store(
+            store_base64_as_binary_file, directory, binary["media_body"]
+        )
+        if not isinstance(binary_path, MediaUpload):
+            verify_digests(binary, binary_path)
+            artifact_store.put(binary_path)
 
         deobfuscation_path = (
-            store_base64_as_text_file(directory, binary["deobfuscation_file"])
+            _store(store_base64_as_text_file, directory, binary["deobfuscation_file"])
             if binary.get("deobfuscation_file")
             else None
         )
@@ -52,5 +79,49 @@ def store_binaries_to_directory(directory, binaries):
     return binary_paths
 
 
+def verify_digests(binary, binary_path):
+    """
+    Checks the sha1 and sha256 given for a binary against the digests computed
+    while it was written to binary_path.
+    """
+    for field in ("sha1", "sha256"):
+        expected = binary.get(field)
+        actual = getattr(binary_path, field, None)
+        if expected and actual and expected.lower() != actual:
+            raise BadRequestException(
+                f"The {field} of the uploaded binary is {actual}, "
+                f"expected {expected}"
+            )
+
+
+def iter_binaries(data):
+    """Yields the apk and bundle entries of a builds payload."""
+    if not isinstance(data, dict):
+        return
+    for key in ("apks", "bundles"):
+        binaries = data.get(key)
+        if isinstance(binaries, list):
+            yield from (binary for binary in binaries if isinstance(binary, dict))
+
+
+def resolve_stored_artifacts(data, directory):
+    """
+    Fills in media_body from the artifact store for binaries that leave it
+    out, linking the stored artifacts into directory.
+    """
+    for binary in iter_binaries(data):
+        sha256 = binary.get("sha256")
+        if "media_body" not in binary and isinstance(sha256, str):
+            stored_file = artifact_store.get(sha256, directory)
+            if stored_file is not None:
+                binary["media_body"] = stored_file
+
+
+def _store(store_function, directory, content):
+    if isinstance(content, (StagedFile, MediaUpload)):
+        return content
+    return store_function(directory, content)
+
+
 def delete_temporary_dir(dir_path):
     shutil.rmtree(dir_path)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from android_store_service.exceptions import BadRequestException, NotFoundException
+from android_store_service.logic import shared_logic
+from android_store_service.utils import config_utils, file_utils
+from android_store_service.utils.file_utils import StagedFile
+
+_CHUNK_SIZE = 64 * 1024
+_DEFAULT_SESSION_TTL = 6 * 3600
+_STAGING_ID = re.compile(r"^[0-9a-f]{32}$")
+_STAGING_ID_FIELDS = {
+    "media_body_staging_id": "media_body",
+    "deobfuscation_file_staging_id": "deobfuscation_file",
+}
+
+
+def create_session(package_name):
+    expire_sessions()
+    staging_id = uuid.uuid4().hex
+    session = {
+        "staging_id": staging_id,
+        "package_name": package_name,
+        "expires_at": int(time.time() + _session_ttl()),
+        "received": 0,
+        "size": None,
+        "finalized": False,
+    }
+    _write_session(session)
+    open(_data_path(staging_id), "wb").close()
+    return _session_status(session)
+
+
+def get_session(package_name, staging_id):
+    return _session_status(_read_session(package_name, staging_id))
+
+
+def write_range(package_name, staging_id, stream, start, length, size=None):
+    """
+    Writes length bytes read from stream to the staged artifact at offset start.
+
+    A range may overlap data that was already received, but may not leave a gap.
+    Bytes that arrived before the stream broke off are kept, so the client can
+    resume from the received offset reported by get_session.
+
+    :param size: (Optional) Total size of the artifact, if known by the client.
+    """
+    with _locked_session(package_name, staging_id) as (session, data_file):
+        if session["finalized"]:
+            raise BadRequestException(f"Staging session {staging_id} is finalized")
+        if start > session["received"]:
+            raise BadRequestException(
+                f"Range starts at {start} but only {session['received']} bytes "
+                f"have been received"
+            )
+        if size is not None:
+            if session["size"] not in (None, size):
+                raise BadRequestException(
+                    f"Size {size} does not match earlier size {session['size']}"
+                )
+            if start + length > size:
+                raise BadRequestException(f"Range exceeds size {size}")
+            session["size"] = size
+
+        data_file.seek(start)
+        written = 0
+        try:
+            while written < length:
+                chunk = stream.read(min(_CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                data_file.write(chunk)
+                written += len(chunk)
+        finally:
+            data_file.flush()
+            session["received"] = max(session["received"], start + written)
+            _write_session(session)
+
+        if written < length:
+            raise BadRequestException(
+                f"Received {written} of {length} bytes for range starting at {start}"
+            )
+        return _session_status(session)
+
+
+def finalize_session(package_name, staging_id):
+    with _locked_session(package_name, staging_id) as (session, data_file):
+        if not session["finalized"]:
+            size = session["size"]
+            if size is not None and session["received"] < size:
+                raise BadRequestException(
+                    f"Upload incomplete, received {session['received']} "
+                    f"of {size} bytes"
+                )
+            session["size"] = session["received"]
+            sha1, sha256 = hashlib.sha1(), hashlib.sha256()
+            data_file.seek(0)
+            for chunk in iter(lambda: data_file.read(_CHUNK_SIZE), b""):
+                sha1.update(chunk)
+                sha256.update(chunk)
+            session["sha1"] = sha1.hexdigest()
+            session["sha256"] = sha256.hexdigest()
+            session["finalized"] = True
+            _write_session(session)
+        return _session_status(session)
+
+
+def delete_session(package_name, staging_id):
+    _read_session(package_name, staging_id)
+    _remove_session(staging_id)
+
+
+def resolve_staging_ids(package_name, data, directory):
+    """
+    Replaces staging IDs referred to by binaries in a builds payload with the
+    finalized artifacts, linked into directory so they outlive session expiry.
+    """
+    for binary in shared_logic.iter_binaries(data):
+        for id_field, field in _STAGING_ID_FIELDS.items():
+            staging_id = binary.get(id_field)
+            if not isinstance(staging_id, str):
+                continue
+            if field in binary:
+                raise BadRequestException(
+                    f"Only one of '{field}' and '{id_field}' can be given"
+                )
+            binary[field] = _link_artifact(package_name, staging_id, directory)
+
+
+def expire_sessions():
+    now = time.time()
+    for name in os.listdir(_staging_path()):
+        staging_id, extension = os.path.splitext(name)
+        if extension != ".json":
+            continue
+        try:
+            with open(_session_path(staging_id)) as f:
+                expires_at = json.load(f)["expires_at"]
+        except (OSError, ValueError, KeyError):
+            continue
+        if expires_at <= now:
+            _remove_session(staging_id)
+
+
+def _link_artifact(package_name, staging_id, directory):
+    session = _read_session(package_name, staging_id)
+    if not session["finalized"]:
+        raise BadRequestException(f"Staging session {staging_id} is not finalized")
+    path = os.path.join(directory, f"staged-{staging_id}")
+    file_utils.link_or_copy(_data_path(staging_id), path)
+    return StagedFile(path, sha1=session["sha1"], sha256=session["sha256"])
+
+
+def _session_status(session):
+    status = {
+        key: session[key]
+        for key in ("staging_id", "expires_at", "received", "size", "finalized")
+    }
+    if session["finalized"]:
+        status.update(sha1=session["sha1"], sha256=session["sha256"])
+    return status
+
+
+@contextlib.contextmanager
+def _locked_session(package_name, staging_id):
+    """Yields a session and its open data file while holding the session lock."""
+    _read_session(package_name, staging_id)
+    try:
+        data_file = open(_data_path(staging_id), "r+b")
+    except FileNotFoundError:
+        raise _not_found(staging_id)
+    with data_file:
+        fcntl.flock(data_file, fcntl.LOCK_EX)
+        yield _read_session(package_name, staging_id), data_file
+
+
+def _read_session(package_name, staging_id):
+    if not _STAGING_ID.match(staging_id):
+        raise _not_found(staging_id)
+    try:
+        with open(_session_path(staging_id)) as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        raise _not_found(staging_id)
+    if session["package_name"] != package_name:
+        raise _not_found(staging_id)
+    if session["expires_at"] <= time.time():
+        _remove_session(staging_id)
+        raise _not_found(staging_id)
+    return session
+
+
+def _write_session(session):
+    with file_utils.atomic_write(_session_path(session["staging_id"])) as f:
+        json.dump(session, f)
+
+
+def _remove_session(staging_id):
+    for path in (_session_path(staging_id), _data_path(staging_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _not_found(staging_id):
+    return NotFoundException(f"Staging session {staging_id} does not exist")
+
+
+def _session_ttl():
+    return config_utils.get_config("STAGING_SESSION_TTL", _DEFAULT_SESSION_TTL)
+
+
+def _staging_path():
+    path = config_utils.get_config("STAGING_PATH") or os.path.join(
+        tempfile.gettempdir(), "android-store-service-staging"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _session_path(staging_id):
+    return os.path.join(_staging_path(), f"{staging_id}.json")
+
+
+def _data_path(staging_id):
+    return os.path.join(_staging_path(), f"{staging_id}.bin")
@@ -17,5 +17,5 @@ from android_store_service.googleplay_build_service import GooglePlayBuildServic
 
 def list_tracks(package_name):
     google_play_service = GooglePlayBuildService(package_name, viewer=True)
-    edit_id = google_play_service.create_edit()
+    edit_id = google_play_service.shared_edit()
     return google_play_service.list_tracks(edit_id)
@@ -15,19 +15,34 @@ import logging
 import os
 import time
 
+import click
 import flask
 
-import shumway
 from flask import request, g
 from googleapiclient.errors import HttpError
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import (
+    LengthRequired,
+    NotFound,
+    ServiceUnavailable,
+    TooManyRequests,
+)
 
 from android_store_service import exceptions
 from android_store_service.resources.apks_resources import apks_blueprint
+from android_store_service.resources.artifacts_resources import artifacts_blueprint
 from android_store_service.resources.builds_resources import builds_blueprint
-from android_store_service.exceptions import BadRequestException
-from android_store_service.utils import logging_utils
+from android_store_service.exceptions import (
+    BadRequestException,
+    TrackPromotionException,
+)
+from android_store_service.utils import (
+    credentials_utils,
+    discovery_utils,
+    logging_utils,
+    metrics_utils,
+)
 from android_store_service.resources.bundles_resources import bundles_blueprint
+from android_store_service.resources.staging_resources import staging_blueprint
 from android_store_service.resources.tracks_resources import tracks_blueprint
 
 GIGA_UNIT = 1e9
@@ -43,6 +58,8 @@ app.register_blueprint(builds_blueprint, url_prefix="/v1")
 app.register_blueprint(tracks_blueprint, url_prefix="/v1")
 app.register_blueprint(bundles_blueprint, url_prefix="/v1")
 app.register_blueprint(apks_blueprint, url_prefix="/v1")
+app.register_blueprint(staging_blueprint, url_prefix="/v1")
+app.register_blueprint(artifacts_blueprint, url_prefix="/v1")
 
 
 def _check_run_test():
@@ -53,20 +70,18 @@ def _check_run_test():
 
 
 def _setup_metrics():
-    return shumway.MetricRelay(
-        app.config.get("METRICS_KEY"), app.config.get("METRICS_FFWD_HOST")
-    )
+    return metrics_utils.setup_metrics(app.config)
 
 
 _check_run_test()
 logging_utils.setup_logging(app.config)
 metrics = _setup_metrics()
+token_refresher = credentials_utils.start_token_refresher(app)
 request_times = {}
 
 
-def ffwd_metric(metric, value, attrs={}):
-    attrs["project"] = "some_project"
-    metrics.emit(metric, value, attributes=attrs)
+def ffwd_metric(metric, value, attrs=None):
+    metrics_utils.ffwd_metric(metric, value, attrs)
 
 
 @app.before_request
@@ -122,6 +137,25 @@ def handle_not_found_exception(error):
     return response
 
 
+@app.errorhandler(LengthRequired)
+def handle_length_required(error):
+    logging.warning(error)
+    response = flask.jsonify({"error": {"message": error.description}})
+    response.status_code = error.code
+    return response
+
+
+@app.errorhandler(TooManyRequests)
+@app.errorhandler(ServiceUnavailable)
+def handle_retry_later(error):
+    logging.warning(error)
+    response = flask.jsonify({"error": {"message": error.description}})
+    response.status_code = error.code
+    if error.retry_after:
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
 @app.errorhandler(BadRequestException)
 def handle_bad_request(error):
     logging.exception(error)
@@ -141,14 +175,37 @@ def google_api_client_exception(httperror):
     return response
 
 
+@app.errorhandler(TrackPromotionException)
+def handle_track_promotion_exception(error):
+    logging.exception(error)
+    tracks = {
+        track: exceptions.parse_httperror(httperror).get("error", {})
+        for track, httperror in error.errors.items()
+    }
+    response = flask.jsonify({"error": {"message": str(error), "tracks": tracks}})
+    response.status_code = next(iter(error.errors.values())).resp.status
+    return response
+
+
 @app.before_request
 def log_request():
-    data = (f" DATA: {request.get_data()}" if request.get_data() else "")[:1000]
+    # Upload payloads are parsed from the input stream as they arrive, so the
+    # body must not be read here.
+    length = (
+        f" CONTENT-LENGTH: {request.content_length}" if request.content_length else ""
+    )
     logging.info(
-        "%s /%s%s", request.method, request.url.replace(request.url_root, ""), data
+        "%s /%s%s", request.method, request.url.replace(request.url_root, ""), length
     )
 
 
+@app.cli.command("refresh-discovery-document")
+def refresh_discovery_document():
+    """Replaces the androidpublisher discovery document with the current one."""
+    revision = discovery_utils.refresh_document()
+    click.echo(f"Discovery document refreshed to revision {revision}")
+
+
 @app.route("/status")
 def status():
     logging.info("Status: ok")
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from flask import Blueprint, jsonify
+
+from android_store_service.exceptions import NotFoundException
+from android_store_service.utils import artifact_store
+
+artifacts_blueprint = Blueprint("artifacts-blueprint", __name__)
+
+
+@artifacts_blueprint.route("/artifacts/<sha256>", methods=["GET"])
+def get_artifact(sha256):
+    size = artifact_store.size(sha256)
+    if size is None:
+        raise NotFoundException(f"Artifact {sha256} is not stored")
+    return jsonify({"sha256": sha256.lower(), "size": size})
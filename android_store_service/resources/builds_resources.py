@@ -19,8 +19,14 @@ import jsonschema
 from flask import Blueprint, request, jsonify
 from jsonschema import ValidationError
 
-from android_store_service.logic import bundles_logic, apks_logic
+from android_store_service.logic import (
+    bundles_logic,
+    apks_logic,
+    shared_logic,
+    staging_logic,
+)
 from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import payload_utils
 
 builds_blueprint = Blueprint("builds-blueprint", __name__)
 
@@ -30,29 +36,32 @@ def create_builds(package_name):
     if not re.match(r"^[a-zA-Z0-9\.]+$", package_name):
         raise BadRequestException("Invalid package name")
 
-    data = request.get_json(force=True)
-    try:
-        jsonschema.validate(data, builds_schema)
-    except ValidationError as e:
-        raise BadRequestException(str(e))
+    with shared_logic.temporary_directory() as staging_directory:
+        data = payload_utils.load_upload_payload(request, staging_directory)
+        staging_logic.resolve_staging_ids(package_name, data, staging_directory)
+        shared_logic.resolve_stored_artifacts(data, staging_directory)
+        try:
+            jsonschema.validate(data, builds_schema)
+        except ValidationError as e:
+            raise BadRequestException(str(e))
 
-    tracks = data.get("tracks", [])
-    bundles = data.get("bundles", [])
-    apks = data.get("apks", [])
-    dry_run = data.get("dry_run", False)
+        tracks = data.get("tracks", [])
+        bundles = data.get("bundles", [])
+        apks = data.get("apks", [])
+        dry_run = data.get("dry_run", False)
 
-    if not bundles and not apks:
-        if not tracks:
-            raise BadRequestException("No payload")
-        raise BadRequestException("No binaries")
-    if bundles and apks:
-        raise BadRequestException("Invalid payload. Cannot mix apks and bundles.")
-    if bundles:
-        version_codes = bundles_logic.upload_bundles(
-            package_name, tracks, bundles, dry_run
-        )
-    else:
-        version_codes = apks_logic.upload_apks(package_name, tracks, apks, dry_run)
+        if not bundles and not apks:
+            if not tracks:
+                raise BadRequestException("No payload")
+            raise BadRequestException("No binaries")
+        if bundles and apks:
+            raise BadRequestException("Invalid payload. Cannot mix apks and bundles.")
+        if bundles:
+            version_codes = bundles_logic.upload_bundles(
+                package_name, tracks, bundles, dry_run
+            )
+        else:
+            version_codes = apks_logic.upload_apks(package_name, tracks, apks, dry_run)
     logging.info(
         f"Successfully uploaded new binaries for {package_name} to google play. "
         f'Tracks: {", ".join(tracks)}. '
@@ -82,6 +91,8 @@ builds_schema = {
                     "sha256": {"type": "string"},
                     "media_body": {"type": "string"},
                     "deobfuscation_file": {"type": "string"},
+                    "media_body_staging_id": {"type": "string"},
+                    "deobfuscation_file_staging_id": {"type": "string"},
                 },
             },
         },
@@ -96,6 +107,8 @@ builds_schema = {
                     "sha256": {"type": "string"},
                     "media_body": {"type": "string"},
                     "deobfuscation_file": {"type": "string"},
+                    "media_body_staging_id": {"type": "string"},
+                    "deobfuscation_file_staging_id": {"type": "string"},
                 },
             },
         },
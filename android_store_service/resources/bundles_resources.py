@@ -19,9 +19,9 @@ import jsonschema
 from flask import Blueprint, request, jsonify
 from jsonschema import ValidationError
 
-from android_store_service.logic import bundles_logic
+from android_store_service.logic import bundles_logic, shared_logic, staging_logic
 from android_store_service.exceptions import BadRequestException
-from android_store_service.utils import bundle_adapter
+from android_store_service.utils import bundle_adapter, payload_utils
 
 bundles_blueprint = Blueprint("bundles-blueprint", __name__)
 
@@ -31,17 +31,22 @@ def upload_bundles(package_name):
     if not re.match(r"^[a-zA-Z0-9\.]+$", package_name):
         raise BadRequestException("Invalid package name")
 
-    data = request.get_json(force=True)
-    try:
-        jsonschema.validate(data, builds_schema)
-    except ValidationError as e:
-        raise BadRequestException(str(e))
-
-    tracks = data.get("tracks", [])
-    bundles = data.get("bundles")
-    dry_run = data.get("dry_run", False)
-
-    version_codes = bundles_logic.upload_bundles(package_name, tracks, bundles, dry_run)
+    with shared_logic.temporary_directory() as staging_directory:
+        data = payload_utils.load_upload_payload(request, staging_directory)
+        staging_logic.resolve_staging_ids(package_name, data, staging_directory)
+        shared_logic.resolve_stored_artifacts(data, staging_directory)
+        try:
+            jsonschema.validate(data, builds_schema)
+        except ValidationError as e:
+            raise BadRequestException(str(e))
+
+        tracks = data.get("tracks", [])
+        bundles = data.get("bundles")
+        dry_run = data.get("dry_run", False)
+
+        version_codes = bundles_logic.upload_bundles(
+            package_name, tracks, bundles, dry_run
+        )
     logging.info(
         f"Successfully uploaded new bundles for {package_name} to Google Play. "
         f'Tracks: {", ".join(tracks)}. '
@@ -72,6 +77,8 @@ builds_schema = {
                     "sha256": {"type": "string"},
                     "media_body": {"type": "string"},
                     "deobfuscation_file": {"type": "string"},
+                    "media_body_staging_id": {"type": "string"},
+                    "deobfuscation_file_staging_id": {"type": "string"},
                 },
             },
         },
@@ -94,8 +101,13 @@ def upload_bundles_binary_links(package_name):
     tracks = data.get("tracks", [])
     dry_run = data.get("dry_run", False)
 
-    bundles = bundle_adapter.adapt_bundle(data.get("bundles"))
-    version_codes = bundles_logic.upload_bundles(package_name, tracks, bundles, dry_run)
+    with shared_logic.temporary_directory() as staging_directory:
+        bundles = bundle_adapter.adapt_bundle(
+            data.get("bundles"), staging_directory, data.get("streaming", False)
+        )
+        version_codes = bundles_logic.upload_bundles(
+            package_name, tracks, bundles, dry_run
+        )
     logging.info(
         f"Successfully uploaded new bundles for {package_name} to Google Play."
         f'Tracks: {", ".join(tracks)}. '
@@ -129,5 +141,6 @@ builds_schema_binary_builds = {
             },
         },
         "dry_run": {"type": "boolean"},
+        "streaming": {"type": "boolean"},
     },
 }
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+from flask import Blueprint, request, jsonify
+from werkzeug.http import parse_content_range_header
+
+from android_store_service.exceptions import (
+    BadRequestException,
+    LengthRequiredException,
+)
+from android_store_service.logic import staging_logic
+
+staging_blueprint = Blueprint("staging-blueprint", __name__)
+
+
+@staging_blueprint.route("/<package_name>/staging", methods=["POST"])
+def create_staging_session(package_name):
+    _validate_package_name(package_name)
+    response = jsonify(staging_logic.create_session(package_name))
+    response.status_code = 201
+    return response
+
+
+@staging_blueprint.route("/<package_name>/staging/<staging_id>", methods=["GET"])
+def get_staging_session(package_name, staging_id):
+    _validate_package_name(package_name)
+    return jsonify(staging_logic.get_session(package_name, staging_id))
+
+
+@staging_blueprint.route("/<package_name>/staging/<staging_id>", methods=["PUT"])
+def upload_staging_range(package_name, staging_id):
+    _validate_package_name(package_name)
+    start, size = 0, None
+
+    content_range_header = request.headers.get("Content-Range")
+    if content_range_header:
+        content_range = parse_content_range_header(content_range_header)
+        if content_range is None or content_range.units != "bytes":
+            raise BadRequestException(
+                f"Invalid Content-Range header: {content_range_header}"
+            )
+        if content_range.start is None:
+            # "bytes */<size>" asks how much of the upload has been received.
+            if request.content_length:
+                raise BadRequestException("Content-Range does not match Content-Length")
+            return jsonify(staging_logic.get_session(package_name, staging_id))
+        start, size = content_range.start, content_range.length
+
+    length = request.content_length
+    if length is None:
+        raise LengthRequiredException("Content-Length is required")
+    if content_range_header and content_range.stop - start != length:
+        raise BadRequestException("Content-Range does not match Content-Length")
+
+    return jsonify(
+        staging_logic.write_range(
+            package_name, staging_id, request.stream, start, length, size
+        )
+    )
+
+
+@staging_blueprint.route(
+    "/<package_name>/staging/<staging_id>/finalize", methods=["POST"]
+)
+def finalize_staging_session(package_name, staging_id):
+    _validate_package_name(package_name)
+    return jsonify(staging_logic.finalize_session(package_name, staging_id))
+
+
+@staging_blueprint.route("/<package_name>/staging/<staging_id>", methods=["DELETE"])
+def delete_staging_session(package_name, staging_id):
+    _validate_package_name(package_name)
+    staging_logic.delete_session(package_name, staging_id)
+    return "", 204
+
+
+def _validate_package_name(package_name):
+    if not re.match(r"^[a-zA-Z0-9\.]+$", package_name):
+        raise BadRequestException("Invalid package name")
@@ -18,6 +18,7 @@ from flask import Blueprint, jsonify
 
 from android_store_service.exceptions import BadRequestException
 from android_store_service.logic import tracks_logic
+from android_store_service.utils import track_cache
 
 tracks_blueprint = Blueprint("tracks-blueprint", __name__)
 
@@ -26,4 +27,8 @@ tracks_blueprint = Blueprint("tracks-blueprint", __name__)
 def list_tracks(package_name):
     if not re.match(r"^[a-zA-Z0-9\.]+$", package_name):
         raise BadRequestException("Invalid package name")
-    return jsonify({"tracks": tracks_logic.list_tracks(package_name)})
+    tracks, age = track_cache.get(package_name, tracks_logic.list_tracks)
+    response = jsonify({"tracks": tracks})
+    response.headers["X-Cache"] = "MISS" if age is None else "HIT"
+    response.headers["Age"] = str(int(age or 0))
+    return response
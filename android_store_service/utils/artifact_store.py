@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Content-addressed store of artifacts on local disk, keyed by their sha256 """
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+from android_store_service.utils import config_utils, file_utils, metrics_utils
+from android_store_service.utils.file_utils import StagedFile
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_LINKS_DIRECTORY = "links"
+
+
+def get(sha256, directory):
+    """
+    Links the stored artifact with the given sha256 into directory.
+
+    The link keeps the artifact available to the caller even if it is evicted
+    from the store in the meantime. Returns None if the artifact is not stored.
+    """
+    store_path = _store_path()
+    if store_path is None:
+        return None
+    sha256 = sha256.lower()
+    path = os.path.join(store_path, sha256)
+    staged_path = os.path.join(directory, f"stored-{sha256}")
+    try:
+        if not _SHA256.match(sha256):
+            raise FileNotFoundError(path)
+        if not os.path.exists(staged_path):
+            file_utils.link_or_copy(path, staged_path)
+        os.utime(path)
+    except FileNotFoundError:
+        metrics_utils.ffwd_metric("artifact-store-lookup", 1, {"result": "miss"})
+        return None
+    metrics_utils.ffwd_metric("artifact-store-lookup", 1, {"result": "hit"})
+    logging.info(f"Found artifact {sha256} in artifact store")
+    return StagedFile(staged_path, sha256=sha256)
+
+
+def size(sha256):
+    """Returns the size of the stored artifact with the given sha256, or None."""
+    store_path = _store_path()
+    sha256 = sha256.lower()
+    if store_path is None or not _SHA256.match(sha256):
+        return None
+    try:
+        return os.path.getsize(os.path.join(store_path, sha256))
+    except FileNotFoundError:
+        return None
+
+
+def enabled():
+    """Returns whether ARTIFACT_STORE_PATH is set."""
+    return _store_path() is not None
+
+
+def find_link(url, validator):
+    """
+    Returns the sha256 of the artifact last downloaded from url, or None.
+
+    Links may change what they point to, so the artifact is only returned if it
+    was downloaded with the same validator (ETag or Last-Modified) as given.
+    """
+    store_path = _store_path()
+    if store_path is None or not validator:
+        return None
+    link_path = _link_path(store_path, url)
+    try:
+        with open(link_path) as f:
+            sha256, _, stored_validator = f.read().partition("\n")
+        os.utime(link_path)
+    except FileNotFoundError:
+        return None
+    if stored_validator != validator:
+        return None
+    return sha256 if _SHA256.match(sha256) else None
+
+
+def put(path, url=None, validator=None):
+    """
+    Adds the artifact at path to the store, returns its sha256.
+
+    The digest attached to a StagedFile path is used instead of reading the
+    artifact again.
+
+    :param url: (Optional) Link the artifact was downloaded from, so that it can
+        be found by find_link.
+    :param validator: (Optional) ETag or Last-Modified header the link was
+        served with, find_link only returns the artifact for the same one.
+    """
+    store_path = _store_path()
+    if store_path is None:
+        return None
+    digest = getattr(path, "sha256", None)
+    if digest is None:
+        digest = file_utils.digest_file(path).sha256
+
+    stored_path = os.path.join(store_path, digest)
+    if os.path.exists(stored_path):
+        os.utime(stored_path)
+    elif os.path.getsize(path) <= _max_bytes():
+        fd, temporary_path = tempfile.mkstemp(dir=store_path, suffix=".tmp")
+        os.close(fd)
+        os.remove(temporary_path)
+        file_utils.link_or_copy(path, temporary_path)
+        os.replace(temporary_path, stored_path)
+        evict()
+    else:
+        return digest
+
+    if url is not None and validator:
+        with file_utils.atomic_write(_link_path(store_path, url)) as f:
+            f.write(f"{digest}\n{validator}")
+    return digest
+
+
+def evict():
+    """
+    Removes artifacts that have not been used for ARTIFACT_STORE_MAX_AGE
+    seconds, then the least recently used ones until the store fits its size.
+    """
+    store_path = _store_path()
+    if store_path is None:
+        return
+    max_age = _max_age()
+    oldest_mtime = time.time() - max_age if max_age else None
+    links_path = os.path.join(store_path, _LINKS_DIRECTORY)
+    if oldest_mtime is not None:
+        for name in os.listdir(links_path):
+            link_path = os.path.join(links_path, name)
+            try:
+                if os.stat(link_path).st_mtime < oldest_mtime:
+                    os.remove(link_path)
+            except FileNotFoundError:
+                pass
+
+    entries = []
+    for name in os.listdir(store_path):
+        if not _SHA256.match(name):
+            continue
+        try:
+            stat = os.stat(os.path.join(store_path, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    size = sum(entry_size for _, entry_size, _ in entries)
+    max_bytes = _max_bytes()
+    for mtime, entry_size, name in sorted(entries):
+        expired = oldest_mtime is not None and mtime < oldest_mtime
+        if size <= max_bytes and not expired:
+            break
+        _remove(os.path.join(store_path, name))
+        size -= entry_size
+    metrics_utils.ffwd_metric("artifact-store-size", size)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_path(store_path, url):
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(store_path, _LINKS_DIRECTORY, name)
+
+
+def _store_path():
+    path = config_utils.get_config("ARTIFACT_STORE_PATH")
+    if path:
+        os.makedirs(os.path.join(path, _LINKS_DIRECTORY), exist_ok=True)
+    return path
+
+
+def _max_bytes():
+    return config_utils.get_config("ARTIFACT_STORE_MAX_BYTES", 0)
+
+
+def _max_age():
+    return config_utils.get_config("ARTIFACT_STORE_MAX_AGE")
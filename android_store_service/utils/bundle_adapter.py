@@ -12,20 +12,244 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import base64
+import logging
+import os
+import tempfile
+import time
+
 import requests
+from werkzeug.http import parse_content_range_header
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import (
+    artifact_store,
+    concurrency_utils,
+    config_utils,
+    file_utils,
+    http_transport,
+    metrics_utils,
+)
+from android_store_service.utils.file_utils import DigestWriter, StagedFile
+from android_store_service.utils.media_uploads import LinkMediaUpload
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def adapt_bundle(bundles, directory, streaming=False):
+    """
+    Downloads the linked bundles and mapping files into directory.
 
+    All links are fetched concurrently, up to DOWNLOAD_CONCURRENCY at a time,
+    unless the artifact store already holds them. Returns the bundles in the
+    shape expected by bundles_logic.upload_bundles, with StagedFile paths in
+    place of base64 encoded contents.
 
-def adapt_bundle(bundles):
+    :param streaming: (Optional) True to stream the bundles from their links
+        while they are uploaded to Google Play instead of downloading them first.
+    """
+    links = []
+    for bundle in bundles:
+        links.append((bundle["media_body_link"], bundle["sha256"], streaming))
+        links.append((bundle["deobfuscation_file_link"], None, False))
+
+    paths = concurrency_utils.map_concurrently(
+        lambda link: fetch(*link, directory=directory),
+        links,
+        _concurrency(),
+    )
     return [
         {
             "sha256": bundle["sha256"],
-            "deobfuscation_file": base64.b64encode(
-                requests.get(bundle["deobfuscation_file_link"]).content
-            ).decode(),
-            "media_body": base64.b64encode(
-                requests.get(bundle["media_body_link"]).content
-            ).decode(),
+            "deobfuscation_file": paths[2 * index + 1],
+            "media_body": paths[2 * index],
         }
-        for bundle in bundles
+        for index, bundle in enumerate(bundles)
     ]
+
+
+def fetch(url, sha256=None, streaming=False, directory=None):
+    """
+    Links the artifact at url into directory from the artifact store, keyed by
+    sha256 or by url if no sha256 is given, downloading it on a miss.
+
+    Without a sha256 the link is revalidated with a HEAD request first, and the
+    stored artifact is only used if its ETag or Last-Modified header is unchanged.
+
+    :param streaming: (Optional) True to return a LinkMediaUpload on a miss,
+        if the link announces the size of the artifact.
+    """
+    validator = None
+    if artifact_store.enabled():
+        if sha256 is None:
+            validator = _validator(url)
+        cached_sha256 = sha256 or artifact_store.find_link(url, validator)
+        path = artifact_store.get(cached_sha256, directory) if cached_sha256 else None
+        if path is not None:
+            logging.info(f"Using stored artifact {cached_sha256} for {url}")
+            metrics_utils.ffwd_metric("download-cache-lookup", 1, {"result": "hit"})
+            metrics_utils.ffwd_metric(
+                "download-cache-bytes-saved", os.path.getsize(path)
+            )
+            return path
+        metrics_utils.ffwd_metric("download-cache-lookup", 1, {"result": "miss"})
+
+    if streaming:
+        response = http_transport.get_session().head(url, allow_redirects=True)
+        _raise_for_status(url, response)
+        size = response.headers.get("Content-Length")
+        if size is not None:
+            return LinkMediaUpload(
+                http_transport.get_session(),
+                url,
+                int(size),
+                sha256,
+                _streaming_chunk_size(),
+            )
+        logging.info(f"Downloading {url} before uploading it, its size is unknown")
+    path = download(url, sha256, directory=directory)
+    artifact_store.put(path, url=url, validator=validator)
+    return path
+
+
+def download(url, sha256=None, directory=None):
+    """
+    Streams the file at url into directory in chunks, computing its digests.
+
+    Files larger than DOWNLOAD_SEGMENT_SIZE are fetched as concurrent HTTP Range
+    requests into a preallocated file when the server supports them, and as a
+    single stream otherwise.
+
+    :param sha256: (Optional) Expected sha256 of the file, checked once the
+        download completes.
+    :param directory: Directory the file is written to.
+    """
+    start = time.monotonic()
+    segment_size = _segment_size()
+    headers = {"Range": _range(0, segment_size)} if segment_size else {}
+    fd, path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        with http_transport.get_session().get(
+            url, stream=True, headers=headers
+        ) as response:
+            _raise_for_status(url, response)
+            size = _ranged_size(url, response, 0) if segment_size else None
+            if size is None or size <= segment_size:
+                writer = DigestWriter(f)
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    writer.write(chunk)
+                f.flush()
+                if size is not None and writer.size != size:
+                    raise BadRequestException(f"Incomplete download of {url}")
+            else:
+                f.truncate(size)
+                segments = [
+                    (offset, min(segment_size, size - offset))
+                    for offset in range(0, size, segment_size)
+                ]
+
+                # The first segment is read from the response that announced
+                # the size, the others are requested alongside it.
+                def download_segment(segment):
+                    if segment[0] == 0:
+                        _write_segment(url, response, f.fileno(), *segment)
+                    else:
+                        _download_segment(url, f.fileno(), *segment)
+
+                concurrency_utils.map_concurrently(
+                    download_segment, segments, _segment_concurrency()
+                )
+                writer = file_utils.digest_file(path)
+
+    if sha256 and sha256.lower() != writer.sha256:
+        raise BadRequestException(
+            f"The sha256 of {url} is {writer.sha256}, expected {sha256}"
+        )
+    _report_throughput(url, writer.size, time.monotonic() - start)
+    return StagedFile(path, sha1=writer.sha1, sha256=writer.sha256)
+
+
+def _download_segment(url, fd, offset, length):
+    headers = {"Range": _range(offset, length)}
+    with http_transport.get_session().get(
+        url, stream=True, headers=headers
+    ) as response:
+        _raise_for_status(url, response)
+        if _ranged_size(url, response, offset) is None:
+            raise BadRequestException(f"Range requests to {url} were not honored")
+        _write_segment(url, response, fd, offset, length)
+
+
+def _write_segment(url, response, fd, offset, length):
+    written = 0
+    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+        chunk = chunk[: length - written]
+        os.pwrite(fd, chunk, offset + written)
+        written += len(chunk)
+    if written != length:
+        raise BadRequestException(f"Incomplete download of {url}")
+
+
+def _validator(url):
+    """
+    Returns the ETag, or else the Last-Modified header, url is served with, or
+    None if it has neither or cannot be reached.
+    """
+    try:
+        response = http_transport.get_session().head(url, allow_redirects=True)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.info(f"Could not revalidate {url}: {e}")
+        return None
+    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+
+def _raise_for_status(url, response):
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        raise BadRequestException(f"Failed to download {url}: {e}")
+
+
+def _range(offset, length):
+    return f"bytes={offset}-{offset + length - 1}"
+
+
+def _ranged_size(url, response, offset):
+    """
+    Returns the total size of the file if response holds the range starting
+    at offset, or None if the server sent the whole file instead.
+    """
+    if response.status_code != 206:
+        return None
+    content_range = parse_content_range_header(response.headers.get("Content-Range"))
+    if content_range is None or content_range.units != "bytes":
+        raise BadRequestException(f"Invalid Content-Range in response from {url}")
+    if content_range.start != offset or content_range.length is None:
+        raise BadRequestException(f"Unexpected Content-Range in response from {url}")
+    return content_range.length
+
+
+def _report_throughput(url, size, elapsed):
+    bytes_per_second = size / elapsed if elapsed > 0 else float(size)
+    logging.info(
+        f"Downloaded {size} bytes from {url} in {elapsed:.2f}s "
+        f"({bytes_per_second / 1024 ** 2:.2f} MiB/s)"
+    )
+    metrics_utils.ffwd_metric("download-throughput", bytes_per_second)
+    metrics_utils.ffwd_metric("download-bytes", size)
+
+
+def _concurrency():
+    return config_utils.get_config("DOWNLOAD_CONCURRENCY", 1)
+
+
+def _segment_size():
+    return config_utils.get_config("DOWNLOAD_SEGMENT_SIZE")
+
+
+def _segment_concurrency():
+    return config_utils.get_config("DOWNLOAD_SEGMENT_CONCURRENCY", 1)
+
+
+def _streaming_chunk_size():
+    return config_utils.get_config("STREAMING_CHUNK_SIZE", 8 * 1024**2)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Circuit breaker around calls to the Google Play Developer API """
+import collections
+import contextlib
+import logging
+import math
+import threading
+import time
+
+from android_store_service.exceptions import ServiceUnavailableException
+from android_store_service.utils import config_utils, metrics_utils, retry_utils
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+_FAILURE_REASONS = {"server-error", "timeout", "connection"}
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker():
+    """Returns the circuit breaker of the process for the Play API."""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                window=config_utils.get_config("CIRCUIT_BREAKER_WINDOW", 60),
+                min_calls=config_utils.get_config("CIRCUIT_BREAKER_MIN_CALLS", 10),
+                failure_ratio=config_utils.get_config(
+                    "CIRCUIT_BREAKER_FAILURE_RATIO", 0.5
+                ),
+                slow_call=config_utils.get_config("CIRCUIT_BREAKER_SLOW_CALL", 30),
+                open_seconds=config_utils.get_config(
+                    "CIRCUIT_BREAKER_OPEN_SECONDS", 30
+                ),
+                half_open_calls=config_utils.get_config(
+                    "CIRCUIT_BREAKER_HALF_OPEN_CALLS", 3
+                ),
+            )
+        return _breaker
+
+
+def is_failure(error):
+    """Returns whether error shows the API is degraded, rather than the call."""
+    return retry_utils.retry_reason(error) in _FAILURE_REASONS
+
+
+class CircuitBreaker:
+    def __init__(
+        self, window, min_calls, failure_ratio, slow_call, open_seconds, half_open_calls
+    ):
+        """
+        Fails calls fast while the API is degraded.
+
+        While closed, the outcome of the calls of the last window seconds is
+        kept. Calls that fail with a server error, a timeout or a dropped
+        connection, or take longer than slow_call seconds, are failures. Once
+        at least min_calls were made and failure_ratio of them failed, the
+        breaker opens and rejects calls for open_seconds. It then lets
+        half_open_calls calls through: if they all succeed it closes again,
+        and the first failure opens it again.
+        """
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._outcomes = collections.deque()
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def guard(self, timed=True):
+        """
+        Runs the body of the with statement as a call through the breaker.
+
+        :param timed: False if the call is expected to be slow, e.g. an upload,
+            so that its duration does not count against the API
+        """
+        self.before_call()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as error:
+            self.record(not is_failure(error))
+            raise
+        seconds = time.monotonic() - started
+        self.record(not timed or seconds <= self.slow_call)
+
+    def check(self):
+        """
+        Raises ServiceUnavailableException if a call would be rejected now,
+        without taking one of the half-open calls, e.g. before queuing for it.
+        """
+        with self._lock:
+            self._raise_if_rejected()
+
+    def before_call(self):
+        """Raises ServiceUnavailableException if the call must not be made."""
+        with self._lock:
+            self._raise_if_rejected()
+            if self.state == HALF_OPEN:
+                self._probes += 1
+
+    def record(self, success):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                if not success:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._outcomes.clear()
+                    self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and failures >= calls * self.failure_ratio:
+                self._open(now)
+
+    def _raise_if_rejected(self):
+        if self.state == OPEN:
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                raise ServiceUnavailableException(
+                    "The Google Play Developer API is unavailable",
+                    retry_after=math.ceil(remaining),
+                )
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and self._probes >= self.half_open_calls:
+            raise ServiceUnavailableException(
+                "The Google Play Developer API is recovering",
+                retry_after=math.ceil(self.open_seconds),
+            )
+
+    def _open(self, now):
+        self._opened_at = now
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        logging.warning(f"Google Play Developer API circuit is {state}")
+        self.state = state
+        self._probes = 0
+        self._probe_successes = 0
+        metrics_utils.ffwd_metric(
+            "play-api-circuit-state", _STATE_VALUES[state], {"state": state}
+        )
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Helpers for running blocking calls concurrently """
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+
+def map_concurrently(function, items, max_workers):
+    """
+    Calls function on each of items using up to max_workers threads.
+
+    Returns the results in the order of items. If a call raises, calls that
+    have not started yet are cancelled and the first exception in item order
+    is raised once the running calls have finished. The app context of the
+    caller is made available to the calls.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    if has_app_context():
+        app = current_app._get_current_object()
+        call = function
+
+        def function(item):
+            with app.app_context():
+                return call(item)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesces concurrent calls for the same key into one call.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Calls function and returns its result, unless a call for key is
+        already in flight, in which case its result is waited for and returned,
+        or its exception raised.
+
+        Returns the result and whether it was shared with an earlier call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -13,8 +13,20 @@
 # limitations under the License.
 
 import os
+import threading
+import time
 
-from flask import current_app
+from flask import current_app, has_app_context
+
+_secret_registries = {}
+_secret_registries_lock = threading.Lock()
+
+
+def get_config(key, default=None):
+    """Returns a setting of the current app, or default outside of an app context."""
+    if not has_app_context():
+        return default
+    return current_app.config.get(key, default)
 
 
 def read_file(conf_path):
@@ -26,16 +38,118 @@ def get_secret(secret, path=None):
     if not path:
         path = current_app.config.get("SECRETS_PATH")
     file_path = f"{path}/{secret}"
-    if not secret_exists(secret, path=path):
+    content = _secret_registry(path).read(secret)
+    if content is None:
         raise FileNotFoundError(f"Secret {secret} does not exist at {file_path}")
-
-    return read_file(file_path)
+    return content
 
 
 def secret_exists(secret, path=None):
     if not path:
         path = current_app.config.get("SECRETS_PATH")
-    file_path = f"{path}/{secret}"
-    if os.path.exists(file_path):
-        return True
-    return False
+    return _secret_registry(path).version(secret) is not None
+
+
+def secret_version(secret, path=None):
+    """
+    Returns a value that changes whenever the secret file is replaced or
+    modified, or None if it does not exist.
+    """
+    if not path:
+        path = get_config("SECRETS_PATH")
+    return _secret_registry(path).version(secret)
+
+
+def list_secrets(path=None):
+    """Returns the names of the secret files in the secrets directory."""
+    if not path:
+        path = get_config("SECRETS_PATH")
+    return _secret_registry(path).secrets()
+
+
+def _secret_registry(path):
+    with _secret_registries_lock:
+        registry = _secret_registries.get(path)
+        if registry is None:
+            registry = _secret_registries[path] = _SecretRegistry(path)
+    registry.poll_interval = get_config("SECRETS_POLL_INTERVAL", 0)
+    return registry
+
+
+class _SecretRegistry:
+    def __init__(self, path):
+        """
+        In-memory index of the secret files in a directory, and their contents.
+
+        The directory is scanned again when a lookup happens more than
+        poll_interval seconds after the previous scan. Contents are read once
+        and again only after the file has changed, so rotated secrets take
+        effect without a restart.
+        """
+        self.path = path
+        self.poll_interval = 0
+        self._versions = {}
+        self._contents = {}
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    def version(self, secret):
+        if os.sep in secret:
+            return self._stat(os.path.join(self.path, secret))
+        with self._lock:
+            self._poll()
+            return self._versions.get(secret)
+
+    def secrets(self):
+        with self._lock:
+            self._poll()
+            return sorted(self._versions)
+
+    def read(self, secret):
+        if os.sep in secret:
+            version, content = self.version(secret), None
+        else:
+            with self._lock:
+                self._poll()
+                version = self._versions.get(secret)
+                content = self._contents.get(secret)
+        if version is None:
+            return None
+        if content is not None and content[0] == version:
+            return content[1]
+        try:
+            text = read_file(os.path.join(self.path, secret))
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._contents[secret] = (version, text)
+        return text
+
+    def _poll(self):
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self.poll_interval:
+            return
+        versions = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    version = self._stat(entry.path) if entry.is_file() else None
+                    if version is not None:
+                        versions[entry.name] = version
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        self._versions = versions
+        self._contents = {
+            secret: content
+            for secret, content in self._contents.items()
+            if versions.get(secret) == content[0]
+        }
+        self._scanned_at = now
+
+    @staticmethod
+    def _stat(file_path):
+        try:
+            stat = os.stat(file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Service account credentials shared by the Google Play API clients """
+import copy
+import datetime
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+from oauth2client.client import EXPIRY_FORMAT, Storage
+from oauth2client.service_account import ServiceAccountCredentials
+
+from android_store_service.utils import (
+    config_utils,
+    file_utils,
+    http_transport,
+    metrics_utils,
+)
+
+SCOPES = ["https://www.googleapis.com/auth/androidpublisher"]
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+
+def get_credentials(secret):
+    """
+    Returns the credentials of the service account in secret.
+
+    Credentials are shared by all clients of the process, so that a token
+    refreshed by refresh_tokens is used by all of them. They are loaded again
+    when the secret changes. If TOKEN_CACHE_PATH is set, tokens are also
+    shared with the other worker processes through TokenFileStorage.
+    """
+    version = config_utils.secret_version(secret)
+    with _credentials_lock:
+        cached = _credentials.get(secret)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    secrets = json.loads(config_utils.get_secret(secret))
+    credentials = ServiceAccountCredentials.from_json_keyfile_dict(secrets, SCOPES)
+    token_cache_path = config_utils.get_config("TOKEN_CACHE_PATH")
+    if token_cache_path:
+        os.makedirs(token_cache_path, mode=0o700, exist_ok=True)
+        storage = TokenFileStorage(
+            os.path.join(token_cache_path, f"{secret}.json"), version, credentials
+        )
+        storage.load()
+        credentials.set_store(storage)
+    with _credentials_lock:
+        _credentials[secret] = (version, credentials)
+    return credentials
+
+
+def refresh_tokens(margin):
+    """
+    Refreshes the access tokens of all service accounts in SECRETS_PATH that
+    expire within margin seconds, reporting their age and refresh latency.
+    """
+    for secret in config_utils.list_secrets():
+        try:
+            credentials = get_credentials(secret)
+        except (ValueError, KeyError, TypeError):
+            continue
+
+        if _seconds_left(credentials) <= margin:
+            start = time.monotonic()
+            try:
+                credentials.refresh(http_transport.get_http(timeout=_token_timeout()))
+            except Exception:
+                logging.exception(f"Failed to refresh the token of {secret}")
+                metrics_utils.ffwd_metric("oauth-token-refresh-error", 1)
+                continue
+            latency = time.monotonic() - start
+            logging.info(f"Refreshed the token of {secret} in {latency:.2f}s")
+            metrics_utils.ffwd_metric("oauth-token-refresh-latency", latency)
+        metrics_utils.ffwd_metric(
+            "oauth-token-age", _token_age(credentials), {"secret": secret}
+        )
+
+
+def start_token_refresher(app):
+    """
+    Starts a daemon thread refreshing tokens every TOKEN_REFRESH_INTERVAL
+    seconds, ahead of TOKEN_REFRESH_MARGIN seconds before they expire.
+
+    Returns an event that stops the thread when set, or None if no interval
+    is configured.
+    """
+    interval = app.config.get("TOKEN_REFRESH_INTERVAL")
+    if not interval:
+        return None
+    margin = app.config.get("TOKEN_REFRESH_MARGIN", 600)
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            with app.app_context():
+                try:
+                    refresh_tokens(margin)
+                except Exception:
+                    logging.exception("Failed to refresh tokens")
+            stop.wait(interval)
+
+    threading.Thread(target=run, name="token-refresher", daemon=True).start()
+    return stop
+
+
+class TokenFileStorage(Storage):
+    def __init__(self, path, version, credentials):
+        """
+        Stores the access token of credentials in a file shared by processes.
+
+        Only the token is written, the private key stays in the secret. Access
+        is serialized between threads and processes by flock on a lock file
+        next to it, so that oauth2client refreshes the token in one process and
+        the others pick it up from the file.
+
+        :param path: Path of the token file
+        :param version: Version of the secret the credentials were loaded from.
+            Tokens stored for another version of the secret are ignored.
+        :param credentials: The credentials whose token is stored
+        """
+        super().__init__(lock=threading.Lock())
+        self._path = path
+        self._version = list(version) if version is not None else None
+        self._credentials = credentials
+        self._lock_file = None
+
+    def load(self):
+        """Applies the stored token to the credentials, if there is one."""
+        stored = self.get()
+        if stored is not None and not stored.access_token_expired:
+            self._credentials.access_token = stored.access_token
+            self._credentials.token_expiry = stored.token_expiry
+            self._credentials.token_response = stored.token_response
+
+    def acquire_lock(self):
+        super().acquire_lock()
+        self._lock_file = open(f"{self._path}.lock", "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def release_lock(self):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+        super().release_lock()
+
+    def locked_get(self):
+        try:
+            with open(self._path) as f:
+                token = json.load(f)
+            token_expiry = token["token_expiry"]
+            if token_expiry is not None:
+                token_expiry = datetime.datetime.strptime(token_expiry, EXPIRY_FORMAT)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        if token.get("version") != self._version:
+            return None
+        credentials = copy.copy(self._credentials)
+        credentials.access_token = token["access_token"]
+        credentials.token_expiry = token_expiry
+        credentials.token_response = token.get("token_response")
+        credentials.invalid = False
+        return credentials
+
+    def locked_put(self, credentials):
+        token_expiry = credentials.token_expiry
+        token = {
+            "version": self._version,
+            "access_token": credentials.access_token,
+            "token_expiry": token_expiry and token_expiry.strftime(EXPIRY_FORMAT),
+            "token_response": credentials.token_response,
+        }
+        with file_utils.atomic_write(self._path) as f:
+            json.dump(token, f)
+
+    def locked_delete(self):
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def _seconds_left(credentials):
+    if not credentials.access_token or credentials.access_token_expired:
+        return 0
+    if credentials.token_expiry is None:
+        return float("inf")
+    return (credentials.token_expiry - _utcnow()).total_seconds()
+
+
+def _token_age(credentials):
+    expires_in = (credentials.token_response or {}).get("expires_in")
+    if expires_in is None or credentials.token_expiry is None:
+        return 0
+    return max(0, int(expires_in) - _seconds_left(credentials))
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def _token_timeout():
+    return config_utils.get_config("TOKEN_REFRESH_TIMEOUT", 30)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Pinned discovery document of the Google Play Developer API """
+import json
+import logging
+import os
+import threading
+
+import requests
+
+from android_store_service.utils import config_utils, file_utils
+
+DISCOVERY_URL = "https://androidpublisher.googleapis.com/$discovery/rest?version=v3"
+PINNED_DOCUMENT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "discovery",
+    "androidpublisher.v3.json",
+)
+
+_document = None
+_document_lock = threading.Lock()
+
+
+def load_document():
+    """
+    Returns the androidpublisher v3 discovery document, as JSON text.
+
+    The document at DISCOVERY_DOCUMENT_PATH is used if it exists, the pinned
+    document shipped with the service otherwise. It is read once per process
+    and again only after the file has changed, e.g. by refresh_document. It is
+    kept unparsed, as build_from_document mutates the parsed document it is
+    given, and services are built from several threads.
+    """
+    global _document
+    path = _document_path()
+    stat = os.stat(path)
+    version = (path, stat.st_mtime_ns, stat.st_size)
+    with _document_lock:
+        if _document is None or _document[0] != version:
+            with open(path) as f:
+                _document = (version, f.read())
+            logging.info(f"Loaded discovery document {path}")
+        return _document[1]
+
+
+def refresh_document(path=None, url=DISCOVERY_URL):
+    """
+    Downloads the current discovery document and replaces the one at path.
+
+    :param path: (Optional) Where to write the document. Defaults to
+        DISCOVERY_DOCUMENT_PATH if configured, the pinned document otherwise.
+    :param url: (Optional) Where to download the document from.
+    :returns: The revision of the downloaded document
+    """
+    path = path or config_utils.get_config("DISCOVERY_DOCUMENT_PATH")
+    path = path or PINNED_DOCUMENT_PATH
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    document = response.json()
+    if (document.get("name"), document.get("version")) != ("androidpublisher", "v3"):
+        raise ValueError(f"{url} is not the androidpublisher v3 discovery document")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with file_utils.atomic_write(path) as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    logging.info(f"Refreshed {path} to revision {document.get('revision')}")
+    return document.get("revision")
+
+
+def _document_path():
+    path = config_utils.get_config("DISCOVERY_DOCUMENT_PATH")
+    if path and os.path.exists(path):
+        return path
+    return PINNED_DOCUMENT_PATH
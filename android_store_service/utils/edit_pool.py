@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Pool of open Play edits, created ahead of the requests that use them """
+import collections
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+from android_store_service.utils import cache_utils, config_utils, file_utils
+
+_generations = collections.Counter()
+_generations_lock = threading.Lock()
+
+
+def generation(package_name):
+    """
+    Returns the generation of the edits of package_name, which changes each
+    time an edit of the package is committed.
+
+    If EDIT_POOL_PATH, or else TRACKS_CACHE_PATH, is set, generations are
+    kept in files there, so that a commit in one worker also invalidates the
+    edits pooled and the tracks cached by the others.
+    """
+    path = _generation_path(package_name)
+    if path is None:
+        with _generations_lock:
+            return _generations[package_name]
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_generation(package_name):
+    with _generations_lock:
+        _generations[package_name] += 1
+    path = _generation_path(package_name)
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_utils.atomic_write(path) as f:
+            f.write(uuid.uuid4().hex)
+
+
+def _generation_path(package_name):
+    path = config_utils.get_config("EDIT_POOL_PATH") or config_utils.get_config(
+        "TRACKS_CACHE_PATH"
+    )
+    if not path:
+        return None
+    return os.path.join(path, f"{package_name}.generation")
+
+
+class EditPool:
+    def __init__(self, size, max_packages, margin):
+        """
+        Open edits per (package name, role, secret) key.
+
+        An edit is only handed out until margin seconds before Play expires
+        it, and only if no edit of its package was committed since it was
+        created, as committing an edit deletes the other open edits of the
+        package. Edits of the least recently used keys are dropped once more
+        than max_packages keys are pooled.
+
+        :param size: Number of edits kept ready per key, 0 disables refills
+        :param max_packages: Maximum number of pooled keys
+        :param margin: Seconds before their expiry edits are discarded
+        """
+        self.size = size
+        self.margin = margin
+        self._edits = cache_utils.TTLCache(max_packages, float("inf"))
+        self._lock = threading.Lock()
+        self._refilling = set()
+        self._executor = None
+
+    def checkout(self, key):
+        """Removes an open edit of key from the pool and returns its id."""
+        with self._lock:
+            edits = self._valid_edits(key)
+            return edits.popleft()[0] if edits else None
+
+    def peek(self, key):
+        """Returns the id of an open edit of key, leaving it in the pool."""
+        with self._lock:
+            edits = self._valid_edits(key)
+            return edits[0][0] if edits else None
+
+    def put(self, key, edit_id, expires_at, edit_generation):
+        """
+        Adds an edit created at edit_generation of its package, unless it
+        is about to expire, the package has had a commit since or the pool of
+        key is full. Returns whether the edit was added.
+        """
+        with self._lock:
+            edits = self._valid_edits(key)
+            if expires_at <= time.time() + self.margin:
+                return False
+            if edit_generation != generation(key[0]):
+                return False
+            if len(edits) >= max(self.size, 1):
+                return False
+            edits.append((edit_id, expires_at, edit_generation))
+            return True
+
+    def discard(self, key, edit_id):
+        """Removes edit_id from the edits of key. Returns whether it was pooled."""
+        with self._lock:
+            edits = self._edits.get(key, ())
+            for edit in edits:
+                if edit[0] == edit_id:
+                    edits.remove(edit)
+                    return True
+            return False
+
+    def clear(self, package_name=None):
+        """Drops the edits of package_name, or all edits."""
+        for key in self._edits.keys():
+            if package_name is None or key[0] == package_name:
+                self._edits.pop(key)
+
+    def refill(self, key, create):
+        """
+        Creates edits in the background until size edits of key are ready.
+
+        :param create: Callable creating an edit, returning its id and expiry
+            time in seconds since the epoch
+        """
+        with self._lock:
+            if self.size <= 0 or key in self._refilling:
+                return
+            self._refilling.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="edit-pool"
+                )
+        app = current_app._get_current_object() if has_app_context() else None
+        self._executor.submit(self._refill, app, key, create)
+
+    def _refill(self, app, key, create):
+        try:
+            if app is not None:
+                with app.app_context():
+                    self._create_edits(key, create)
+            else:
+                self._create_edits(key, create)
+        except Exception:
+            logging.exception(f"Failed to refill the edit pool of {key[0]}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def _create_edits(self, key, create):
+        while True:
+            with self._lock:
+                if len(self._valid_edits(key)) >= self.size:
+                    return
+            edit_generation = generation(key[0])
+            edit_id, expires_at = create()
+            if not self.put(key, edit_id, expires_at, edit_generation):
+                return
+
+    def _valid_edits(self, key):
+        """
+        Drops the edits of key that can no longer be handed out, and returns
+        the pooled deque of the others.
+        """
+        current = generation(key[0])
+        deadline = time.time() + self.margin
+        edits = collections.deque(
+            edit
+            for edit in self._edits.get(key, ())
+            if edit[1] > deadline and edit[2] == current
+        )
+        self._edits.set(key, edits)
+        return edits
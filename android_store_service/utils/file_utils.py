@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import binascii
+import contextlib
+import errno
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+_CHUNK_SIZE = 64 * 1024
+_NON_BASE64_CHARS = re.compile(rb"[^A-Za-z0-9+/=]")
+
+
+class StagedFile(str):
+    """
+    Path to an artifact that has already been written to disk.
+
+    Used in place of a base64 encoded ``media_body`` or ``deobfuscation_file``
+    so that staged payloads keep the shape described by the request schemas.
+    The sha1 and sha256 hex digests of the contents are attached when they
+    were computed while the artifact was written.
+    """
+
+    def __new__(cls, path, sha1=None, sha256=None):
+        staged_file = super().__new__(cls, path)
+        staged_file.sha1 = sha1
+        staged_file.sha256 = sha256
+        return staged_file
+
+
+class DigestWriter:
+    def __init__(self, file):
+        """
+        Computes the sha1 and sha256 digests of the bytes written to a file.
+
+        Other attributes are looked up on the wrapped file, so the writer can be
+        handed to code that expects the file itself.
+
+        :param file: Binary file object the bytes are written to, or None to
+            only compute the digests.
+        """
+        self._file = file
+        self._sha1 = hashlib.sha1()
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    @property
+    def sha1(self):
+        return self._sha1.hexdigest()
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, data):
+        self._sha1.update(data)
+        self._sha256.update(data)
+        self.size += len(data)
+        if self._file is not None:
+            return self._file.write(data)
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class Base64FileWriter:
+    def __init__(self, file):
+        """
+        Decodes base64 text into a binary file as it is written.
+
+        Input can be split at arbitrary positions. Characters outside of the
+        base64 alphabet are discarded, the same way base64.decodebytes does.
+        The size and digests of the decoded bytes are computed along the way.
+
+        :param file: Binary file object the decoded bytes are written to.
+        """
+        self._file = DigestWriter(file)
+        self._pending = b""
+
+    @property
+    def size(self):
+        return self._file.size
+
+    @property
+    def sha1(self):
+        return self._file.sha1
+
+    @property
+    def sha256(self):
+        return self._file.sha256
+
+    def write(self, text):
+        data = self._pending + _NON_BASE64_CHARS.sub(b"", text.encode("utf-8"))
+        end = len(data) - len(data) % 4
+        self._pending = data[end:]
+        self._write_decoded(data[:end])
+
+    def close(self):
+        """Decodes remaining input, raises binascii.Error if it is truncated."""
+        pending, self._pending = self._pending, b""
+        if pending:
+            self._write_decoded(pending)
+
+    def _write_decoded(self, data):
+        if not data:
+            return
+        self._file.write(binascii.a2b_base64(data))
+
+
+def digest_file(path, chunk_size=_CHUNK_SIZE):
+    """Reads the file at path, returns a DigestWriter holding its digests."""
+    writer = DigestWriter(None)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            writer.write(chunk)
+    return writer
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Yields a file that replaces the one at path once the with statement
+    completes, so that readers never see it partially written. The file at
+    path is left untouched if the body raises.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, path)
+
+
+def link_or_copy(source, destination):
+    """Hard links source to destination, copying it if they are on other devices."""
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(source, destination)
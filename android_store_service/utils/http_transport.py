@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Pooled HTTP transport for the Google API client libraries """
+import socket
+import threading
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+
+from android_store_service.utils import config_utils
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledHttp:
+    def __init__(self, session, timeout):
+        """
+        Drop-in replacement for httplib2.Http, backed by a requests.Session.
+
+        Unlike httplib2.Http it is thread-safe, and it keeps connections alive
+        in the pool of the session, which is shared by all PooledHttp objects
+        of the process. Redirects are only followed for GET and HEAD requests,
+        so that the 308 responses of resumable uploads reach the client.
+
+        :param session: requests.Session the requests are sent with
+        :param timeout: (connect, read) timeouts in seconds
+        """
+        self._session = session
+        self.timeout = timeout
+
+    def request(
+        self,
+        uri,
+        method="GET",
+        body=None,
+        headers=None,
+        redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type=None,
+    ):
+        try:
+            response = self._session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=method in ("GET", "HEAD") and redirections > 0,
+            )
+        except requests.Timeout as e:
+            raise socket.timeout(str(e))
+        except requests.ConnectionError as e:
+            # The client libraries retry on the builtin ConnectionError.
+            raise ConnectionError(str(e))
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info["status"] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+
+def get_http(timeout=None):
+    """
+    Returns a PooledHttp on the session of the process.
+
+    :param timeout: (Optional) timeout in seconds, overriding the configured
+        HTTP_CONNECT_TIMEOUT and HTTP_READ_TIMEOUT
+    """
+    if timeout is None:
+        timeout = (
+            config_utils.get_config("HTTP_CONNECT_TIMEOUT", 10),
+            config_utils.get_config("HTTP_READ_TIMEOUT", 300),
+        )
+    return PooledHttp(get_session(), timeout)
+
+
+def get_session():
+    """
+    Returns the session of the process, shared by the API clients and the
+    downloads of linked artifacts, so that connections to the same host are
+    pooled and reused.
+
+    Each host gets up to HTTP_POOL_SIZE connections, or as many as the
+    concurrent segments of concurrent downloads if greater, so that downloads
+    neither wait for a connection nor open ones that are then thrown away.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            downloads = config_utils.get_config("DOWNLOAD_CONCURRENCY", 1)
+            segments = config_utils.get_config("DOWNLOAD_SEGMENT_CONCURRENCY", 1)
+            pool_size = max(
+                config_utils.get_config("HTTP_POOL_SIZE", 10), downloads * segments
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
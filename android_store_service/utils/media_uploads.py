@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Media uploads to the Google Play Developer API """
+import hashlib
+import logging
+import time
+
+import requests
+from googleapiclient.http import MediaFileUpload, MediaUpload
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import config_utils, metrics_utils, retry_utils
+
+_READ_SIZE = 1024 * 1024
+# Resumable upload chunks must be a multiple of 256 KiB.
+_CHUNK_GRANULARITY = 256 * 1024
+
+
+def upload(request, operation="upload"):
+    """
+    Executes a resumable upload request chunk by chunk and returns its result.
+
+    The size of the next chunk is adapted to the throughput of the last one,
+    so that a chunk takes about UPLOAD_CHUNK_SECONDS. A chunk that fails with
+    an error the retry policy allows to retry is resumed from the last offset
+    acknowledged by the API, with a smaller chunk size.
+
+    :param request: googleapiclient HttpRequest with a resumable media body
+    :param operation: Name of the upload, used by the retry policy
+    """
+    media = request.resumable
+    if media is None:
+        return retry_utils.call(request.execute, operation)
+    retry = retry_utils.Retry(operation)
+    while True:
+        offset = request.resumable_progress
+        started = time.monotonic()
+        try:
+            status, response = request.next_chunk()
+        except Exception as e:
+            if not retry.backoff(e):
+                raise
+            logging.warning(f"Resuming upload at {offset} of {media.size()}")
+            _set_chunksize(media, media.chunksize() // 2)
+            continue
+
+        retry.reset()
+        progress = media.size() if response is not None else status.resumable_progress
+        seconds = max(time.monotonic() - started, 1e-6)
+        throughput = (progress - offset) / seconds
+        metrics_utils.ffwd_metric("upload-throughput", throughput)
+        if media.size():
+            metrics_utils.ffwd_metric("upload-progress", progress / media.size())
+        if response is not None:
+            return response
+        _set_chunksize(media, throughput * _chunk_seconds())
+
+
+def _set_chunksize(media, chunksize):
+    """Sets the chunk size of adaptive media, at most doubling it at a time."""
+    if not hasattr(media, "set_chunksize"):
+        return
+    chunksize = min(int(chunksize), media.chunksize() * 2, _max_chunk_size())
+    chunksize -= chunksize % _CHUNK_GRANULARITY
+    media.set_chunksize(max(chunksize, _min_chunk_size()))
+
+
+def _chunk_seconds():
+    return config_utils.get_config("UPLOAD_CHUNK_SECONDS", 10)
+
+
+def _min_chunk_size():
+    return config_utils.get_config("UPLOAD_MIN_CHUNK_SIZE", 1024**2)
+
+
+def _max_chunk_size():
+    return config_utils.get_config("UPLOAD_MAX_CHUNK_SIZE", 64 * 1024**2)
+
+
+class AdaptiveMediaFileUpload(MediaFileUpload):
+    def __init__(
+        self,
+        filename,
+        mimetype="application/octet-stream",
+        chunksize=8 * 1024**2,
+    ):
+        """
+        Resumable upload of a file, in chunks whose size upload() adapts as the
+        upload progresses. Chunks are read from the file when they are sent.
+
+        :param filename: Path to the file
+        :param mimetype: Mime type of the file
+        :param chunksize: Size of the first chunk, a multiple of 256 KiB
+        """
+        super().__init__(
+            filename, mimetype=mimetype, chunksize=chunksize, resumable=True
+        )
+
+    def set_chunksize(self, chunksize):
+        self._chunksize = chunksize
+
+
+class LinkMediaUpload(MediaUpload):
+    def __init__(
+        self,
+        session,
+        url,
+        size,
+        sha256=None,
+        chunksize=8 * 1024**2,
+        mimetype="application/octet-stream",
+    ):
+        """
+        Resumable upload of the file at url, streamed from the link as the
+        upload progresses.
+
+        At most one chunk and one read ahead are held in memory. The link is
+        requested when the first chunk is needed. Its size and sha256 are
+        checked before the last chunk is handed to the upload, so a truncated
+        or corrupted download never completes the upload.
+
+        :param session: requests.Session used to download the file
+        :param url: Link to the file
+        :param size: Size of the file, as announced by the link
+        :param sha256: (Optional) Expected sha256 of the file
+        :param chunksize: Size of the uploaded chunks, a multiple of 256 KiB
+        :param mimetype: Mime type of the file
+        """
+        super().__init__()
+        self._session = session
+        self._url = url
+        self._size = size
+        self._expected_sha256 = sha256
+        self._chunksize = chunksize
+        self._mimetype = mimetype
+        self._sha256 = hashlib.sha256()
+        self._response = None
+        self._chunks = None
+        self._received = 0
+        self._eof = False
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def chunksize(self):
+        return self._chunksize
+
+    def set_chunksize(self, chunksize):
+        self._chunksize = chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        if begin < self._offset:
+            raise ValueError(
+                f"Cannot read {self._url} from {begin}, "
+                f"it has been streamed up to {self._offset}"
+            )
+        del self._buffer[: begin - self._offset]
+        self._offset = begin
+        # Reading past the requested bytes detects the end of the file before
+        # the last chunk is uploaded.
+        while len(self._buffer) <= length and not self._eof:
+            self._read()
+        return bytes(self._buffer[:length])
+
+    def close(self):
+        """Closes the response the file is streamed from, if it was requested."""
+        if self._response is not None:
+            self._response.close()
+
+    def _read(self):
+        try:
+            if self._chunks is None:
+                self._response = self._session.get(self._url, stream=True)
+                try:
+                    self._response.raise_for_status()
+                except requests.HTTPError as e:
+                    raise BadRequestException(f"Failed to download {self._url}: {e}")
+                self._chunks = self._response.iter_content(chunk_size=_READ_SIZE)
+            chunk = next(self._chunks, None)
+        except Exception:
+            self.close()
+            raise
+
+        if chunk is None:
+            self._eof = True
+            self.close()
+            self._verify()
+            return
+        self._sha256.update(chunk)
+        self._received += len(chunk)
+        self._buffer.extend(chunk)
+
+    def _verify(self):
+        if self._received != self._size:
+            raise BadRequestException(
+                f"Received {self._received} of {self._size} bytes from {self._url}"
+            )
+        sha256 = self._sha256.hexdigest()
+        if self._expected_sha256 and self._expected_sha256.lower() != sha256:
+            raise BadRequestException(
+                f"The sha256 of {self._url} is {sha256}, "
+                f"expected {self._expected_sha256}"
+            )
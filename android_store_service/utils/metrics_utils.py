@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shumway
+
+_metric_relay = None
+
+
+def setup_metrics(app_config):
+    global _metric_relay
+    _metric_relay = shumway.MetricRelay(
+        app_config.get("METRICS_KEY"), app_config.get("METRICS_FFWD_HOST")
+    )
+    return _metric_relay
+
+
+def ffwd_metric(metric, value, attrs=None):
+    attrs = dict(attrs or {})
+    attrs["project"] = "some_project"
+    if _metric_relay is not None:
+        _metric_relay.emit(metric, value, attributes=attrs)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Parsing of multipart/form-data upload payloads """
+import json
+import os
+import tempfile
+
+from werkzeug.formparser import FormDataParser
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils.file_utils import DigestWriter, StagedFile
+from android_store_service.utils.streaming_json import BINARY_FIELDS
+
+METADATA_PART = "metadata"
+
+
+def load(request, directory, binary_fields=BINARY_FIELDS):
+    """
+    Parses a multipart/form-data upload payload, streaming file parts to disk.
+
+    The metadata part holds the same JSON document as the JSON variant of the
+    endpoint, except that the members named in binary_fields hold the name of
+    the part carrying the raw binary instead of its base64 encoding. Those
+    members are replaced by StagedFile paths in the returned document.
+
+    :param request: The incoming multipart/form-data request
+    :param directory: Directory the file parts are written to
+    :param binary_fields: Names of the members referring to binary parts
+    """
+    staged_files = []
+
+    def stream_factory(
+        total_content_length, content_type, filename, content_length=None
+    ):
+        fd, path = tempfile.mkstemp(dir=directory)
+        os.close(fd)
+        staged_file = open(path, "wb+")
+        staged_files.append(staged_file)
+        return DigestWriter(staged_file)
+
+    parser = FormDataParser(stream_factory=stream_factory, silent=False)
+    try:
+        _, form, files = parser.parse(
+            request.stream,
+            request.mimetype,
+            request.content_length,
+            request.mimetype_params,
+        )
+    except ValueError as e:
+        raise BadRequestException(f"Invalid multipart payload: {e}")
+    finally:
+        for staged_file in staged_files:
+            staged_file.close()
+
+    if METADATA_PART in files:
+        with open(files[METADATA_PART].stream.name, "rb") as f:
+            metadata = f.read()
+    elif METADATA_PART in form:
+        metadata = form[METADATA_PART]
+    else:
+        raise BadRequestException(f"Missing '{METADATA_PART}' part")
+
+    try:
+        data = json.loads(metadata)
+    except ValueError as e:
+        raise BadRequestException(f"Invalid JSON in '{METADATA_PART}' part: {e}")
+    _stage_parts(data, files, binary_fields)
+    return data
+
+
+def _stage_parts(value, files, binary_fields):
+    if isinstance(value, dict):
+        for key, member in value.items():
+            if key in binary_fields and isinstance(member, str) and member:
+                if member not in files:
+                    raise BadRequestException(
+                        f"Missing file part '{member}' referred to by '{key}'"
+                    )
+                stream = files[member].stream
+                value[key] = StagedFile(
+                    stream.name, sha1=stream.sha1, sha256=stream.sha256
+                )
+            else:
+                _stage_parts(member, files, binary_fields)
+    elif isinstance(value, list):
+        for item in value:
+            _stage_parts(item, files, binary_fields)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from android_store_service.utils import multipart_form, streaming_json
+
+
+def load_upload_payload(request, directory):
+    """
+    Loads the payload of a binary upload request, staging binaries in directory.
+
+    Accepts either a JSON document with base64 encoded binaries, or a
+    multipart/form-data payload with a JSON metadata part and raw binary parts.
+    """
+    if request.mimetype == "multipart/form-data":
+        return multipart_form.load(request, directory)
+    return streaming_json.load(request.stream, directory)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Rate limiting of Play API calls per service account """
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+from android_store_service.exceptions import TooManyRequestsException
+from android_store_service.utils import config_utils, metrics_utils
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def acquire(secret, wait=None):
+    """
+    Takes a token from the bucket of the service account in secret, waiting
+    for one for up to wait seconds (RATE_LIMIT_WAIT by default).
+
+    Buckets hold up to RATE_LIMIT_BURST tokens and refill at RATE_LIMIT_RATE
+    tokens per second. Without RATE_LIMIT_RATE calls are not limited. If
+    RATE_LIMIT_PATH is set, buckets are kept in files there, so that all
+    workers share them.
+
+    Raises TooManyRequestsException if no token is available in time.
+    """
+    rate = config_utils.get_config("RATE_LIMIT_RATE")
+    if not rate:
+        return
+    burst = config_utils.get_config("RATE_LIMIT_BURST", rate)
+    if wait is None:
+        wait = config_utils.get_config("RATE_LIMIT_WAIT", 30)
+    attrs = {"secret": secret}
+    started = time.monotonic()
+    queued = False
+    while True:
+        delay = _take(secret, rate, burst)
+        if delay == 0:
+            if queued:
+                waited = time.monotonic() - started
+                metrics_utils.ffwd_metric("play-api-rate-limit-wait", waited, attrs)
+            return
+        if time.monotonic() + delay > started + wait:
+            metrics_utils.ffwd_metric("play-api-rate-limit-rejected", 1, attrs)
+            raise TooManyRequestsException(
+                f"Rate limit of {secret} exceeded", retry_after=math.ceil(delay)
+            )
+        if not queued:
+            metrics_utils.ffwd_metric("play-api-rate-limit-queued", 1, attrs)
+            queued = True
+        time.sleep(delay)
+
+
+def _take(secret, rate, burst):
+    """Takes a token, or returns how many seconds until one is available."""
+    path = config_utils.get_config("RATE_LIMIT_PATH")
+    if path:
+        return _take_from_file(os.path.join(path, f"{secret}.json"), rate, burst)
+    with _buckets_lock:
+        bucket = _buckets.get(secret)
+        delay, _buckets[secret] = _refill_and_take(bucket, rate, burst)
+        return delay
+
+
+def _take_from_file(path, rate, burst):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            bucket = json.loads(f.read())
+        except ValueError:
+            bucket = None
+        delay, bucket = _refill_and_take(bucket, rate, burst)
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(bucket))
+        return delay
+
+
+def _refill_and_take(bucket, rate, burst):
+    """
+    Returns the delay until a token is available, 0 if one was taken, and the
+    new state of bucket.
+    """
+    now = time.time()
+    if bucket is None:
+        tokens = burst
+    else:
+        elapsed = max(now - bucket["updated"], 0)
+        tokens = min(bucket["tokens"] + elapsed * rate, burst)
+    if tokens >= 1:
+        return 0, {"tokens": tokens - 1, "updated": now}
+    return (1 - tokens) / rate, {"tokens": tokens, "updated": now}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Retry policy for calls to the Google Play Developer API """
+import email.utils
+import logging
+import random
+import socket
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from android_store_service import exceptions
+from android_store_service.utils import config_utils, metrics_utils
+
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def call(function, operation):
+    """
+    Calls function, retrying it according to the retry policy, and returns its
+    result.
+
+    :param function: Callable making one attempt at the operation
+    :param operation: Name of the operation, e.g. edits.insert, used in logs
+        and metrics
+    """
+    retry = Retry(operation)
+    while True:
+        try:
+            return function()
+        except Exception as error:
+            if not retry.backoff(error):
+                raise
+
+
+def retry_reason(error):
+    """
+    Returns why error may be retried, or None if it must not be.
+
+    429s and 403s for exceeded rate limits are retried as rate-limit, 5xx
+    responses as server-error, and timeouts and dropped connections as timeout
+    and connection. Other errors are not retried.
+    """
+    if isinstance(error, HttpError):
+        if error.resp.status == 429 or _is_rate_limit(error):
+            return "rate-limit"
+        if error.resp.status >= 500:
+            return "server-error"
+        return None
+    if isinstance(error, socket.timeout):
+        return "timeout"
+    if isinstance(error, ConnectionError):
+        return "connection"
+    return None
+
+
+def _is_rate_limit(error):
+    if error.resp.status != 403:
+        return False
+    details = exceptions.parse_httperror(error).get("error", {})
+    errors = details.get("errors", []) if isinstance(details, dict) else []
+    return any(e.get("reason") in _RATE_LIMIT_REASONS for e in errors)
+
+
+def _retry_after(error):
+    """Returns the delay in seconds requested by the Retry-After of error."""
+    if not isinstance(error, HttpError):
+        return None
+    value = error.resp.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+class Retry:
+    def __init__(self, operation):
+        """
+        Retry state of one operation.
+
+        An operation is attempted up to RETRY_MAX_ATTEMPTS times, and not
+        retried once RETRY_DEADLINE seconds have passed since its first attempt.
+        Delays grow exponentially from RETRY_BASE_DELAY up to RETRY_MAX_DELAY,
+        with full jitter, and are at least the Retry-After of the response.
+        Each retry is also withdrawn from the retry budget of the process.
+        """
+        self.operation = operation
+        self.attempts = 1
+        self.started = time.monotonic()
+        retry_budget().deposit()
+
+    def reset(self):
+        """Starts over after the operation made progress, e.g. a chunk upload."""
+        self.attempts = 1
+        self.started = time.monotonic()
+
+    def backoff(self, error):
+        """
+        Waits before the next attempt after error. Returns False, without
+        waiting, if the operation must not be retried.
+        """
+        reason = retry_reason(error)
+        if reason is None:
+            return False
+        attrs = {"operation": self.operation, "reason": reason}
+        if self.attempts >= config_utils.get_config("RETRY_MAX_ATTEMPTS", 4):
+            return False
+
+        delay = random.uniform(
+            0,
+            min(
+                config_utils.get_config("RETRY_BASE_DELAY", 1) * 2**self.attempts,
+                config_utils.get_config("RETRY_MAX_DELAY", 32),
+            ),
+        )
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        deadline = self.started + config_utils.get_config("RETRY_DEADLINE", 300)
+        if time.monotonic() + delay > deadline:
+            metrics_utils.ffwd_metric("play-api-retry-deadline-exceeded", 1, attrs)
+            return False
+        if not retry_budget().withdraw():
+            metrics_utils.ffwd_metric("play-api-retry-budget-exhausted", 1, attrs)
+            logging.warning(f"Not retrying {self.operation}, retry budget exhausted")
+            return False
+
+        logging.warning(
+            f"Retrying {self.operation} in {delay:.1f}s "
+            f"(attempt {self.attempts + 1}, {reason}): {error}"
+        )
+        metrics_utils.ffwd_metric("play-api-retry", 1, attrs)
+        metrics_utils.ffwd_metric("play-api-retry-delay", delay, attrs)
+        time.sleep(delay)
+        self.attempts += 1
+        return True
+
+
+def retry_budget():
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = RetryBudget(
+                config_utils.get_config("RETRY_BUDGET_MAX", 20),
+                config_utils.get_config("RETRY_BUDGET_RATIO", 0.1),
+            )
+        return _budget
+
+
+class RetryBudget:
+    def __init__(self, max_tokens, ratio):
+        """
+        Bounds the retries of a process to a ratio of its operations.
+
+        Each operation deposits ratio tokens and each retry withdraws one, so
+        that during an outage retries stop once the max_tokens saved up while
+        healthy are spent, instead of multiplying the load on the API.
+
+        :param max_tokens: Most retries that can be saved up
+        :param ratio: Retries allowed per operation, in the long run
+        """
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Incremental JSON parsing of upload payloads """
+import binascii
+import codecs
+import json
+import os
+import re
+import tempfile
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils.file_utils import Base64FileWriter, StagedFile
+
+BINARY_FIELDS = ("media_body", "deobfuscation_file")
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+_LITERAL_END = re.compile(r"[\s,\]}]")
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def load(stream, directory, binary_fields=BINARY_FIELDS):
+    """
+    Parses a JSON document from a binary stream, reading it in fixed-size chunks.
+
+    String values of the members named in binary_fields are base64 decoded
+    straight into files in directory while the stream is read, and are
+    replaced by StagedFile paths in the returned document.
+
+    :param stream: File-like object with the JSON document, e.g. request.stream
+    :param directory: Directory the decoded binaries are written to
+    :param binary_fields: Names of the members holding base64 encoded binaries
+    """
+    return _StreamingJsonParser(stream, directory, binary_fields).parse()
+
+
+class _StreamingJsonParser:
+    def __init__(self, stream, directory, binary_fields):
+        self._stream = stream
+        self._directory = directory
+        self._binary_fields = binary_fields
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def parse(self):
+        value = self._parse_value(None)
+        self._skip_whitespace()
+        if self._pos < len(self._buffer):
+            raise self._error("Extra data")
+        return value
+
+    def _fill(self):
+        """Reads the next chunk of the stream, returns False once it is exhausted."""
+        if self._eof:
+            return False
+        chunk = self._stream.read(_CHUNK_SIZE)
+        self._eof = not chunk
+        try:
+            text = self._decoder.decode(chunk, final=self._eof)
+        except UnicodeDecodeError as e:
+            raise BadRequestException(f"Invalid JSON payload: {e}")
+        pos, self._pos = self._pos, 0
+        self._buffer = self._buffer[pos:] + text
+        return bool(text) or not self._eof
+
+    def _ensure(self, length):
+        while len(self._buffer) - self._pos < length:
+            if not self._fill():
+                raise self._error("Unexpected end of data")
+
+    def _peek(self):
+        self._ensure(1)
+        return self._buffer[self._pos]
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def _skip_whitespace(self):
+        while True:
+            while (
+                self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE
+            ):
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def _parse_value(self, key):
+        self._skip_whitespace()
+        char = self._peek()
+        if char == "{":
+            return self._parse_object()
+        if char == "[":
+            return self._parse_array()
+        if char == '"':
+            if key in self._binary_fields:
+                return self._stage_string(key)
+            return self._parse_string()
+        return self._parse_literal()
+
+    def _parse_object(self):
+        self._expect("{")
+        result = {}
+        self._skip_whitespace()
+        if self._peek() == "}":
+            self._pos += 1
+            return result
+        while True:
+            self._skip_whitespace()
+            if self._peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self._parse_string()
+            self._skip_whitespace()
+            self._expect(":")
+            result[key] = self._parse_value(key)
+            self._skip_whitespace()
+            if self._peek() == "}":
+                self._pos += 1
+                return result
+            self._expect(",")
+
+    def _parse_array(self):
+        self._expect("[")
+        result = []
+        self._skip_whitespace()
+        if self._peek() == "]":
+            self._pos += 1
+            return result
+        while True:
+            result.append(self._parse_value(None))
+            self._skip_whitespace()
+            if self._peek() == "]":
+                self._pos += 1
+                return result
+            self._expect(",")
+
+    def _parse_literal(self):
+        parts = []
+        while True:
+            start = self._pos
+            match = _LITERAL_END.search(self._buffer, start)
+            end = match.start() if match else len(self._buffer)
+            parts.append(self._buffer[start:end])
+            self._pos = end
+            if match or not self._fill():
+                break
+        return self._decode("".join(parts))
+
+    def _parse_string(self):
+        parts = []
+        self._read_string(lambda text, escape: parts.append(text))
+        return self._decode('"' + "".join(parts) + '"')
+
+    def _stage_string(self, key):
+        fd, path = tempfile.mkstemp(dir=self._directory)
+        with os.fdopen(fd, "wb") as f:
+            writer = Base64FileWriter(f)
+
+            def write(text, escape):
+                writer.write(self._decode('"' + text + '"') if escape else text)
+
+            try:
+                self._read_string(write)
+                writer.close()
+            except binascii.Error as e:
+                raise BadRequestException(f"Invalid base64 in '{key}': {e}")
+        if writer.size == 0:
+            # An empty string stands for no file, e.g. no deobfuscation file.
+            os.remove(path)
+            return ""
+        return StagedFile(path, sha1=writer.sha1, sha256=writer.sha256)
+
+    def _read_string(self, sink):
+        """
+        Feeds the raw contents of the string at the current position to sink.
+
+        sink is called with each raw piece of text and whether that piece is a
+        complete escape sequence, so it never has to buffer the whole string.
+        """
+        self._expect('"')
+        while True:
+            start = self._pos
+            match = _STRING_SPECIAL.search(self._buffer, start)
+            end = match.start() if match else len(self._buffer)
+            if end > start:
+                sink(self._buffer[start:end], False)
+            self._pos = end
+            if not match:
+                self._ensure(1)
+                continue
+            if match.group() == '"':
+                self._pos += 1
+                return
+            self._ensure(2)
+            length = 6 if self._buffer[self._pos + 1] == "u" else 2
+            self._ensure(length)
+            start = self._pos
+            end = self._pos = start + length
+            sink(self._buffer[start:end], True)
+
+    def _decode(self, text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BadRequestException(f"Invalid JSON payload: {e.msg}")
+
+    def _error(self, message):
+        return BadRequestException(f"Invalid JSON payload: {message}")
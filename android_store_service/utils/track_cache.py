@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Cache of the track listings of packages """
+import json
+import os
+import threading
+import time
+
+from android_store_service.utils import (
+    cache_utils,
+    concurrency_utils,
+    config_utils,
+    edit_pool,
+    file_utils,
+    metrics_utils,
+)
+
+_tracks = None
+_tracks_lock = threading.Lock()
+
+_flights = concurrency_utils.SingleFlight()
+
+
+def get(package_name, load):
+    """
+    Returns the tracks of package_name and their age in seconds, loading them
+    with load(package_name) unless they were cached less than TRACKS_CACHE_TTL
+    seconds ago. The age is None if the tracks were just loaded.
+
+    Tracks are cached per worker and, if TRACKS_CACHE_PATH is set, in files
+    shared by all workers. They are dropped when an edit of the package is
+    committed, in all workers as long as the edit generations are shared
+    too, which they are once TRACKS_CACHE_PATH is set. Concurrent loads of
+    the same package within a worker are coalesced into one.
+    """
+    ttl = config_utils.get_config("TRACKS_CACHE_TTL", 0)
+    if not ttl:
+        return _load(package_name, load)[0], None
+
+    generation = edit_pool.generation(package_name)
+    entry = _cache().get(package_name) or _read_file(package_name)
+    if entry is not None and entry["generation"] == generation:
+        age = max(time.time() - entry["fetched_at"], 0)
+        if age < ttl:
+            metrics_utils.ffwd_metric("tracks-cache", 1, {"result": "hit"})
+            return entry["tracks"], age
+
+    metrics_utils.ffwd_metric("tracks-cache", 1, {"result": "miss"})
+    tracks, coalesced = _load(package_name, load)
+    if not coalesced:
+        entry = {"tracks": tracks, "fetched_at": time.time(), "generation": generation}
+        _cache().set(package_name, entry, ttl)
+        _write_file(package_name, entry)
+    return tracks, None
+
+
+def _load(package_name, load):
+    """
+    Loads the tracks of package_name, sharing the call with any load of the
+    package already in flight in the worker. Returns the tracks and whether
+    the call was shared.
+    """
+    tracks, coalesced = _flights.do(package_name, lambda: load(package_name))
+    if coalesced:
+        metrics_utils.ffwd_metric("tracks-coalesced", 1)
+    return tracks, coalesced
+
+
+def invalidate(package_name):
+    """Drops the cached tracks of package_name, e.g. once an edit is committed."""
+    _cache().pop(package_name)
+    path = _file_path(package_name)
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _cache():
+    global _tracks
+    with _tracks_lock:
+        if _tracks is None:
+            _tracks = cache_utils.TTLCache(
+                config_utils.get_config("TRACKS_CACHE_SIZE", 256),
+                config_utils.get_config("TRACKS_CACHE_TTL", 0),
+            )
+        return _tracks
+
+
+def _file_path(package_name):
+    path = config_utils.get_config("TRACKS_CACHE_PATH")
+    if not path:
+        return None
+    return os.path.join(path, f"{package_name}.json")
+
+
+def _read_file(package_name):
+    path = _file_path(package_name)
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_file(package_name, entry):
+    path = _file_path(package_name)
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with file_utils.atomic_write(path) as f:
+        json.dump(entry, f)
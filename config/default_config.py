@@ -18,3 +18,52 @@ LOGGING_LEVEL = "INFO"
 METRICS_KEY = "some_key"
 METRICS_FFWD_HOST = "127.0.0.1"
 DEBUG = True
+STAGING_PATH = None
+STAGING_SESSION_TTL = 6 * 3600
+ARTIFACT_STORE_PATH = None
+ARTIFACT_STORE_MAX_BYTES = 10 * 1024 ** 3
+ARTIFACT_STORE_MAX_AGE = 7 * 24 * 3600
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_SEGMENT_SIZE = 64 * 1024 ** 2
+DOWNLOAD_SEGMENT_CONCURRENCY = 4
+STREAMING_CHUNK_SIZE = 8 * 1024 ** 2
+PUBLISHER_SERVICE_POOL_SIZE = 32
+PUBLISHER_SERVICE_TTL = 3600
+DISCOVERY_DOCUMENT_PATH = None
+SECRETS_POLL_INTERVAL = 10
+TOKEN_REFRESH_INTERVAL = None
+TOKEN_REFRESH_MARGIN = 600
+TOKEN_REFRESH_TIMEOUT = 30
+TOKEN_CACHE_PATH = None
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 300
+UPLOAD_CHUNK_SIZE = 8 * 1024 ** 2
+UPLOAD_MIN_CHUNK_SIZE = 1024 ** 2
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 ** 2
+UPLOAD_CHUNK_SECONDS = 10
+UPLOAD_CONCURRENCY = 4
+TRACK_CONCURRENCY = 4
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 32
+RETRY_DEADLINE = 300
+RETRY_BUDGET_MAX = 20
+RETRY_BUDGET_RATIO = 0.1
+RATE_LIMIT_RATE = None
+RATE_LIMIT_BURST = 20
+RATE_LIMIT_WAIT = 30
+RATE_LIMIT_PATH = None
+CIRCUIT_BREAKER_WINDOW = 60
+CIRCUIT_BREAKER_MIN_CALLS = 10
+CIRCUIT_BREAKER_FAILURE_RATIO = 0.5
+CIRCUIT_BREAKER_SLOW_CALL = 30
+CIRCUIT_BREAKER_OPEN_SECONDS = 30
+CIRCUIT_BREAKER_HALF_OPEN_CALLS = 3
+EDIT_POOL_SIZE = 0
+EDIT_POOL_PACKAGES = 32
+EDIT_POOL_EXPIRY_MARGIN = 600
+EDIT_POOL_PATH = None
+TRACKS_CACHE_TTL = 30
+TRACKS_CACHE_SIZE = 256
+TRACKS_CACHE_PATH = None
@@ -69,6 +69,7 @@ setup(
     author_email=find_meta("email"),
     url=find_meta("url"),
     packages=find_packages(exclude=["tests*"]),
+    package_data={NAME: ["discovery/*.json"]},
     entry_points={"console_scripts": []},
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -12,6 +12,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import base64
+
+from android_store_service.utils.file_utils import StagedFile
+
+
 class MockGooglePlayResponse(object):
     def __init__(self, status, reason=None):
         self.status = status
@@ -20,3 +25,34 @@ class MockGooglePlayResponse(object):
 
 def mock_httperror_content(code, message):
     return {"error": {"code": code, "message": message}}
+
+
+def record_staged_calls(mock, return_value):
+    """
+    Makes an upload logic mock record its calls with every staged file replaced
+    by its base64 encoded content, as the staging directory is removed once
+    the request is done.
+    """
+    calls = []
+
+    def side_effect(package_name, tracks, binaries, dry_run):
+        calls.append((package_name, tracks, read_staged_files(binaries), dry_run))
+        return return_value
+
+    mock.side_effect = side_effect
+    return calls
+
+
+def read_staged_files(binaries):
+    return [
+        {
+            key: _read_base64(value) if isinstance(value, StagedFile) else value
+            for key, value in binary.items()
+        }
+        for binary in binaries
+    ]
+
+
+def _read_base64(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
@@ -13,11 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import threading
 from unittest.mock import call, patch, Mock
 
+import httplib2
 import pytest
 from googleapiclient.errors import HttpError
 
+from android_store_service import main
 from android_store_service.logic import apks_logic
 from tests.helpers.mock_utils import mock_httperror_content
 
@@ -36,7 +39,7 @@ create_apks_params = [
         [call(edit_id, apk_path_mock)],
         [1],
         [call(edit_id, 1, deobfuscation_path_mock)],
-        [call(edit_id, [1], "alpha")],
+        [call(edit_id, [1], ["alpha"])],
     ),
     (
         ["alpha", "beta"],
@@ -60,7 +63,7 @@ create_apks_params = [
             call(edit_id, 2, deobfuscation_path_mock),
             call(edit_id, 3, deobfuscation_path_mock),
         ],
-        [call(edit_id, [2, 3], "alpha"), call(edit_id, [2, 3], "beta")],
+        [call(edit_id, [2, 3], ["alpha", "beta"])],
     ),
     (
         ["alpha", "beta"],
@@ -78,7 +81,7 @@ create_apks_params = [
         [call(edit_id, apk_path_mock), call(edit_id, apk_path_mock)],
         [2, 3],
         [call(edit_id, 2, deobfuscation_path_mock)],
-        [call(edit_id, [2, 3], "alpha"), call(edit_id, [2, 3], "beta")],
+        [call(edit_id, [2, 3], ["alpha", "beta"])],
     ),
 ]
 
@@ -92,7 +95,7 @@ create_apks_params = [
     "exp_upload_apk_calls,"
     "upload_apks_side_effects,"
     "exp_upload_deobfuscation_calls,"
-    "exp_promote_to_track_calls",
+    "exp_promote_to_tracks_calls",
     create_apks_params,
 )
 def test_create_builds_apks(
@@ -104,7 +107,7 @@ def test_create_builds_apks(
     exp_upload_apk_calls,
     upload_apks_side_effects,
     exp_upload_deobfuscation_calls,
-    exp_promote_to_track_calls,
+    exp_promote_to_tracks_calls,
 ):
 
     gp_service_mock = Mock()
@@ -113,7 +116,7 @@ def test_create_builds_apks(
     )
 
     android_store_service_mock.return_value = gp_service_mock
-    gp_service_mock.create_edit.return_value = edit_id
+    gp_service_mock.checkout_edit.return_value = edit_id
     gp_service_mock.upload_apk.side_effect = upload_apks_side_effects
     shared_logic_mock.store_binaries_to_directory.return_value = (
         store_binaries_return_value
@@ -129,7 +132,7 @@ def test_create_builds_apks(
     gp_service_mock.upload_deobfuscation_file.assert_has_calls(
         exp_upload_deobfuscation_calls
     )
-    gp_service_mock.promote_to_track.assert_has_calls(exp_promote_to_track_calls)
+    gp_service_mock.promote_to_tracks.assert_has_calls(exp_promote_to_tracks_calls)
     gp_service_mock.validate_edit.assert_called_once_with(edit_id)
     gp_service_mock.commit_edit.assert_called_once_with(edit_id)
     shared_logic_mock.delete_temporary_dir.assert_called_once_with(
@@ -194,6 +197,7 @@ upload_apk_exception_params = [
 @pytest.mark.parametrize("exc", upload_apk_exception_params)
 def test_upload_apk_exception(android_store_service_mock, shared_logic_mock, exc):
     gp_service_mock = Mock()
+    gp_service_mock.replace_rejected_edit.return_value = None
     shared_logic_mock.create_temporary_directory.return_value = (
         temp_dir_mock_return_value
     )
@@ -209,7 +213,7 @@ def test_upload_apk_exception(android_store_service_mock, shared_logic_mock, exc
     shared_logic_mock.delete_temporary_dir.assert_called_once_with(
         temp_dir_mock_return_value
     )
-    gp_service_mock.promote_to_track.assert_not_called()
+    gp_service_mock.promote_to_tracks.assert_not_called()
     gp_service_mock.commit_edit.assert_not_called()
 
 
@@ -217,6 +221,7 @@ def test_upload_apk_exception(android_store_service_mock, shared_logic_mock, exc
 @patch("android_store_service.logic.apks_logic.GooglePlayBuildService")
 def test_upload_apk_duplicate(android_store_service_mock, shared_logic_mock):
     gp_service_mock = Mock()
+    gp_service_mock.replace_rejected_edit.return_value = None
     shared_logic_mock.create_temporary_directory.return_value = (
         temp_dir_mock_return_value
     )
@@ -241,5 +246,67 @@ def test_upload_apk_duplicate(android_store_service_mock, shared_logic_mock):
     shared_logic_mock.delete_temporary_dir.assert_called_once_with(
         temp_dir_mock_return_value
     )
-    gp_service_mock.promote_to_track.assert_not_called()
+    gp_service_mock.promote_to_tracks.assert_not_called()
     gp_service_mock.commit_edit.assert_not_called()
+
+
+@patch("android_store_service.logic.apks_logic.shared_logic")
+@patch("android_store_service.logic.apks_logic.GooglePlayBuildService")
+def test_upload_apks_concurrently(android_store_service_mock, shared_logic_mock):
+    gp_service_mock = Mock()
+    android_store_service_mock.return_value = gp_service_mock
+    gp_service_mock.checkout_edit.return_value = edit_id
+    shared_logic_mock.store_binaries_to_directory.return_value = [
+        {"binary_path": f"/tmp/foo/{i}.apk", "deobfuscation_path": f"/tmp/foo/{i}.txt"}
+        for i in range(3)
+    ]
+    # Every upload waits for the others, so they must run concurrently.
+    barrier = threading.Barrier(3, timeout=5)
+
+    def upload_apk(edit, path):
+        barrier.wait()
+        return 10 + int(path[-5])
+
+    gp_service_mock.upload_apk.side_effect = upload_apk
+
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"UPLOAD_CONCURRENCY": 3}):
+            version_codes = apks_logic.upload_apks(
+                package_name, ["alpha"], [{}, {}, {}], False
+            )
+
+    assert version_codes == [10, 11, 12]
+    gp_service_mock.upload_deobfuscation_file.assert_has_calls(
+        [call(edit_id, 10 + i, f"/tmp/foo/{i}.txt") for i in range(3)],
+        any_order=True,
+    )
+    gp_service_mock.promote_to_tracks.assert_called_once_with(
+        edit_id, [10, 11, 12], ["alpha"]
+    )
+
+
+@patch("android_store_service.logic.apks_logic.shared_logic")
+@patch("android_store_service.logic.apks_logic.GooglePlayBuildService")
+def test_upload_apks_retries_rejected_edit(
+    android_store_service_mock, shared_logic_mock
+):
+    gp_service_mock = Mock()
+    android_store_service_mock.return_value = gp_service_mock
+    gp_service_mock.checkout_edit.return_value = "pooled-edit"
+    deleted = HttpError(httplib2.Response({"status": 404}), b"Edit deleted")
+    gp_service_mock.replace_rejected_edit.return_value = edit_id
+    gp_service_mock.upload_apk.side_effect = [deleted, 1337]
+    shared_logic_mock.store_binaries_to_directory.return_value = [
+        {"binary_path": apk_path_mock, "deobfuscation_path": None}
+    ]
+
+    version_codes = apks_logic.upload_apks(package_name, ["alpha"], [{}], False)
+
+    assert version_codes == [1337]
+    gp_service_mock.replace_rejected_edit.assert_called_once_with(
+        "pooled-edit", deleted
+    )
+    gp_service_mock.promote_to_tracks.assert_called_once_with(
+        edit_id, [1337], ["alpha"]
+    )
+    gp_service_mock.commit_edit.assert_called_once_with(edit_id)
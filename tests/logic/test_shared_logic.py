@@ -13,9 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import os
 from unittest.mock import patch, mock_open, call
 
+import pytest
+from googleapiclient.http import MediaInMemoryUpload
+
+from android_store_service.exceptions import BadRequestException
 from android_store_service.logic import shared_logic
+from android_store_service.utils.file_utils import StagedFile
 
 
 @patch("android_store_service.logic.shared_logic.tempfile")
@@ -53,11 +60,14 @@ def test_store_base64_as_binary_file(tempfile_mock):
     file_content = "SGVsbG8sIFdvcmxk"
     m = mock_open()
     with patch("android_store_service.logic.shared_logic.open", m, create=True):
-        shared_logic.store_base64_as_binary_file(temp_dir, file_content)
+        path = shared_logic.store_base64_as_binary_file(temp_dir, file_content)
     m.assert_called_once_with(temp_file, "wb")
     tempfile_mock.mkstemp.assert_called_once_with(dir=temp_dir)
     handle = m()
     handle.write.assert_called_once_with(b"Hello, World")
+    assert path == temp_file
+    assert path.sha1 == hashlib.sha1(b"Hello, World").hexdigest()
+    assert path.sha256 == hashlib.sha256(b"Hello, World").hexdigest()
 
 
 @patch("android_store_service.logic.shared_logic.store_base64_as_text_file")
@@ -88,3 +98,103 @@ def test_store_binaries_to_directory(store_binary_file_mock, store_text_file_moc
     store_text_file_mock.assert_has_calls(
         [call(temp_dir, "text_content_1"), call(temp_dir, "text_content_2")]
     )
+
+
+@patch("android_store_service.logic.shared_logic.store_base64_as_text_file")
+@patch("android_store_service.logic.shared_logic.store_base64_as_binary_file")
+def test_store_binaries_to_directory_staged_files(
+    store_binary_file_mock, store_text_file_mock
+):
+    binary_list = [
+        {
+            "media_body": StagedFile("/tmp/staged/bar"),
+            "deobfuscation_file": StagedFile("/tmp/staged/bar.txt"),
+        }
+    ]
+
+    result = shared_logic.store_binaries_to_directory("/tmp/foo", binary_list)
+
+    assert result == [
+        {"binary_path": "/tmp/staged/bar", "deobfuscation_path": "/tmp/staged/bar.txt"}
+    ]
+    store_binary_file_mock.assert_not_called()
+    store_text_file_mock.assert_not_called()
+
+
+verify_digests_params = [
+    ({}, StagedFile("/tmp/foo", sha1="a1", sha256="b2")),
+    ({"sha1": "A1", "sha256": "b2"}, StagedFile("/tmp/foo", sha1="a1", sha256="b2")),
+    ({"sha1": "c3", "sha256": "b2"}, StagedFile("/tmp/foo", sha256="b2")),
+    ({"sha1": "c3", "sha256": "d4"}, "/tmp/foo"),
+]
+
+
+@pytest.mark.parametrize("binary,binary_path", verify_digests_params)
+def test_verify_digests(binary, binary_path):
+    shared_logic.verify_digests(binary, binary_path)
+
+
+@patch("android_store_service.logic.shared_logic.artifact_store")
+def test_store_binaries_to_directory_digest_mismatch(artifact_store_mock, tmp_path):
+    binary_list = [{"sha1": "123", "sha256": "456", "media_body": "SGVsbG8="}]
+
+    with pytest.raises(BadRequestException) as e:
+        shared_logic.store_binaries_to_directory(str(tmp_path), binary_list)
+
+    assert "The sha1 of the uploaded binary is" in str(e.value)
+    artifact_store_mock.put.assert_not_called()
+
+
+@patch("android_store_service.logic.shared_logic.artifact_store")
+def test_store_binaries_to_directory_media_upload(artifact_store_mock):
+    media_upload = MediaInMemoryUpload(b"bundle", resumable=True)
+    binary_list = [{"sha256": "123", "media_body": media_upload}]
+
+    result = shared_logic.store_binaries_to_directory("/tmp/foo", binary_list)
+
+    assert result == [{"binary_path": media_upload, "deobfuscation_path": None}]
+    artifact_store_mock.put.assert_not_called()
+
+
+def test_temporary_directory():
+    with pytest.raises(ValueError):
+        with shared_logic.temporary_directory() as directory:
+            assert os.path.isdir(directory)
+            raise ValueError()
+    assert not os.path.exists(directory)
+
+
+iter_binaries_params = [
+    (None, []),
+    ({"apks": "foo"}, []),
+    ({"apks": [{"a": 1}, "foo"], "bundles": [{"b": 2}]}, [{"a": 1}, {"b": 2}]),
+]
+
+
+@pytest.mark.parametrize("data,exp_binaries", iter_binaries_params)
+def test_iter_binaries(data, exp_binaries):
+    assert list(shared_logic.iter_binaries(data)) == exp_binaries
+
+
+@patch("android_store_service.logic.shared_logic.artifact_store")
+def test_resolve_stored_artifacts(artifact_store_mock):
+    stored_file = StagedFile("/tmp/foo/stored")
+    artifact_store_mock.get.side_effect = [stored_file, None]
+    data = {
+        "apks": [
+            {"sha256": "stored"},
+            {"sha256": "missing"},
+            {"sha256": "inline", "media_body": "Zm9v"},
+        ]
+    }
+
+    shared_logic.resolve_stored_artifacts(data, "/tmp/foo")
+
+    assert data["apks"] == [
+        {"sha256": "stored", "media_body": stored_file},
+        {"sha256": "missing"},
+        {"sha256": "inline", "media_body": "Zm9v"},
+    ]
+    artifact_store_mock.get.assert_has_calls(
+        [call("stored", "/tmp/foo"), call("missing", "/tmp/foo")]
+    )
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import io
+import os
+from unittest import mock
+
+import pytest
+from freezegun import freeze_time
+
+from android_store_service.exceptions import BadRequestException, NotFoundException
+from android_store_service.logic import staging_logic
+from android_store_service.main import app
+from android_store_service.utils.file_utils import StagedFile
+
+package_name = "com.package.name"
+content = b"0123456789" * 10
+
+
+@pytest.fixture
+def staging_path(tmp_path):
+    with mock.patch.dict(app.config, {"STAGING_PATH": str(tmp_path / "staging")}):
+        with app.app_context():
+            yield tmp_path / "staging"
+
+
+def write(staging_id, start, end, size=None):
+    return staging_logic.write_range(
+        package_name,
+        staging_id,
+        io.BytesIO(content[start:end]),
+        start,
+        end - start,
+        size,
+    )
+
+
+def test_create_session(staging_path):
+    with freeze_time("2021-01-01 00:00:00"):
+        session = staging_logic.create_session(package_name)
+        assert staging_logic.get_session(package_name, session["staging_id"]) == session
+    assert session == {
+        "staging_id": session["staging_id"],
+        "expires_at": 1609459200 + 6 * 3600,
+        "received": 0,
+        "size": None,
+        "finalized": False,
+    }
+
+
+def test_resumable_upload(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    assert write(staging_id, 0, 40, len(content))["received"] == 40
+    assert write(staging_id, 30, 70)["received"] == 70
+    assert write(staging_id, 70, 100, len(content))["received"] == 100
+
+    session = staging_logic.finalize_session(package_name, staging_id)
+
+    assert session["finalized"] is True
+    assert session["size"] == len(content)
+    assert session["sha1"] == hashlib.sha1(content).hexdigest()
+    assert session["sha256"] == hashlib.sha256(content).hexdigest()
+    assert staging_logic.finalize_session(package_name, staging_id) == session
+
+
+def test_interrupted_range_keeps_received_bytes(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    with pytest.raises(BadRequestException):
+        staging_logic.write_range(
+            package_name, staging_id, io.BytesIO(content[:25]), 0, 50
+        )
+    assert staging_logic.get_session(package_name, staging_id)["received"] == 25
+
+
+negative_write_params = [
+    ((40, 50, None), "Range starts at 40 but only 0 bytes have been received"),
+    ((0, 50, 40), "Range exceeds size 40"),
+]
+
+
+@pytest.mark.parametrize("write_args,exp_message", negative_write_params)
+def test_write_range_negative(staging_path, write_args, exp_message):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    with pytest.raises(BadRequestException) as e:
+        write(staging_id, *write_args)
+    assert exp_message in str(e.value)
+
+
+def test_write_range_size_mismatch(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    write(staging_id, 0, 10, 100)
+    with pytest.raises(BadRequestException):
+        write(staging_id, 10, 20, 200)
+
+
+def test_finalize_incomplete(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    write(staging_id, 0, 10, 100)
+    with pytest.raises(BadRequestException):
+        staging_logic.finalize_session(package_name, staging_id)
+
+
+def test_write_after_finalize(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    staging_logic.finalize_session(package_name, staging_id)
+    with pytest.raises(BadRequestException):
+        write(staging_id, 0, 10)
+
+
+not_found_params = [
+    ("com.other.package", None),
+    (package_name, "../../etc/passwd"),
+    (package_name, "0" * 32),
+]
+
+
+@pytest.mark.parametrize("session_package_name,staging_id", not_found_params)
+def test_unknown_session(staging_path, session_package_name, staging_id):
+    staging_id = staging_id or staging_logic.create_session(package_name)["staging_id"]
+    with pytest.raises(NotFoundException):
+        staging_logic.get_session(session_package_name, staging_id)
+
+
+def test_expire_sessions(staging_path):
+    with freeze_time("2021-01-01 00:00:00"):
+        expired_id = staging_logic.create_session(package_name)["staging_id"]
+    with freeze_time("2021-01-01 05:00:00"):
+        active_id = staging_logic.create_session(package_name)["staging_id"]
+
+    with freeze_time("2021-01-01 07:00:00"):
+        with pytest.raises(NotFoundException):
+            staging_logic.get_session(package_name, expired_id)
+        staging_logic.create_session(package_name)
+        staging_logic.get_session(package_name, active_id)
+
+    assert not os.path.exists(staging_path / f"{expired_id}.bin")
+    assert os.path.exists(staging_path / f"{active_id}.bin")
+
+
+def test_delete_session(staging_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    staging_logic.delete_session(package_name, staging_id)
+    assert os.listdir(staging_path) == []
+    with pytest.raises(NotFoundException):
+        staging_logic.delete_session(package_name, staging_id)
+
+
+def test_resolve_staging_ids(staging_path, tmp_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    write(staging_id, 0, 100)
+    staging_logic.finalize_session(package_name, staging_id)
+    data = {
+        "apks": [
+            {"media_body_staging_id": staging_id, "sha1": "1"},
+            {"media_body": "Zm9v"},
+        ]
+    }
+
+    staging_logic.resolve_staging_ids(package_name, data, tmp_path)
+    staging_logic.delete_session(package_name, staging_id)
+
+    staged = data["apks"][0]["media_body"]
+    assert isinstance(staged, StagedFile)
+    assert os.path.dirname(staged) == str(tmp_path)
+    with open(staged, "rb") as f:
+        assert f.read() == content
+    assert staged.sha256 == hashlib.sha256(content).hexdigest()
+    assert data["apks"][1] == {"media_body": "Zm9v"}
+
+
+def test_resolve_staging_ids_negative(staging_path, tmp_path):
+    staging_id = staging_logic.create_session(package_name)["staging_id"]
+    with pytest.raises(BadRequestException) as e:
+        staging_logic.resolve_staging_ids(
+            package_name,
+            {"bundles": [{"deobfuscation_file_staging_id": staging_id}]},
+            tmp_path,
+        )
+    assert "is not finalized" in str(e.value)
+
+    staging_logic.finalize_session(package_name, staging_id)
+    with pytest.raises(BadRequestException) as e:
+        staging_logic.resolve_staging_ids(
+            package_name,
+            {"bundles": [{"media_body_staging_id": staging_id, "media_body": "x"}]},
+            tmp_path,
+        )
+    assert "Only one of 'media_body' and 'media_body_staging_id'" in str(e.value)
@@ -28,13 +28,13 @@ def test_track_list_logic(service_mock):
     edit_id = "foobar"
 
     gp_service_mock = Mock()
-    gp_service_mock.create_edit.return_value = edit_id
+    gp_service_mock.shared_edit.return_value = edit_id
     gp_service_mock.list_tracks.return_value = list_tracks_return_value
     service_mock.return_value = gp_service_mock
 
     results = tracks_logic.list_tracks(package_name)
 
-    gp_service_mock.create_edit.assert_called_once_with()
+    gp_service_mock.shared_edit.assert_called_once_with()
     gp_service_mock.list_tracks.assert_called_once_with(edit_id)
 
     assert results == list_tracks_return_value
@@ -44,11 +44,11 @@ def test_track_list_logic(service_mock):
 def test_track_list_logic_exception_propagation(service_mock):
     package_name = "com.package.name"
     gp_service_mock = Mock()
-    gp_service_mock.create_edit.side_effect = [
+    gp_service_mock.shared_edit.side_effect = [
         client.AccessTokenRefreshError("Exception")
     ]
     service_mock.return_value = gp_service_mock
     with pytest.raises(client.AccessTokenRefreshError):
         tracks_logic.list_tracks(package_name)
-        gp_service_mock.create_edit.assert_called_once_with(package_name)
+        gp_service_mock.shared_edit.assert_called_once_with(package_name)
         gp_service_mock.list_tracks.assert_not_called()
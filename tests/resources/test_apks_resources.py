@@ -21,6 +21,7 @@ import pytest
 from googleapiclient.errors import HttpError
 
 from android_store_service import main
+from tests.helpers.mock_utils import record_staged_calls
 
 
 @pytest.fixture
@@ -37,8 +38,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -49,8 +50,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             False,
@@ -64,8 +65,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "dry_run": True,
@@ -77,8 +78,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             True,
@@ -91,8 +92,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "dry_run": False,
@@ -104,8 +105,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             False,
@@ -117,9 +118,9 @@ basic_route_params = [
 @patch("android_store_service.resources.apks_resources.apks_logic")
 @pytest.mark.parametrize("route,payload,exp_params", basic_route_params)
 def test_apks_resources(apks_logic_mock, test_client, route, payload, exp_params):
-    apks_logic_mock.upload_apks.return_value = [123, 123, 123]
+    calls = record_staged_calls(apks_logic_mock.upload_apks, [123, 123, 123])
     response = test_client.post(route, data=json.dumps(payload))
-    apks_logic_mock.upload_apks.assert_called_once_with(*exp_params)
+    assert calls == [exp_params]
     assert response.status_code == 200
 
 
@@ -132,6 +133,12 @@ negative_route_params = [
         "Failed validating 'minItems' in schema['properties']['apks']",
     ),
     ("/v1/com.package.!%/apks", {}, 400, "Invalid package name"),
+    (
+        "/v1/com.package.name/apks",
+        {"apks": [{"sha1": "123", "sha256": "090290", "media_body": "abc"}]},
+        400,
+        "Invalid base64 in 'media_body'",
+    ),
 ]
 
 
@@ -163,8 +170,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest apk",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYXBr",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -180,8 +187,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest apk",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYXBr",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import json
 from unittest.mock import patch
 
@@ -21,6 +22,7 @@ import pytest
 from googleapiclient.errors import HttpError
 
 from android_store_service import main
+from tests.helpers.mock_utils import record_staged_calls
 
 
 @pytest.fixture
@@ -36,14 +38,14 @@ post_builds_bundles_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
                 {
                     "sha1": "456",
                     "sha256": "91210",
-                    "media_body": "greatestbundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3RidW5kbGU=",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
             ]
         },
@@ -54,14 +56,14 @@ post_builds_bundles_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
                 {
                     "sha1": "456",
                     "sha256": "91210",
-                    "media_body": "greatestbundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3RidW5kbGU=",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
             ],
             False,
@@ -74,13 +76,13 @@ post_builds_bundles_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
                 {
                     "sha1": "456",
                     "sha256": "91210",
-                    "media_body": "greatestbundle",
+                    "media_body": "Z3JlYXRlc3RidW5kbGU=",
                     "deobfuscation_file": "",
                 },
             ],
@@ -94,13 +96,13 @@ post_builds_bundles_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 },
                 {
                     "sha1": "456",
                     "sha256": "91210",
-                    "media_body": "greatestbundle",
+                    "media_body": "Z3JlYXRlc3RidW5kbGU=",
                     "deobfuscation_file": "",
                 },
             ],
@@ -116,13 +118,56 @@ post_builds_bundles_params = [
 def test_build_upload_bundle_resources(
     bundles_logic, apks_logic, test_client, route, payload, exp_params
 ):
-    bundles_logic.upload_bundles.return_value = [123, 123, 123]
+    calls = record_staged_calls(bundles_logic.upload_bundles, [123, 123, 123])
     response = test_client.post(route, data=json.dumps(payload))
-    bundles_logic.upload_bundles.assert_called_once_with(*exp_params)
+    assert calls == [exp_params]
     assert response.status_code == 200
     apks_logic.upload_apks.assert_not_called()
 
 
+@patch("android_store_service.resources.builds_resources.apks_logic")
+@patch("android_store_service.resources.builds_resources.bundles_logic")
+def test_build_upload_multipart(bundles_logic, apks_logic, test_client):
+    calls = record_staged_calls(apks_logic.upload_apks, [123])
+    metadata = {
+        "tracks": ["alpha"],
+        "apks": [
+            {
+                "sha1": "123",
+                "sha256": "090290",
+                "media_body": "apk",
+                "deobfuscation_file": "mapping",
+            }
+        ],
+    }
+    response = test_client.post(
+        "/v1/com.package.name/builds",
+        data={
+            "metadata": json.dumps(metadata),
+            "apk": (io.BytesIO(b"ur673462y"), "app.apk"),
+            "mapping": (io.BytesIO(b"1248765kjbskdf"), "mapping.txt"),
+        },
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert calls == [
+        (
+            "com.package.name",
+            ["alpha"],
+            [
+                {
+                    "sha1": "123",
+                    "sha256": "090290",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
+                }
+            ],
+            False,
+        )
+    ]
+    bundles_logic.upload_bundles.assert_not_called()
+
+
 negative_route_params = [
     ("/v1/com.package.name/builds", {}, 400, "No payload"),
     ("/v1/com.package.name/builds", {"tracks": ["alpha"]}, 400, "No binaries"),
@@ -135,7 +180,7 @@ negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -150,8 +195,8 @@ negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -166,8 +211,8 @@ negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -182,16 +227,16 @@ negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "apks": [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest apk",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYXBr",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -232,8 +277,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest apk",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYXBr",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -249,8 +294,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest apk",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYXBr",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -13,7 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
+import hashlib
 import json
+from unittest import mock
 from unittest.mock import patch
 
 import httplib2
@@ -21,6 +24,7 @@ import pytest
 from googleapiclient.errors import HttpError
 
 from android_store_service import main
+from tests.helpers.mock_utils import record_staged_calls
 
 
 @pytest.fixture
@@ -37,8 +41,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -49,8 +53,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             False,
@@ -64,8 +68,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "dry_run": True,
@@ -77,8 +81,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             True,
@@ -91,8 +95,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "tracks": ["alpha"],
@@ -105,8 +109,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             True,
@@ -119,8 +123,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             "dry_run": False,
@@ -132,8 +136,8 @@ basic_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             False,
@@ -145,9 +149,9 @@ basic_route_params = [
 @patch("android_store_service.resources.bundles_resources.bundles_logic")
 @pytest.mark.parametrize("route,payload,exp_params", basic_route_params)
 def test_bundles_resources(bundles_logic_mock, test_client, route, payload, exp_params):
-    bundles_logic_mock.upload_bundles.return_value = [123, 123, 123]
+    calls = record_staged_calls(bundles_logic_mock.upload_bundles, [123, 123, 123])
     response = test_client.post(route, data=json.dumps(payload))
-    bundles_logic_mock.upload_bundles.assert_called_once_with(*exp_params)
+    assert calls == [exp_params]
     assert response.status_code == 200
 
 
@@ -191,8 +195,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -208,8 +212,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -228,8 +232,8 @@ logic_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -283,8 +287,8 @@ basic_binary_links_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "ur673462y",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "dXI2NzM0NjJ5",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
             False,
@@ -331,8 +335,8 @@ logic_binary_links_negative_route_params = [
                 {
                     "sha1": "123",
                     "sha256": "090290",
-                    "media_body": "greatest bundle",
-                    "deobfuscation_file": "1248765kjbskdf",
+                    "media_body": "Z3JlYXRlc3QgYnVuZGxl",
+                    "deobfuscation_file": "MTI0ODc2NWtqYnNrZGY=",
                 }
             ],
         },
@@ -366,3 +370,43 @@ def test_logic_binary_links_negative_response(
     response = test_client.post(route, data=json.dumps(payload))
     assert response.status_code == exp_response_code
     assert exp_response_message in json.loads(response.data)["error"]["message"]
+
+
+@patch("android_store_service.resources.bundles_resources.bundles_logic")
+def test_bundles_resources_stored_artifact(bundles_logic_mock, test_client, tmp_path):
+    content = b"stored bundle"
+    sha256 = hashlib.sha256(content).hexdigest()
+    payload = {"bundles": [{"sha1": "123", "sha256": sha256}]}
+    config = {"ARTIFACT_STORE_PATH": str(tmp_path), "ARTIFACT_STORE_MAX_BYTES": 100}
+    calls = record_staged_calls(bundles_logic_mock.upload_bundles, [1])
+
+    with mock.patch.dict(main.app.config, config):
+        response = test_client.post(
+            "/v1/com.package.name/bundles", data=json.dumps(payload)
+        )
+        assert response.status_code == 400
+        assert (
+            "'media_body' is a required property" in response.json["error"]["message"]
+        )
+
+        with open(tmp_path / sha256, "wb") as f:
+            f.write(content)
+        response = test_client.get(f"/v1/artifacts/{sha256}")
+        assert response.json == {"sha256": sha256, "size": len(content)}
+        response = test_client.post(
+            "/v1/com.package.name/bundles", data=json.dumps(payload)
+        )
+
+    assert response.status_code == 200
+    assert calls[0][2] == [
+        {
+            "sha1": "123",
+            "sha256": sha256,
+            "media_body": base64.b64encode(content).decode(),
+        }
+    ]
+
+
+def test_get_artifact_not_stored(test_client):
+    response = test_client.get(f"/v1/artifacts/{'0' * 64}")
+    assert response.status_code == 404
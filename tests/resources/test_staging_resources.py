@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import hashlib
+import io
+import json
+from unittest import mock
+from unittest.mock import patch
+
+import pytest
+
+from android_store_service import main
+from tests.helpers.mock_utils import record_staged_calls
+
+content = b"0123456789" * 10
+
+
+@pytest.fixture
+def test_client(tmp_path):
+    with mock.patch.dict(main.app.config, {"STAGING_PATH": str(tmp_path)}):
+        yield main.app.test_client()
+
+
+def put_range(test_client, staging_id, start, end, size="*"):
+    return test_client.put(
+        f"/v1/com.package.name/staging/{staging_id}",
+        data=content[start:end],
+        headers={"Content-Range": f"bytes {start}-{end - 1}/{size}"},
+    )
+
+
+@patch("android_store_service.resources.builds_resources.bundles_logic")
+def test_staged_upload(bundles_logic_mock, test_client):
+    response = test_client.post("/v1/com.package.name/staging")
+    assert response.status_code == 201
+    staging_id = response.json["staging_id"]
+
+    assert put_range(test_client, staging_id, 0, 60, 100).json["received"] == 60
+    status = test_client.get(f"/v1/com.package.name/staging/{staging_id}").json
+    assert status["received"] == 60
+    assert put_range(test_client, staging_id, 60, 100, 100).json["received"] == 100
+
+    response = test_client.post(f"/v1/com.package.name/staging/{staging_id}/finalize")
+    assert response.status_code == 200
+    assert response.json["sha256"] == hashlib.sha256(content).hexdigest()
+
+    calls = record_staged_calls(bundles_logic_mock.upload_bundles, [1])
+    payload = {
+        "bundles": [{"sha1": "1", "sha256": "2", "media_body_staging_id": staging_id}],
+        "tracks": ["alpha"],
+    }
+    response = test_client.post("/v1/com.package.name/builds", data=json.dumps(payload))
+    assert response.status_code == 200
+    assert calls[0][2][0]["media_body"] == base64.b64encode(content).decode()
+
+    response = test_client.delete(f"/v1/com.package.name/staging/{staging_id}")
+    assert response.status_code == 204
+    response = test_client.get(f"/v1/com.package.name/staging/{staging_id}")
+    assert response.status_code == 404
+
+
+def test_upload_without_content_range(test_client):
+    staging_id = test_client.post("/v1/com.package.name/staging").json["staging_id"]
+    response = test_client.put(
+        f"/v1/com.package.name/staging/{staging_id}", data=content
+    )
+    assert response.json["received"] == 100
+
+
+def test_upload_status_query(test_client):
+    staging_id = test_client.post("/v1/com.package.name/staging").json["staging_id"]
+    put_range(test_client, staging_id, 0, 60, 100)
+    response = test_client.put(
+        f"/v1/com.package.name/staging/{staging_id}",
+        headers={"Content-Range": "bytes */100", "Content-Length": "0"},
+    )
+    assert response.status_code == 200
+    assert response.json["received"] == 60
+
+
+def test_upload_without_content_length(test_client):
+    staging_id = test_client.post("/v1/com.package.name/staging").json["staging_id"]
+    response = test_client.put(
+        f"/v1/com.package.name/staging/{staging_id}",
+        input_stream=io.BytesIO(content),
+        headers={"Transfer-Encoding": "chunked"},
+    )
+    assert response.status_code == 411
+    assert "Content-Length is required" in response.json["error"]["message"]
+    status = test_client.get(f"/v1/com.package.name/staging/{staging_id}").json
+    assert status["received"] == 0
+
+
+negative_put_params = [
+    ({"Content-Range": "bytes 0-9/*"}, b"short", "does not match Content-Length"),
+    ({"Content-Range": "items 0-4/*"}, b"short", "Invalid Content-Range header"),
+    ({"Content-Range": "bytes 10-14/*"}, b"short", "Range starts at 10"),
+    ({"Content-Range": "bytes */100"}, b"short", "does not match Content-Length"),
+]
+
+
+@pytest.mark.parametrize("headers,data,exp_message", negative_put_params)
+def test_upload_range_negative(test_client, headers, data, exp_message):
+    staging_id = test_client.post("/v1/com.package.name/staging").json["staging_id"]
+    response = test_client.put(
+        f"/v1/com.package.name/staging/{staging_id}", data=data, headers=headers
+    )
+    assert response.status_code == 400
+    assert exp_message in response.json["error"]["message"]
+
+
+def test_unknown_session(test_client):
+    response = test_client.post(f"/v1/com.package.name/staging/{'0' * 32}/finalize")
+    assert response.status_code == 404
+
+
+def test_invalid_package_name(test_client):
+    response = test_client.post("/v1/com.package.!%/staging")
+    assert response.status_code == 400
+    assert response.json["error"]["message"] == "Invalid package name"
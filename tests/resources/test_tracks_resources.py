@@ -16,8 +16,10 @@ import json
 from unittest.mock import patch
 
 import pytest
+from freezegun import freeze_time
 
-from android_store_service import main
+from android_store_service import googleplay_build_service, main
+from android_store_service.utils import track_cache
 
 
 @pytest.fixture
@@ -25,6 +27,12 @@ def test_client():
     return main.app.test_client()
 
 
+@pytest.fixture(autouse=True)
+def tracks_cache():
+    with patch.object(track_cache, "_tracks", None):
+        yield
+
+
 basic_route_params = [("v1/com.package.name/tracks", "com.package.name", 200)]
 
 
@@ -38,6 +46,32 @@ def test_tracks_list_resource(
     tracks_logic_mock.list_tracks.assert_called_once_with(package_name)
     assert response.status_code == exp_status_code
     assert json.loads(response.data) == {"tracks": ["foo"]}
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.headers["Age"] == "0"
+
+
+@patch("android_store_service.resources.tracks_resources.tracks_logic")
+def test_tracks_list_resource_cached(tracks_logic_mock, test_client):
+    tracks_logic_mock.list_tracks.return_value = ["foo"]
+    with freeze_time("2021-06-01 12:00:00") as frozen:
+        test_client.get("v1/com.package.name/tracks")
+        frozen.tick(12)
+        response = test_client.get("v1/com.package.name/tracks")
+
+        assert json.loads(response.data) == {"tracks": ["foo"]}
+        assert response.headers["X-Cache"] == "HIT"
+        assert response.headers["Age"] == "12"
+        tracks_logic_mock.list_tracks.assert_called_once_with("com.package.name")
+
+        for hook in googleplay_build_service._commit_hooks:
+            hook("com.package.name")
+        response = test_client.get("v1/com.package.name/tracks")
+        assert response.headers["X-Cache"] == "MISS"
+
+        frozen.tick(31)
+        response = test_client.get("v1/com.package.name/tracks")
+        assert response.headers["X-Cache"] == "MISS"
+    assert tracks_logic_mock.list_tracks.call_count == 3
 
 
 negative_route_params = [
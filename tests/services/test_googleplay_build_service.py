@@ -13,13 +13,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from unittest.mock import patch, MagicMock, Mock
-
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from unittest.mock import call, patch, ANY, MagicMock, Mock
+
+import httplib2
 import pytest
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaInMemoryUpload
 
-from android_store_service import googleplay_build_service
+from android_store_service import googleplay_build_service, main
+from android_store_service.exceptions import (
+    ServiceUnavailableException,
+    TrackPromotionException,
+)
 from android_store_service.googleplay_build_service import GooglePlayBuildService
-from android_store_service.utils import config_utils
+from android_store_service.utils import (
+    circuit_breaker,
+    config_utils,
+    credentials_utils,
+    discovery_utils,
+    edit_pool,
+    http_transport,
+    media_uploads,
+    rate_limiter,
+    retry_utils,
+    track_cache,
+)
+from tests.helpers.mock_utils import MockGooglePlayResponse, mock_httperror_content
 
 package_name = "com.package.name"
 edit_id = "edit_id"
@@ -28,6 +52,16 @@ version_code = 10000
 version_codes = [version_code]
 
 
+@pytest.fixture(autouse=True)
+def service_pool():
+    with patch.object(googleplay_build_service, "_services", None):
+        with patch.dict(credentials_utils._credentials, clear=True):
+            with patch.object(circuit_breaker, "_breaker", None):
+                with patch.object(googleplay_build_service, "_edits", None):
+                    with patch.object(edit_pool, "_generations", Counter()):
+                        yield
+
+
 def setup_mocked_build_service(execute_return_value):
     execute_mock = MagicMock(
         return_value=MagicMock(execute=MagicMock(return_value=execute_return_value))
@@ -69,9 +103,9 @@ build_publisher_params = [
 ]
 
 
-@patch.object(googleplay_build_service, "ServiceAccountCredentials")
-@patch.object(googleplay_build_service, "httplib2")
-@patch.object(googleplay_build_service, "build")
+@patch.object(credentials_utils, "ServiceAccountCredentials")
+@patch.object(http_transport, "get_http")
+@patch.object(googleplay_build_service, "build_from_document")
 @patch.object(config_utils, "get_secret")
 @patch.object(config_utils, "secret_exists")
 @pytest.mark.parametrize(
@@ -81,7 +115,7 @@ def test_build_publisher_service(
     secret_exists_mock,
     secret_mock,
     build_mock,
-    httplib2_mock,
+    get_http_mock,
     service_account_credentials_mock,
     is_viewer,
     secret_exists_rsp,
@@ -90,10 +124,10 @@ def test_build_publisher_service(
     scopes = ["https://www.googleapis.com/auth/androidpublisher"]
     secret_exists_mock.side_effect = secret_exists_rsp
     secret_mock.return_value = '{"secret": "content"}'
-    httplib2_return_value = "http-return value"
+    http_return_value = "http-return value"
     authorize_return_value = "authorize_return_value"
 
-    httplib2_mock.Http.return_value = httplib2_return_value
+    get_http_mock.return_value = http_return_value
     credentials_mock = Mock()
     credentials_mock.authorize.return_value = authorize_return_value
 
@@ -109,10 +143,10 @@ def test_build_publisher_service(
         {"secret": "content"}, scopes
     )
 
-    credentials_mock.authorize.assert_called_once_with(httplib2_return_value)
+    credentials_mock.authorize.assert_called_once_with(http_return_value)
 
     build_mock.assert_called_once_with(
-        "androidpublisher", "v3", http=authorize_return_value, cache_discovery=False
+        discovery_utils.load_document(), http=authorize_return_value
     )
 
 
@@ -137,6 +171,158 @@ def test_create_edit(build_publisher_mock):
     assert result == edit_id
 
 
+def setup_edit_service(build_publisher_mock, expires_in=3600):
+    counter = itertools.count()
+    service_mock = setup_mocked_build_service(None)
+    service_mock.edits().insert().execute.side_effect = lambda: {
+        "id": f"edit-{next(counter)}",
+        "expiryTimeSeconds": str(int(time.time() + expires_in)),
+    }
+    build_publisher_mock.return_value = service_mock
+    return service_mock
+
+
+def wait_for_refills():
+    pool = googleplay_build_service._edit_pool()
+    if pool._executor is not None:
+        pool._executor.shutdown(wait=True)
+        pool._executor = None
+
+
+@patch.object(googleplay_build_service.metrics_utils, "ffwd_metric")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_checkout_edit_from_pool(build_publisher_mock, ffwd_metric_mock):
+    setup_edit_service(build_publisher_mock)
+    googleplay_service = GooglePlayBuildService(package_name)
+
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"EDIT_POOL_SIZE": 2}):
+            assert googleplay_service.checkout_edit() == "edit-0"
+            assert googleplay_build_service._edit_pool()._executor is None
+            googleplay_service.commit_edit("edit-0")
+            wait_for_refills()
+
+            assert googleplay_service.checkout_edit() == "edit-1"
+            assert googleplay_service.checkout_edit() == "edit-2"
+            assert googleplay_service.checkout_edit() == "edit-3"
+            googleplay_service.commit_edit("edit-3")
+            wait_for_refills()
+            assert googleplay_service.checkout_edit() == "edit-4"
+
+    results = [
+        c[0][2]["result"]
+        for c in ffwd_metric_mock.call_args_list
+        if c[0][0] == "edit-pool"
+    ]
+    assert results == ["miss", "hit", "hit", "miss", "hit"]
+
+
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_checkout_edit_discards_expiring_edits(build_publisher_mock):
+    setup_edit_service(build_publisher_mock, expires_in=60)
+    googleplay_service = GooglePlayBuildService(package_name)
+
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"EDIT_POOL_SIZE": 1}):
+            assert googleplay_service.checkout_edit() == "edit-0"
+            googleplay_service.commit_edit("edit-0")
+            wait_for_refills()
+            assert googleplay_service.checkout_edit() == "edit-2"
+
+
+@pytest.mark.parametrize("status,replaced", [(404, True), (400, True), (403, False)])
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_replace_rejected_edit(build_publisher_mock, status, replaced):
+    setup_edit_service(build_publisher_mock)
+    googleplay_service = GooglePlayBuildService(package_name)
+    error = HttpError(httplib2.Response({"status": status}), b"Edit deleted")
+
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"EDIT_POOL_SIZE": 1}):
+            googleplay_service.commit_edit("edit")
+            wait_for_refills()
+            pooled_edit = googleplay_service.checkout_edit()
+            assert googleplay_service.replace_rejected_edit("other", error) is None
+            replacement = googleplay_service.replace_rejected_edit(pooled_edit, error)
+            wait_for_refills()
+
+    assert pooled_edit == "edit-0"
+    if replaced:
+        assert replacement == "edit-2"
+        assert googleplay_service.replace_rejected_edit(pooled_edit, error) is None
+    else:
+        assert replacement is None
+
+
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_checkout_edit_without_pool(build_publisher_mock):
+    service_mock = setup_edit_service(build_publisher_mock)
+    googleplay_service = GooglePlayBuildService(package_name)
+
+    assert googleplay_service.checkout_edit() == "edit-0"
+    assert googleplay_service.checkout_edit() == "edit-1"
+    assert googleplay_build_service._edit_pool()._executor is None
+    assert service_mock.edits().insert().execute.call_count == 2
+
+
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_shared_edit(build_publisher_mock):
+    service_mock = setup_edit_service(build_publisher_mock)
+    viewer_service = GooglePlayBuildService(package_name, viewer=True)
+    other_viewer_service = GooglePlayBuildService(package_name, viewer=True)
+
+    assert viewer_service.shared_edit() == "edit-0"
+    assert other_viewer_service.shared_edit() == "edit-0"
+    assert GooglePlayBuildService("com.other", viewer=True).shared_edit() == "edit-1"
+
+    GooglePlayBuildService(package_name).commit_edit("edit-2")
+    assert viewer_service.shared_edit() == "edit-2"
+    assert service_mock.edits().insert().execute.call_count == 3
+
+
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_list_tracks_replaces_rejected_shared_edit(build_publisher_mock):
+    service_mock = setup_edit_service(build_publisher_mock)
+    deleted = HttpError(httplib2.Response({"status": 404}), b"Edit deleted")
+    service_mock.edits().tracks().list = MagicMock()
+    service_mock.edits().tracks().list().execute.side_effect = [deleted, {"tracks": []}]
+    viewer_service = GooglePlayBuildService(package_name, viewer=True)
+
+    edit_id = viewer_service.shared_edit()
+    assert viewer_service.list_tracks(edit_id) == []
+
+    assert viewer_service.shared_edit() == "edit-1"
+    service_mock.edits().tracks().list.assert_called_with(
+        editId="edit-1", packageName=package_name
+    )
+
+
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_list_tracks_does_not_replace_unpooled_edit(build_publisher_mock):
+    service_mock = setup_edit_service(build_publisher_mock)
+    deleted = HttpError(httplib2.Response({"status": 404}), b"Edit deleted")
+    service_mock.edits().tracks().list = MagicMock()
+    service_mock.edits().tracks().list().execute.side_effect = deleted
+
+    with pytest.raises(HttpError):
+        GooglePlayBuildService(package_name, viewer=True).list_tracks("other-edit")
+    service_mock.edits().insert().execute.assert_not_called()
+
+
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
@@ -164,6 +350,109 @@ def test_promote_to_track(build_publisher_mock):
     assert result == execute_return_value
 
 
+@patch.object(rate_limiter, "acquire")
+@patch.object(config_utils, "secret_version")
+@patch.object(config_utils, "secret_exists")
+@patch.object(googleplay_build_service.GooglePlayBuildService, "_build_service")
+def test_calls_are_rate_limited_by_secret(
+    build_service_mock, secret_exists_mock, secret_version_mock, acquire_mock
+):
+    secret_exists_mock.side_effect = [True, False]
+    build_service_mock.return_value = setup_mocked_build_service({"id": edit_id})
+
+    googleplay_service = GooglePlayBuildService(package_name)
+    googleplay_service.create_edit()
+    googleplay_service.commit_edit(edit_id)
+
+    assert googleplay_service.secret == package_name
+    assert acquire_mock.call_args_list == [call(package_name), call(package_name)]
+
+
+@patch.object(rate_limiter, "acquire")
+@patch.object(retry_utils.time, "sleep")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_calls_fail_fast_when_circuit_is_open(
+    build_publisher_mock, sleep_mock, acquire_mock
+):
+    service_mock = setup_mocked_build_service(None)
+    execute_mock = service_mock.edits().insert().execute
+    execute_mock.side_effect = HttpError(httplib2.Response({"status": 503}), b"")
+    build_publisher_mock.return_value = service_mock
+    googleplay_service = GooglePlayBuildService(package_name)
+
+    with main.app.app_context():
+        config = {"CIRCUIT_BREAKER_MIN_CALLS": 2, "RETRY_MAX_ATTEMPTS": 4}
+        with patch.dict(main.app.config, config):
+            with pytest.raises(ServiceUnavailableException) as e:
+                googleplay_service.create_edit()
+
+    assert execute_mock.call_count == 2
+    assert acquire_mock.call_count == 2
+    assert e.value.code == 503
+    assert e.value.retry_after == 30
+    assert circuit_breaker.get_breaker().state == circuit_breaker.OPEN
+
+
+@patch.object(googleplay_build_service.GooglePlayBuildService, "promote_to_track")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_promote_to_tracks_concurrently(build_publisher_mock, promote_to_track_mock):
+    tracks = ["internal", "alpha", "beta"]
+    # Every update waits for the others, so they must run concurrently.
+    barrier = threading.Barrier(len(tracks), timeout=5)
+
+    def promote_to_track(edit, codes, track):
+        barrier.wait()
+        return {"track": track}
+
+    promote_to_track_mock.side_effect = promote_to_track
+
+    googleplay_service = GooglePlayBuildService(package_name)
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"TRACK_CONCURRENCY": 3}):
+            result = googleplay_service.promote_to_tracks(
+                edit_id, version_codes, tracks
+            )
+
+    assert result == [{"track": track} for track in tracks]
+
+
+@patch.object(googleplay_build_service.GooglePlayBuildService, "promote_to_track")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_promote_to_tracks_errors(build_publisher_mock, promote_to_track_mock):
+    def promote_to_track(edit, codes, track):
+        if track == "alpha":
+            return {"track": track}
+        content = mock_httperror_content(403, f"No access to {track}")
+        raise HttpError(MockGooglePlayResponse(403), json.dumps(content).encode())
+
+    promote_to_track_mock.side_effect = promote_to_track
+
+    googleplay_service = GooglePlayBuildService(package_name)
+    with pytest.raises(TrackPromotionException) as e:
+        googleplay_service.promote_to_tracks(
+            edit_id, version_codes, ["internal", "alpha", "beta"]
+        )
+
+    assert list(e.value.errors) == ["internal", "beta"]
+    assert promote_to_track_mock.call_count == 3
+    with main.app.test_request_context():
+        response = main.handle_track_promotion_exception(e.value)
+    assert response.status_code == 403
+    assert response.get_json()["error"] == {
+        "message": "Failed to update tracks: internal, beta",
+        "tracks": {
+            "internal": {"code": 403, "message": "No access to internal"},
+            "beta": {"code": 403, "message": "No access to beta"},
+        },
+    }
+
+
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
@@ -202,56 +491,117 @@ def test_commit_edit(build_publisher_mock):
     build_publisher_service_mock.edits().commit().execute.assert_called_once()
 
 
+def test_commit_invalidates_cached_tracks():
+    assert track_cache.invalidate in googleplay_build_service._commit_hooks
+
+
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
-def test_upload_apk(build_publisher_mock):
-    execute_return_value = {"versionCode": version_code}
-    apk_file = "apk_file"
+def test_commit_edit_survives_failing_hooks(build_publisher_mock):
+    service_mock = setup_mocked_build_service(None)
+    service_mock.edits().commit().execute.return_value = {"id": edit_id}
+    build_publisher_mock.return_value = service_mock
+    failing_hook = MagicMock(side_effect=OSError("disk full"))
+    hook = MagicMock()
+
+    with patch.object(googleplay_build_service, "_commit_hooks", [failing_hook, hook]):
+        result = GooglePlayBuildService(package_name).commit_edit(edit_id)
+
+    assert result == {"id": edit_id}
+    failing_hook.assert_called_once_with(package_name)
+    hook.assert_called_once_with(package_name)
 
-    build_publisher_service_mock = setup_mocked_build_service(execute_return_value)
+
+@patch.object(media_uploads, "upload")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_upload_apk(build_publisher_mock, upload_mock, tmp_path):
+    upload_mock.return_value = {"versionCode": version_code}
+    apk_file = tmp_path / "apk_file"
+    apk_file.write_bytes(b"apk")
+
+    build_publisher_service_mock = setup_mocked_build_service(None)
 
     build_publisher_mock.return_value = build_publisher_service_mock
 
     googleplay_service = GooglePlayBuildService(package_name)
-    response = googleplay_service.upload_apk(edit_id, apk_file)
+    response = googleplay_service.upload_apk(edit_id, str(apk_file))
 
     build_publisher_service_mock.edits().apks().upload.assert_called_once_with(
         media_mime_type="application/octet-stream",
         editId=edit_id,
         packageName=package_name,
-        media_body=apk_file,
+        media_body=ANY,
+    )
+    media_body = (
+        build_publisher_service_mock.edits().apks().upload.call_args[1]["media_body"]
+    )
+    assert isinstance(media_body, media_uploads.AdaptiveMediaFileUpload)
+    assert media_body.resumable()
+    assert media_body._filename == str(apk_file)
+    assert media_body.stream().closed
+    upload_mock.assert_called_once_with(
+        build_publisher_service_mock.edits().apks().upload(), "edits.apks.upload"
     )
-    build_publisher_service_mock.edits().apks().upload().execute.assert_called_once()
 
     assert response == version_code
 
 
+@patch.object(media_uploads, "upload")
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
-def test_upload_bundle(build_publisher_mock):
-    execute_return_value = {"versionCode": version_code}
-    bundle_file = "bundle_file"
+def test_upload_bundle(build_publisher_mock, upload_mock, tmp_path):
+    upload_mock.return_value = {"versionCode": version_code}
+    bundle_file = tmp_path / "bundle_file"
+    bundle_file.write_bytes(b"bundle")
 
-    build_publisher_service_mock = setup_mocked_build_service(execute_return_value)
+    build_publisher_service_mock = setup_mocked_build_service(None)
 
     build_publisher_mock.return_value = build_publisher_service_mock
 
     googleplay_service = GooglePlayBuildService(package_name)
-    response = googleplay_service.upload_bundle(edit_id, bundle_file)
+    response = googleplay_service.upload_bundle(edit_id, str(bundle_file))
 
     build_publisher_service_mock.edits().bundles().upload.assert_called_once_with(
         media_mime_type="application/octet-stream",
         editId=edit_id,
         packageName=package_name,
-        media_body=bundle_file,
+        media_body=ANY,
+    )
+    media_body = (
+        build_publisher_service_mock.edits().bundles().upload.call_args[1]["media_body"]
+    )
+    assert isinstance(media_body, media_uploads.AdaptiveMediaFileUpload)
+    assert media_body.resumable()
+    assert media_body._filename == str(bundle_file)
+    assert media_body.stream().closed
+    upload_mock.assert_called_once_with(
+        build_publisher_service_mock.edits().bundles().upload(), "edits.bundles.upload"
     )
-    build_publisher_service_mock.edits().bundles().upload().execute.assert_called_once()
 
     assert response == version_code
 
 
+@patch.object(media_uploads, "upload")
+@patch.object(
+    googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
+)
+def test_upload_bundle_closes_streamed_link(build_publisher_mock, upload_mock):
+    upload_mock.side_effect = HttpError(httplib2.Response({"status": 400}), b"")
+    build_publisher_mock.return_value = setup_mocked_build_service(None)
+    session = MagicMock()
+    session.get.return_value.iter_content.return_value = iter([b"0123456789"])
+    media_body = media_uploads.LinkMediaUpload(session, "http://link", 10)
+    assert media_body.getbytes(0, 5) == b"01234"
+
+    with pytest.raises(HttpError):
+        GooglePlayBuildService(package_name).upload_bundle(edit_id, media_body)
+    session.get.return_value.close.assert_called_once_with()
+
+
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
@@ -273,16 +623,17 @@ def test_list_tracks(build_publisher_mock):
     assert response == ["foo", "bar"]
 
 
+@patch.object(media_uploads, "upload")
 @patch.object(
     googleplay_build_service.GooglePlayBuildService, "build_publisher_service"
 )
-def test_upload_deobfuscation_file(build_publisher_mock):
-    execute_return_value = {"deobfuscationFile": ["foo", "bar"]}
+def test_upload_deobfuscation_file(build_publisher_mock, upload_mock):
+    upload_mock.return_value = {"deobfuscationFile": ["foo", "bar"]}
 
-    deobfuscation_file_path = "path/to/file"
+    deobfuscation_file_path = MediaInMemoryUpload(b"mapping", resumable=True)
     version_code = 1
 
-    build_publisher_service_mock = setup_mocked_build_service(execute_return_value)
+    build_publisher_service_mock = setup_mocked_build_service(None)
 
     build_publisher_mock.return_value = build_publisher_service_mock
 
@@ -299,6 +650,35 @@ def test_upload_deobfuscation_file(build_publisher_mock):
         media_mime_type="application/octet-stream",
         media_body=deobfuscation_file_path,
     )
-    build_publisher_service_mock.edits().tracks().list().execute.assert_called_once()
+    upload_mock.assert_called_once_with(
+        build_publisher_service_mock.edits().deobfuscationfiles().upload(),
+        "edits.deobfuscationfiles.upload",
+    )
 
     assert response == ["foo", "bar"]
+
+
+@patch.object(googleplay_build_service.GooglePlayBuildService, "_build_service")
+@patch.object(config_utils, "secret_version")
+@patch.object(config_utils, "secret_exists")
+def test_build_publisher_service_pooled(
+    secret_exists_mock, secret_version_mock, build_service_mock
+):
+    secret_exists_mock.return_value = False
+    secret_version_mock.return_value = (1, 2, 3)
+    build_service_mock.side_effect = lambda secret: MagicMock()
+
+    service = GooglePlayBuildService(package_name).service
+    assert GooglePlayBuildService(package_name).service is service
+    assert GooglePlayBuildService(package_name, viewer=True).service is not service
+    assert GooglePlayBuildService("com.other").service is not service
+
+    secret_version_mock.return_value = (1, 4, 3)
+    rotated_service = GooglePlayBuildService(package_name).service
+    assert rotated_service is not service
+
+    googleplay_build_service.invalidate_services("com.other")
+    assert GooglePlayBuildService(package_name).service is rotated_service
+    googleplay_build_service.invalidate_services()
+    assert GooglePlayBuildService(package_name).service is not rotated_service
+    assert build_service_mock.call_count == 5
@@ -41,3 +41,12 @@ def test_no_start_time(ffwd_mock):
     with main.app.test_request_context():
         main.send_request_metric(MagicMock())
         assert not ffwd_mock.called
+
+
+@patch("android_store_service.main.discovery_utils")
+def test_refresh_discovery_document_command(discovery_utils_mock):
+    discovery_utils_mock.refresh_document.return_value = "20210101"
+    result = main.app.test_cli_runner().invoke(args=["refresh-discovery-document"])
+    assert result.exit_code == 0
+    assert "revision 20210101" in result.output
+    discovery_utils_mock.refresh_document.assert_called_once_with()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import time
+from unittest import mock
+from unittest.mock import patch, call
+
+import pytest
+
+from android_store_service.main import app
+from android_store_service.utils import artifact_store
+from android_store_service.utils.file_utils import StagedFile
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    config = {"ARTIFACT_STORE_PATH": str(tmp_path / "store")}
+    config["ARTIFACT_STORE_MAX_BYTES"] = 25
+    with mock.patch.dict(app.config, config):
+        with app.app_context():
+            yield tmp_path / "store"
+
+
+def stored_artifacts(store_path):
+    return sorted(name for name in os.listdir(store_path) if name != "links")
+
+
+def write_file(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+@patch.object(artifact_store.metrics_utils, "ffwd_metric")
+def test_put_and_get(ffwd_metric_mock, store_path, tmp_path):
+    content = b"artifact"
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    assert artifact_store.get(sha256, tmp_path) is None
+    assert artifact_store.put(write_file(tmp_path, "artifact", content)) == sha256
+    assert artifact_store.size(sha256) == len(content)
+
+    request_directory = tmp_path / "request"
+    request_directory.mkdir()
+    stored_file = artifact_store.get(sha256.upper(), request_directory)
+
+    assert isinstance(stored_file, StagedFile)
+    assert os.path.dirname(stored_file) == str(request_directory)
+    with open(stored_file, "rb") as f:
+        assert f.read() == content
+    ffwd_metric_mock.assert_has_calls(
+        [
+            call("artifact-store-lookup", 1, {"result": "miss"}),
+            call("artifact-store-size", len(content)),
+            call("artifact-store-lookup", 1, {"result": "hit"}),
+        ]
+    )
+
+
+def test_get_invalid_sha256(store_path, tmp_path):
+    assert artifact_store.get("../../etc/passwd", tmp_path) is None
+    assert artifact_store.size("../../etc/passwd") is None
+
+
+def test_lru_eviction(store_path, tmp_path):
+    digests = []
+    for index, name in enumerate(["first", "second", "third"]):
+        path = write_file(tmp_path, name, name.encode() * 2)
+        digests.append(artifact_store.put(path))
+        mtime = time.time() - 100 + index
+        os.utime(store_path / digests[-1], (mtime, mtime))
+        if name == "second":
+            # Using the first artifact makes the second the least recently used.
+            artifact_store.get(digests[0], tmp_path)
+
+    assert stored_artifacts(store_path) == sorted([digests[0], digests[2]])
+
+
+def test_put_too_large(store_path, tmp_path):
+    artifact_store.put(write_file(tmp_path, "large", b"x" * 26))
+    assert stored_artifacts(store_path) == []
+
+
+def test_disabled(tmp_path):
+    path = write_file(tmp_path, "artifact", b"artifact")
+    assert artifact_store.put(path) is None
+    assert artifact_store.get(hashlib.sha256(b"artifact").hexdigest(), tmp_path) is None
+    assert artifact_store.size(hashlib.sha256(b"artifact").hexdigest()) is None
+
+
+def test_put_uses_staged_digest(store_path, tmp_path):
+    path = StagedFile(write_file(tmp_path, "artifact", b"artifact"), sha256="a" * 64)
+    with patch.object(artifact_store, "open") as open_mock:
+        assert artifact_store.put(path) == "a" * 64
+    open_mock.assert_not_called()
+    assert stored_artifacts(store_path) == ["a" * 64]
+
+
+def test_age_eviction(store_path, tmp_path):
+    old = artifact_store.put(
+        write_file(tmp_path, "old", b"old"), url="http://old", validator='"1"'
+    )
+    os.utime(store_path / old, (0, 0))
+    os.utime(store_path / "links" / os.listdir(store_path / "links")[0], (0, 0))
+    with mock.patch.dict(app.config, {"ARTIFACT_STORE_MAX_AGE": 3600}):
+        new = artifact_store.put(write_file(tmp_path, "new", b"new"))
+
+    assert stored_artifacts(store_path) == [new]
+    assert artifact_store.find_link("http://old", '"1"') is None
+
+
+def test_find_link(store_path, tmp_path):
+    path = write_file(tmp_path, "mapping", b"mapping")
+    sha256 = artifact_store.put(path, url="http://mapping", validator='"1"')
+
+    assert artifact_store.find_link("http://mapping", '"1"') == sha256
+    assert artifact_store.find_link("http://mapping", '"2"') is None
+    assert artifact_store.find_link("http://mapping", None) is None
+    assert artifact_store.find_link("http://other", '"1"') is None
+    with mock.patch.dict(app.config, {"ARTIFACT_STORE_MAX_AGE": 3600}):
+        artifact_store.evict()
+    assert artifact_store.find_link("http://mapping", '"1"') == sha256
+    assert os.stat(store_path / sha256).st_mtime > time.time() - 60
+
+
+def test_put_without_validator_skips_link(store_path, tmp_path):
+    path = write_file(tmp_path, "mapping", b"mapping")
+    artifact_store.put(path, url="http://mapping")
+    assert os.listdir(store_path / "links") == []
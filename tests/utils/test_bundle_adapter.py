@@ -12,41 +12,73 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from unittest.mock import patch
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock
 import pytest
 import requests
+from android_store_service import main
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import bundle_adapter
 from android_store_service.utils.bundle_adapter import adapt_bundle
+from android_store_service.utils.file_utils import StagedFile
+from android_store_service.utils.media_uploads import LinkMediaUpload
 
+contents = b"contents of file"
 
-@patch.object(requests, "get")
-def test_adapt_bundle(mock_get):
-    mock_get.return_value.content = b"contents of file"
+
+def fake_response(content, status_code=200):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.side_effect = lambda chunk_size: [
+        content[start:][:chunk_size] for start in range(0, len(content), chunk_size)
+    ]
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+    return response
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@patch.object(bundle_adapter, "_CHUNK_SIZE", 3)
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_adapt_bundle(mock_session, tmp_path):
+    responses = {"https://my_link": b"mapping", "http://media_link": contents}
+    mock_get = mock_session.return_value.get
+    mock_get.side_effect = lambda url, **kwargs: fake_response(responses[url])
+    sha256 = hashlib.sha256(contents).hexdigest()
     bundles = [
         {
-            "sha256": "OTHUTNHE",
+            "sha256": sha256.upper(),
             "deobfuscation_file_link": "https://my_link",
             "media_body_link": "http://media_link",
         }
     ]
-    assert adapt_bundle(bundles) == [
-        {
-            "sha256": "OTHUTNHE",
-            "deobfuscation_file": "Y29udGVudHMgb2YgZmlsZQ==",
-            "media_body": "Y29udGVudHMgb2YgZmlsZQ==",
-        }
-    ]
 
+    [bundle] = adapt_bundle(bundles, tmp_path)
+
+    assert bundle["sha256"] == sha256.upper()
+    assert isinstance(bundle["media_body"], StagedFile)
+    assert bundle["media_body"].sha256 == sha256
+    assert read_file(bundle["media_body"]) == contents
+    assert read_file(bundle["deobfuscation_file"]) == b"mapping"
+    mock_get.assert_any_call("http://media_link", stream=True, headers={})
 
-@patch.object(requests, "get")
-def test_adapt_bundle_empty(mock_get):
-    mock_get.return_value.content = b"contents of file"
+
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_adapt_bundle_empty(mock_session, tmp_path):
     bundles = []
-    assert adapt_bundle(bundles) == []
+    assert adapt_bundle(bundles, tmp_path) == []
 
 
-@patch.object(requests, "get")
-def test_adapt_bundle_missing_key(mock_get):
-    mock_get.return_value.content = b"contents of file"
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_adapt_bundle_missing_key(mock_session, tmp_path):
+    mock_session.return_value.get.return_value = fake_response(contents)
     bundles = [
         {
             "no_sha256": "OTHUTNHE",
@@ -55,4 +87,229 @@ def test_adapt_bundle_missing_key(mock_get):
         }
     ]
     with pytest.raises(KeyError):
-        adapt_bundle(bundles)
+        adapt_bundle(bundles, tmp_path)
+
+
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_download_sha256_mismatch(mock_session, tmp_path):
+    mock_session.return_value.get.return_value = fake_response(contents)
+    with pytest.raises(BadRequestException) as e:
+        bundle_adapter.download("http://media_link", "abc", directory=tmp_path)
+    assert "The sha256 of http://media_link is" in str(e.value)
+
+
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_download_http_error(mock_session, tmp_path):
+    mock_session.return_value.get.return_value = fake_response(b"", status_code=404)
+    with pytest.raises(BadRequestException) as e:
+        bundle_adapter.download("http://media_link", directory=tmp_path)
+    assert "Failed to download http://media_link: 404" in str(e.value)
+
+
+@patch.object(bundle_adapter.metrics_utils, "ffwd_metric")
+@patch.object(bundle_adapter.http_transport, "get_session")
+def test_download_reports_throughput(mock_session, ffwd_metric_mock, tmp_path):
+    mock_session.return_value.get.return_value = fake_response(contents)
+    bundle_adapter.download("http://media_link", directory=tmp_path)
+    ffwd_metric_mock.assert_any_call("download-bytes", len(contents))
+    assert ffwd_metric_mock.call_args_list[0][0][0] == "download-throughput"
+
+
+class ArtifactHandler(BaseHTTPRequestHandler):
+    content = bytes(range(256)) * 18
+    ranges = True
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("Range"))
+        start, stop = 0, len(self.content)
+        if self.ranges and self.headers.get("Range"):
+            first, last = self.headers["Range"].replace("bytes=", "").split("-")
+            start, stop = int(first), min(int(last) + 1, len(self.content))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{stop - 1}/{len(self.content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(stop - start))
+        self.end_headers()
+        self.wfile.write(self.content[start:stop])
+
+    def do_HEAD(self):
+        self.send_response(200)
+        if self.ranges:
+            self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def artifact_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArtifactHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    config = {"DOWNLOAD_SEGMENT_SIZE": 1000, "DOWNLOAD_SEGMENT_CONCURRENCY": 3}
+    with patch.object(bundle_adapter.http_transport, "_session", None):
+        with main.app.app_context(), patch.dict(main.app.config, config):
+            yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_download_segments(artifact_server, tmp_path, ranges):
+    url = f"http://127.0.0.1:{artifact_server.server_port}/app.aab"
+    sha256 = hashlib.sha256(ArtifactHandler.content).hexdigest()
+
+    with patch.object(ArtifactHandler, "ranges", ranges):
+        path = bundle_adapter.download(url, sha256, directory=tmp_path)
+
+    assert read_file(path) == ArtifactHandler.content
+    assert path.sha256 == sha256
+    assert path.sha1 == hashlib.sha1(ArtifactHandler.content).hexdigest()
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    if ranges:
+        assert sorted(artifact_server.requests) == [
+            "bytes=0-999",
+            "bytes=1000-1999",
+            "bytes=2000-2999",
+            "bytes=3000-3999",
+            "bytes=4000-4607",
+        ]
+    else:
+        assert artifact_server.requests == ["bytes=0-999"]
+
+
+def test_download_first_segment_concurrently(artifact_server, tmp_path):
+    url = f"http://127.0.0.1:{artifact_server.server_port}/app.aab"
+    write_segment = bundle_adapter._write_segment
+    # The first two segments wait for each other, so they must overlap.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_first_segments(url, response, fd, offset, length):
+        if offset < 2000:
+            barrier.wait()
+        write_segment(url, response, fd, offset, length)
+
+    with patch.object(bundle_adapter, "_write_segment", wait_for_first_segments):
+        path = bundle_adapter.download(url, directory=tmp_path)
+    assert read_file(path) == ArtifactHandler.content
+
+
+def test_download_segments_sha256_mismatch(artifact_server, tmp_path):
+    url = f"http://127.0.0.1:{artifact_server.server_port}/app.aab"
+    with pytest.raises(BadRequestException) as e:
+        bundle_adapter.download(url, "abc", directory=tmp_path)
+    assert f"The sha256 of {url} is" in str(e.value)
+
+
+@patch.object(bundle_adapter.http_transport, "get_session")
+@patch.object(bundle_adapter.metrics_utils, "ffwd_metric")
+@patch.object(bundle_adapter, "download")
+def test_fetch_from_artifact_store(
+    download_mock, ffwd_metric_mock, mock_session, tmp_path
+):
+    sha256 = hashlib.sha256(contents).hexdigest()
+    media_body = StagedFile(str(tmp_path / "media"), sha256=sha256)
+    mapping = StagedFile(str(tmp_path / "mapping"), sha256="b" * 64)
+    download_mock.side_effect = [media_body, mapping]
+    for path, content in [(media_body, contents), (mapping, b"mapping")]:
+        with open(path, "wb") as f:
+            f.write(content)
+    mock_session.return_value.head.return_value.headers = {"ETag": '"1"'}
+    config = {"ARTIFACT_STORE_PATH": str(tmp_path / "store")}
+    config["ARTIFACT_STORE_MAX_BYTES"] = 1000
+    request_directory = tmp_path / "request"
+    request_directory.mkdir()
+
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        for _ in range(2):
+            media_path = bundle_adapter.fetch(
+                "http://media", sha256, directory=request_directory
+            )
+            mapping_path = bundle_adapter.fetch("http://mapping", directory=tmp_path)
+
+    assert download_mock.call_count == 2
+    assert read_file(media_path) == contents
+    assert media_path.sha256 == sha256
+    assert read_file(mapping_path) == b"mapping"
+    lookups = [
+        c[0][2]["result"]
+        for c in ffwd_metric_mock.call_args_list
+        if c[0][0] == "download-cache-lookup"
+    ]
+    assert lookups == ["miss", "miss", "hit", "hit"]
+    ffwd_metric_mock.assert_any_call("download-cache-bytes-saved", len(contents))
+    mock_session.return_value.head.assert_called_with(
+        "http://mapping", allow_redirects=True
+    )
+    assert mock_session.return_value.head.call_count == 2
+
+
+@patch.object(bundle_adapter.metrics_utils, "ffwd_metric")
+@patch.object(bundle_adapter, "download")
+def test_fetch_without_artifact_store(download_mock, ffwd_metric_mock, tmp_path):
+    download_mock.return_value = StagedFile(str(tmp_path / "media"), sha256="a" * 64)
+
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"ARTIFACT_STORE_PATH": None}):
+            path = bundle_adapter.fetch("http://media", "a" * 64, directory=tmp_path)
+
+    assert path == download_mock.return_value
+    metrics = [c[0][0] for c in ffwd_metric_mock.call_args_list]
+    assert "download-cache-lookup" not in metrics
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        [{"ETag": '"1"'}, {"ETag": '"2"'}],
+        [{"Last-Modified": "Mon, 1 Mar 2021"}, {"Last-Modified": "Tue, 2 Mar 2021"}],
+        [{}, {}],
+    ],
+)
+@patch.object(bundle_adapter.http_transport, "get_session")
+@patch.object(bundle_adapter, "download")
+def test_fetch_revalidates_links(download_mock, mock_session, tmp_path, headers):
+    mappings = []
+    for content in (b"old mapping", b"new mapping"):
+        path = tmp_path / hashlib.sha256(content).hexdigest()
+        path.write_bytes(content)
+        mappings.append(StagedFile(str(path), sha256=path.name))
+    download_mock.side_effect = mappings
+    heads = [MagicMock(headers=response_headers) for response_headers in headers]
+    mock_session.return_value.head.side_effect = heads
+    config = {"ARTIFACT_STORE_PATH": str(tmp_path / "store")}
+    config["ARTIFACT_STORE_MAX_BYTES"] = 1000
+
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        paths = [
+            bundle_adapter.fetch("http://mapping", directory=tmp_path) for _ in range(2)
+        ]
+
+    assert download_mock.call_count == 2
+    assert [read_file(path) for path in paths] == [b"old mapping", b"new mapping"]
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_fetch_streaming(artifact_server, tmp_path, content_length):
+    url = f"http://127.0.0.1:{artifact_server.server_port}/app.aab"
+    sha256 = hashlib.sha256(ArtifactHandler.content).hexdigest()
+
+    with patch.object(ArtifactHandler, "ranges", content_length):
+        with patch.dict(main.app.config, {"STREAMING_CHUNK_SIZE": 1024}):
+            media_body = bundle_adapter.fetch(
+                url, sha256, streaming=True, directory=tmp_path
+            )
+
+    if content_length:
+        assert isinstance(media_body, LinkMediaUpload)
+        assert media_body.size() == len(ArtifactHandler.content)
+        assert media_body.chunksize() == 1024
+        assert media_body.getbytes(0, 1024) == ArtifactHandler.content[:1024]
+        assert os.listdir(tmp_path) == []
+    else:
+        assert read_file(media_body) == ArtifactHandler.content
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from freezegun import freeze_time
+
+from android_store_service.utils.cache_utils import TTLCache
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(max_size=10, ttl=60)
+    with freeze_time("2021-01-01 00:00:00") as frozen_time:
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=120)
+        frozen_time.tick(59)
+        assert cache.get("a") == 1
+        frozen_time.tick(1)
+        assert cache.get("a") is None
+        assert cache.get("a", "default") == "default"
+        assert cache.get("b") == 2
+        assert len(cache) == 1
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.keys() == ["a", "c"]
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "default") == "default"
+    cache.clear()
+    assert len(cache) == 0
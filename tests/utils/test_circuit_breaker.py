@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest.mock import call, patch
+
+import httplib2
+import pytest
+from freezegun import freeze_time
+from googleapiclient.errors import HttpError
+
+from android_store_service import main
+from android_store_service.exceptions import ServiceUnavailableException
+from android_store_service.utils import circuit_breaker
+from android_store_service.utils.circuit_breaker import CircuitBreaker
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+@pytest.fixture
+def clock():
+    with freeze_time("2021-06-01 12:00:00") as frozen:
+        yield frozen
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        window=60,
+        min_calls=4,
+        failure_ratio=0.5,
+        slow_call=10,
+        open_seconds=30,
+        half_open_calls=2,
+    )
+
+
+def succeed(breaker, seconds=0, clock=None):
+    with breaker.guard():
+        if clock:
+            clock.tick(seconds)
+
+
+def fail(breaker, error=None):
+    with pytest.raises(type(error or ConnectionError())):
+        with breaker.guard():
+            raise error or ConnectionError("reset")
+
+
+def test_opens_on_failure_ratio(breaker):
+    succeed(breaker)
+    succeed(breaker)
+    fail(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+    fail(breaker, http_error(503))
+    assert breaker.state == circuit_breaker.OPEN
+
+    with pytest.raises(ServiceUnavailableException) as e:
+        succeed(breaker)
+    assert e.value.code == 503
+    assert e.value.retry_after == 30
+
+
+def test_client_errors_are_not_failures(breaker):
+    for _ in range(4):
+        fail(breaker, http_error(404))
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_slow_calls_are_failures(breaker, clock):
+    for _ in range(4):
+        succeed(breaker, 11, clock)
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_slow_untimed_calls_are_not_failures(breaker, clock):
+    for _ in range(4):
+        with breaker.guard(timed=False):
+            clock.tick(11)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_failures_expire_with_window(breaker, clock):
+    for _ in range(3):
+        fail(breaker)
+    clock.tick(61)
+    fail(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+@patch.object(circuit_breaker.metrics_utils, "ffwd_metric")
+def test_half_open_closes_after_successful_probes(ffwd_metric_mock, breaker, clock):
+    for _ in range(4):
+        fail(breaker)
+    clock.tick(31)
+
+    with breaker.guard():
+        assert breaker.state == circuit_breaker.HALF_OPEN
+        succeed(breaker)
+        with pytest.raises(ServiceUnavailableException):
+            succeed(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+    assert ffwd_metric_mock.call_args_list == [
+        call("play-api-circuit-state", 2, {"state": "open"}),
+        call("play-api-circuit-state", 1, {"state": "half-open"}),
+        call("play-api-circuit-state", 0, {"state": "closed"}),
+    ]
+
+
+def test_half_open_reopens_on_failure(breaker, clock):
+    for _ in range(4):
+        fail(breaker)
+    clock.tick(31)
+
+    fail(breaker, http_error(500))
+    assert breaker.state == circuit_breaker.OPEN
+    with pytest.raises(ServiceUnavailableException) as e:
+        succeed(breaker)
+    assert e.value.retry_after == 30
+
+
+def test_check_does_not_take_half_open_calls(breaker, clock):
+    for _ in range(4):
+        fail(breaker)
+    with pytest.raises(ServiceUnavailableException):
+        breaker.check()
+    clock.tick(31)
+
+    for _ in range(5):
+        breaker.check()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    succeed(breaker)
+    succeed(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_get_breaker_is_shared():
+    config = {"CIRCUIT_BREAKER_MIN_CALLS": 5, "CIRCUIT_BREAKER_OPEN_SECONDS": 10}
+    with patch.object(circuit_breaker, "_breaker", None):
+        with main.app.app_context(), patch.dict(main.app.config, config):
+            breaker = circuit_breaker.get_breaker()
+        assert circuit_breaker.get_breaker() is breaker
+    assert breaker.min_calls == 5
+    assert breaker.open_seconds == 10
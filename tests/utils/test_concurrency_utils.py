@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+
+import pytest
+
+from android_store_service.main import app
+from android_store_service.utils import concurrency_utils, config_utils
+
+
+def test_map_concurrently_runs_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait(item):
+        barrier.wait()
+        return item * 2
+
+    assert concurrency_utils.map_concurrently(wait, [1, 2, 3], 3) == [2, 4, 6]
+
+
+def test_map_concurrently_sequential():
+    threads = set()
+
+    def record(item):
+        threads.add(threading.current_thread())
+        return item
+
+    assert concurrency_utils.map_concurrently(record, range(3), 1) == [0, 1, 2]
+    assert threads == {threading.current_thread()}
+
+
+def test_map_concurrently_raises_first_error():
+    def fail(item):
+        if item > 0:
+            raise ValueError(item)
+        return item
+
+    with pytest.raises(ValueError) as e:
+        concurrency_utils.map_concurrently(fail, [0, 1, 2], 2)
+    assert e.value.args == (1,)
+
+
+def test_map_concurrently_app_context():
+    with app.app_context():
+        results = concurrency_utils.map_concurrently(
+            lambda key: config_utils.get_config(key), ["SECRETS_PATH"] * 2, 2
+        )
+    assert results == [app.config["SECRETS_PATH"]] * 2
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    single_flight = concurrency_utils.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "tracks"
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(single_flight.do("key", load))
+    )
+    leader.start()
+    started.wait(5)
+    waiters = [
+        threading.Thread(target=lambda: results.append(single_flight.do("key", load)))
+        for _ in range(3)
+    ]
+    for waiter in waiters:
+        waiter.start()
+    # Gives the waiters time to join the flight in progress.
+    time.sleep(0.2)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("tracks", False)] + [("tracks", True)] * 3
+    assert single_flight.do("key", lambda: "again") == ("again", False)
+
+
+def test_single_flight_shares_exceptions():
+    single_flight = concurrency_utils.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("Play is down")
+
+    def call():
+        try:
+            single_flight.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
@@ -13,8 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from os.path import join, dirname
+from unittest.mock import patch
 
 import pytest
+from freezegun import freeze_time
 
 from android_store_service.utils import config_utils
 from android_store_service.main import app
@@ -55,3 +57,54 @@ def test_secret_exists(secret, exp_value):
         app.config["SECRETS_PATH"] = _TEST_DATA_PATH
         assert exp_value == config_utils.secret_exists(secret)
         assert exp_value == config_utils.secret_exists(secret, path=_TEST_DATA_PATH)
+
+
+def test_get_config():
+    assert config_utils.get_config("LOGGING_LEVEL", "default") == "default"
+    with app.app_context():
+        assert config_utils.get_config("LOGGING_LEVEL") == app.config["LOGGING_LEVEL"]
+        assert config_utils.get_config("NOT_A_SETTING", "default") == "default"
+
+
+def test_secret_version(tmp_path):
+    secret_file = tmp_path / "secret"
+    secret_file.write_text("first")
+    version = config_utils.secret_version("secret", path=str(tmp_path))
+    assert config_utils.secret_version("secret", path=str(tmp_path)) == version
+
+    secret_file.write_text("second!")
+    assert config_utils.secret_version("secret", path=str(tmp_path)) != version
+    assert config_utils.secret_version("missing", path=str(tmp_path)) is None
+
+
+def test_secret_registry_polling(tmp_path):
+    path = str(tmp_path)
+    (tmp_path / "secret").write_text("first")
+    config = {"SECRETS_PATH": path, "SECRETS_POLL_INTERVAL": 10}
+
+    with app.app_context(), patch.dict(app.config, config):
+        with freeze_time("2021-01-01 00:00:00") as frozen_time:
+            assert config_utils.get_secret("secret") == "first"
+            with patch.object(config_utils, "read_file") as read_file_mock:
+                with patch.object(config_utils.os, "scandir") as scandir_mock:
+                    assert config_utils.get_secret("secret") == "first"
+                    assert config_utils.secret_exists("secret")
+                    assert not config_utils.secret_exists("new")
+                scandir_mock.assert_not_called()
+                read_file_mock.assert_not_called()
+
+            (tmp_path / "secret").write_text("rotated")
+            (tmp_path / "new").write_text("new")
+            (tmp_path / "directory").mkdir()
+            assert config_utils.get_secret("secret") == "first"
+
+            frozen_time.tick(10)
+            assert config_utils.get_secret("secret") == "rotated"
+            assert config_utils.get_secret("new") == "new"
+            assert not config_utils.secret_exists("directory")
+            assert config_utils.list_secrets() == ["new", "secret"]
+
+            (tmp_path / "new").unlink()
+            frozen_time.tick(10)
+            with pytest.raises(FileNotFoundError):
+                config_utils.get_secret("new")
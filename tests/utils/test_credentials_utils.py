@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httplib2
+import pytest
+import rsa
+
+from android_store_service.main import app
+from android_store_service.utils import credentials_utils
+
+
+class TokenHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.tokens += 1
+        body = json.dumps(
+            {
+                "access_token": f"token-{self.server.tokens}",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.token_issued.set()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    _, key = rsa.newkeys(1024)
+    return key.save_pkcs1().decode()
+
+
+@pytest.fixture
+def token_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TokenHandler)
+    server.tokens = 0
+    server.token_issued = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def secrets_path(tmp_path, token_server, private_key):
+    secret = {
+        "type": "service_account",
+        "client_email": "service@example.iam.gserviceaccount.com",
+        "client_id": "1234",
+        "private_key_id": "abcd",
+        "private_key": private_key,
+        "token_uri": f"http://127.0.0.1:{token_server.server_port}/token",
+    }
+    (tmp_path / "googleplayapiaccess").write_text(json.dumps(secret))
+    (tmp_path / "keep_me").write_text("")
+    config = {"SECRETS_PATH": str(tmp_path), "SECRETS_POLL_INTERVAL": 0}
+    with patch.dict(credentials_utils._credentials, clear=True):
+        with app.app_context(), patch.dict(app.config, config):
+            yield tmp_path
+
+
+def test_get_credentials(secrets_path):
+    credentials = credentials_utils.get_credentials("googleplayapiaccess")
+    assert credentials.service_account_email.startswith("service@")
+    assert credentials_utils.get_credentials("googleplayapiaccess") is credentials
+
+    secret = json.loads((secrets_path / "googleplayapiaccess").read_text())
+    secret["client_email"] = "rotated@example.iam.gserviceaccount.com"
+    (secrets_path / "googleplayapiaccess").write_text(json.dumps(secret))
+    rotated = credentials_utils.get_credentials("googleplayapiaccess")
+    assert rotated.service_account_email.startswith("rotated@")
+
+
+def expire_in(credentials, seconds):
+    credentials.token_expiry = datetime.datetime.utcnow() + datetime.timedelta(
+        seconds=seconds
+    )
+
+
+@patch.object(credentials_utils.metrics_utils, "ffwd_metric")
+def test_refresh_tokens(ffwd_metric_mock, secrets_path, token_server):
+    credentials = credentials_utils.get_credentials("googleplayapiaccess")
+    credentials_utils.refresh_tokens(600)
+    assert credentials.access_token == "token-1"
+
+    expire_in(credentials, 700)
+    credentials_utils.refresh_tokens(600)
+    assert token_server.tokens == 1
+    metric, age, attrs = ffwd_metric_mock.call_args[0]
+    assert (metric, attrs) == ("oauth-token-age", {"secret": "googleplayapiaccess"})
+    assert age == pytest.approx(2900, abs=5)
+
+    expire_in(credentials, 500)
+    credentials_utils.refresh_tokens(600)
+    assert credentials.access_token == "token-2"
+
+    metrics = [c[0][0] for c in ffwd_metric_mock.call_args_list]
+    assert metrics.count("oauth-token-refresh-latency") == 2
+    assert metrics.count("oauth-token-age") == 3
+
+
+@patch.object(credentials_utils.metrics_utils, "ffwd_metric")
+def test_refresh_tokens_error(ffwd_metric_mock, secrets_path, token_server):
+    token_server.shutdown()
+    token_server.server_close()
+    credentials_utils.refresh_tokens(600)
+    ffwd_metric_mock.assert_called_once_with("oauth-token-refresh-error", 1)
+
+
+def test_start_token_refresher(secrets_path, token_server):
+    credentials = credentials_utils.get_credentials("googleplayapiaccess")
+    with patch.dict(app.config, {"TOKEN_REFRESH_INTERVAL": 60}):
+        stop = credentials_utils.start_token_refresher(app)
+    try:
+        assert token_server.token_issued.wait(timeout=10)
+        for _ in range(100):
+            if credentials.access_token:
+                break
+            time.sleep(0.1)
+    finally:
+        stop.set()
+    assert credentials.access_token == "token-1"
+
+
+def test_start_token_refresher_disabled():
+    with patch.dict(app.config, {"TOKEN_REFRESH_INTERVAL": None}):
+        assert credentials_utils.start_token_refresher(app) is None
+
+
+@pytest.fixture
+def token_cache_path(secrets_path, tmp_path):
+    path = tmp_path / "tokens"
+    with patch.dict(app.config, {"TOKEN_CACHE_PATH": str(path)}):
+        yield path
+
+
+def test_token_file_storage_shared(token_cache_path, secrets_path, token_server):
+    first = credentials_utils.get_credentials("googleplayapiaccess")
+    credentials_utils.refresh_tokens(600)
+    assert first.access_token == "token-1"
+    assert oct(os.stat(token_cache_path / "googleplayapiaccess.json").st_mode)[-3:] == (
+        "600"
+    )
+
+    # Another worker loads the token stored by the first one.
+    credentials_utils._credentials.clear()
+    second = credentials_utils.get_credentials("googleplayapiaccess")
+    assert second is not first
+    assert second.access_token == "token-1"
+
+    # A refresh by one worker is picked up by the other without a token request.
+    expire_in(second, 500)
+    second.refresh(httplib2.Http())
+    assert second.access_token == "token-2"
+    first.refresh(httplib2.Http())
+    assert first.access_token == "token-2"
+    assert token_server.tokens == 2
+
+
+def test_token_file_storage_rotated_secret(token_cache_path, secrets_path):
+    first = credentials_utils.get_credentials("googleplayapiaccess")
+    credentials_utils.refresh_tokens(600)
+    assert first.access_token == "token-1"
+
+    secret = json.loads((secrets_path / "googleplayapiaccess").read_text())
+    secret["client_email"] = "rotated@example.iam.gserviceaccount.com"
+    (secrets_path / "googleplayapiaccess").write_text(json.dumps(secret))
+    credentials_utils._credentials.clear()
+    assert credentials_utils.get_credentials("googleplayapiaccess").access_token is None
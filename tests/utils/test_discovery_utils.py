@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpMock
+
+from android_store_service.main import app
+from android_store_service.utils import discovery_utils
+
+
+@pytest.fixture(autouse=True)
+def document_cache():
+    with patch.object(discovery_utils, "_document", None):
+        yield
+
+
+def test_load_pinned_document():
+    document = discovery_utils.load_document()
+    parsed = json.loads(document)
+    assert (parsed["name"], parsed["version"]) == ("androidpublisher", "v3")
+    assert discovery_utils.load_document() is document
+
+    for _ in range(2):
+        service = build_from_document(document, http=HttpMock())
+        assert service.edits().bundles().upload
+    assert discovery_utils.load_document() == document
+
+
+def test_load_configured_document(tmp_path):
+    path = tmp_path / "discovery.json"
+    config = {"DISCOVERY_DOCUMENT_PATH": str(path)}
+    with app.app_context(), patch.dict(app.config, config):
+        assert json.loads(discovery_utils.load_document())["name"] == "androidpublisher"
+
+        path.write_text(json.dumps({"name": "androidpublisher", "revision": "1"}))
+        assert json.loads(discovery_utils.load_document())["revision"] == "1"
+
+        path.write_text(json.dumps({"name": "androidpublisher", "revision": "22"}))
+        assert json.loads(discovery_utils.load_document())["revision"] == "22"
+
+
+@patch.object(discovery_utils.requests, "get")
+def test_refresh_document(get_mock, tmp_path):
+    document = {"name": "androidpublisher", "version": "v3", "revision": "2"}
+    get_mock.return_value.json.return_value = document
+    path = tmp_path / "discovery" / "androidpublisher.v3.json"
+
+    with app.app_context(), patch.dict(app.config, {"DISCOVERY_DOCUMENT_PATH": path}):
+        assert discovery_utils.refresh_document() == "2"
+        assert json.loads(discovery_utils.load_document()) == document
+
+    get_mock.assert_called_once_with(discovery_utils.DISCOVERY_URL, timeout=60)
+    assert os.listdir(tmp_path / "discovery") == ["androidpublisher.v3.json"]
+
+
+@patch.object(discovery_utils.requests, "get")
+def test_refresh_document_invalid(get_mock, tmp_path):
+    get_mock.return_value.json.return_value = {"name": "other", "version": "v1"}
+    path = tmp_path / "androidpublisher.v3.json"
+    with pytest.raises(ValueError):
+        discovery_utils.refresh_document(str(path))
+    assert not path.exists()
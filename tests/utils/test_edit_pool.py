@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+from collections import Counter
+from unittest.mock import Mock, patch
+
+import pytest
+
+from android_store_service import main
+from android_store_service.utils import edit_pool
+from android_store_service.utils.edit_pool import EditPool
+
+key = ("com.package.name", False, "googleplayapiaccess")
+
+
+@pytest.fixture(autouse=True)
+def generations():
+    with patch.object(edit_pool, "_generations", Counter()):
+        yield
+
+
+def test_checkout_and_peek():
+    pool = EditPool(2, 10, 600)
+    expires_at = time.time() + 3600
+    assert pool.put(key, "edit-0", expires_at, edit_pool.generation(key[0]))
+    assert pool.put(key, "edit-1", expires_at, edit_pool.generation(key[0]))
+    assert not pool.put(key, "edit-2", expires_at, edit_pool.generation(key[0]))
+
+    assert pool.peek(key) == "edit-0"
+    assert pool.checkout(key) == "edit-0"
+    assert pool.discard(key, "edit-1")
+    assert not pool.discard(key, "edit-1")
+    assert pool.checkout(key) is None
+
+
+def test_put_rejects_expiring_and_stale_edits():
+    pool = EditPool(2, 10, 600)
+    assert not pool.put(key, "edit-0", time.time() + 60, edit_pool.generation(key[0]))
+
+    stale_generation = edit_pool.generation(key[0])
+    edit_pool.bump_generation(key[0])
+    assert not pool.put(key, "edit-1", time.time() + 3600, stale_generation)
+    assert pool.peek(key) is None
+
+
+def test_refill_stops_on_expiring_edits():
+    pool = EditPool(2, 10, 600)
+    create = Mock(return_value=("edit", time.time() + 60))
+
+    pool.refill(key, create)
+    pool._executor.shutdown(wait=True)
+
+    create.assert_called_once_with()
+    assert pool.peek(key) is None
+
+
+def test_generation_is_shared_between_workers(tmp_path):
+    pool = EditPool(1, 10, 600)
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"EDIT_POOL_PATH": str(tmp_path)}):
+            generation = edit_pool.generation(key[0])
+            assert pool.put(key, "edit-0", time.time() + 3600, generation)
+
+            # Another worker commits an edit of the package.
+            with patch.object(edit_pool, "_generations", Counter()):
+                edit_pool.bump_generation(key[0])
+
+            assert edit_pool.generation(key[0]) != generation
+            assert pool.checkout(key) is None
+    assert (tmp_path / "com.package.name.generation").exists()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import binascii
+import hashlib
+import io
+
+import pytest
+
+from android_store_service.utils import file_utils
+from android_store_service.utils.file_utils import Base64FileWriter, StagedFile
+
+content = b"Hello, World! " * 10
+
+
+@pytest.mark.parametrize("piece_size", [1, 2, 3, 4, 7, 1000])
+def test_base64_file_writer(piece_size):
+    encoded = base64.encodebytes(content).decode()
+    output = io.BytesIO()
+    writer = Base64FileWriter(output)
+    for start in range(0, len(encoded), piece_size):
+        end = start + piece_size
+        writer.write(encoded[start:end])
+    writer.close()
+    assert output.getvalue() == content
+    assert writer.size == len(content)
+    assert writer.sha1 == hashlib.sha1(content).hexdigest()
+    assert writer.sha256 == hashlib.sha256(content).hexdigest()
+
+
+def test_base64_file_writer_truncated_input():
+    writer = Base64FileWriter(io.BytesIO())
+    writer.write("SGVsbG8")
+    with pytest.raises(binascii.Error):
+        writer.close()
+
+
+def test_staged_file_digests():
+    staged_file = StagedFile("/tmp/foo", sha256="abc")
+    assert staged_file == "/tmp/foo"
+    assert staged_file.sha1 is None
+    assert staged_file.sha256 == "abc"
+
+
+def test_digest_file(tmp_path):
+    path = tmp_path / "artifact"
+    path.write_bytes(content)
+    digests = file_utils.digest_file(path, chunk_size=7)
+    assert digests.size == len(content)
+    assert digests.sha1 == hashlib.sha1(content).hexdigest()
+    assert digests.sha256 == hashlib.sha256(content).hexdigest()
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / "session.json"
+    with file_utils.atomic_write(str(path)) as f:
+        f.write("new")
+        assert not path.exists()
+    assert path.read_text() == "new"
+
+    with pytest.raises(ValueError):
+        with file_utils.atomic_write(str(path)) as f:
+            f.write("partial")
+            raise ValueError("failed")
+    assert path.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["session.json"]
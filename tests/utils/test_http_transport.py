@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from android_store_service import main
+from android_store_service.utils import concurrency_utils, http_transport
+
+
+class PublisherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", "/edits")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/slow":
+            self.server.release.wait(5)
+        body = b'{"id": "edit"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        self.server.bodies.append(self.rfile.read(int(self.headers["Content-Length"])))
+        self.send_response(308)
+        self.send_header("Location", "/upload?upload_id=1")
+        self.send_header("Range", "bytes=0-2")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def publisher_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PublisherHandler)
+    server.connections = set()
+    server.bodies = []
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with patch.object(http_transport, "_session", None):
+        with main.app.app_context():
+            yield f"http://127.0.0.1:{server.server_port}", server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_keeps_connection_alive(publisher_server):
+    url, server = publisher_server
+    http = http_transport.get_http()
+
+    for _ in range(3):
+        resp, content = http.request(f"{url}/edits")
+        assert resp.status == 200
+        assert resp["content-type"] == "application/json"
+        assert content == b'{"id": "edit"}'
+
+    assert len(server.connections) == 1
+
+
+def test_request_follows_redirects_of_get_only(publisher_server):
+    url, server = publisher_server
+    http = http_transport.get_http()
+
+    resp, content = http.request(f"{url}/moved")
+    assert resp.status == 200
+
+    resp, content = http.request(f"{url}/upload", method="PUT", body=b"abc")
+    assert resp.status == 308
+    assert resp["range"] == "bytes=0-2"
+    assert "location" in resp
+    assert server.bodies == [b"abc"]
+
+
+def test_request_is_thread_safe(publisher_server):
+    url, server = publisher_server
+    http = http_transport.get_http()
+
+    responses = concurrency_utils.map_concurrently(
+        lambda _: http.request(f"{url}/edits"), range(20), 4
+    )
+
+    assert [content for resp, content in responses] == [b'{"id": "edit"}'] * 20
+    assert len(server.connections) <= 4
+
+
+def test_request_timeout(publisher_server):
+    url, server = publisher_server
+    http = http_transport.get_http(timeout=0.1)
+    with pytest.raises(socket.timeout):
+        http.request(f"{url}/slow")
+
+
+def test_request_connection_error():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    http = http_transport.PooledHttp(http_transport.requests.Session(), 1)
+    with pytest.raises(ConnectionError):
+        http.request(f"http://127.0.0.1:{port}/edits")
+
+
+def test_get_session_is_pooled():
+    with patch.object(http_transport, "_session", None):
+        with main.app.app_context():
+            config = {"HTTP_POOL_SIZE": 3, "DOWNLOAD_CONCURRENCY": 1}
+            config["DOWNLOAD_SEGMENT_CONCURRENCY"] = 1
+            with patch.dict(main.app.config, config):
+                session = http_transport.get_session()
+        assert http_transport.get_session() is session
+    adapter = session.get_adapter("https://androidpublisher.googleapis.com")
+    assert adapter._pool_maxsize == 3
+
+
+def test_get_session_fits_download_concurrency():
+    config = {"HTTP_POOL_SIZE": 3, "DOWNLOAD_CONCURRENCY": 2}
+    config["DOWNLOAD_SEGMENT_CONCURRENCY"] = 4
+    with patch.object(http_transport, "_session", None):
+        with main.app.app_context(), patch.dict(main.app.config, config):
+            session = http_transport.get_session()
+    adapter = session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == 8
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import json
+from unittest.mock import ANY, MagicMock, patch
+
+import httplib2
+import pytest
+import requests
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from android_store_service import main
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import media_uploads, retry_utils
+from android_store_service.utils.media_uploads import (
+    AdaptiveMediaFileUpload,
+    LinkMediaUpload,
+)
+
+content = bytes(range(256)) * 8
+
+
+def link_media_upload(data=content, size=len(content), sha256=None):
+    session = MagicMock()
+    response = session.get.return_value
+    response.iter_content.side_effect = lambda chunk_size: iter(
+        [data[start:][:100] for start in range(0, len(data), 100)]
+    )
+    sha256 = sha256 or hashlib.sha256(content).hexdigest()
+    return LinkMediaUpload(session, "http://link", size, sha256, chunksize=512)
+
+
+def upload_chunks(media_upload):
+    """Reads the chunks the way a resumable HttpRequest does."""
+    chunks, progress = [], 0
+    while True:
+        chunk = media_upload.getbytes(progress, media_upload.chunksize())
+        chunks.append(chunk)
+        progress += len(chunk)
+        if progress == media_upload.size():
+            return chunks
+
+
+def test_link_media_upload():
+    media_upload = link_media_upload()
+
+    chunks = upload_chunks(media_upload)
+
+    assert b"".join(chunks) == content
+    assert [len(chunk) for chunk in chunks] == [512] * 4
+    assert media_upload.resumable()
+    assert media_upload.mimetype() == "application/octet-stream"
+    media_upload._session.get.assert_called_once_with("http://link", stream=True)
+
+
+def test_link_media_upload_retries_chunk():
+    media_upload = link_media_upload()
+    first = media_upload.getbytes(0, 512)
+    assert media_upload.getbytes(0, 512) == first
+    assert media_upload.getbytes(512, 512) == content[512:1024]
+    assert len(media_upload._buffer) <= 512 + media_uploads._READ_SIZE
+    with pytest.raises(ValueError):
+        media_upload.getbytes(0, 512)
+
+
+@pytest.mark.parametrize(
+    "data,sha256,message",
+    [
+        (content, "abc", "The sha256 of http://link is"),
+        (content[:-1], None, "Received 2047 of 2048 bytes from http://link"),
+    ],
+)
+def test_link_media_upload_verifies_before_last_chunk(data, sha256, message):
+    media_upload = link_media_upload(data, sha256=sha256)
+    for begin in range(0, 1536, 512):
+        media_upload.getbytes(begin, 512)
+    with pytest.raises(BadRequestException) as e:
+        media_upload.getbytes(1536, 512)
+    assert message in str(e.value)
+    media_upload._session.get.return_value.close.assert_called()
+
+
+def test_link_media_upload_maps_http_errors():
+    media_upload = link_media_upload()
+    response = media_upload._session.get.return_value
+    response.raise_for_status.side_effect = requests.HTTPError("403 Forbidden")
+
+    with pytest.raises(BadRequestException) as e:
+        media_upload.getbytes(0, 512)
+    assert "Failed to download http://link: 403 Forbidden" in str(e.value)
+    response.close.assert_called_once_with()
+
+
+def test_link_media_upload_closes_on_read_error():
+    media_upload = link_media_upload()
+    response = media_upload._session.get.return_value
+    response.iter_content.side_effect = None
+    response.iter_content.return_value = MagicMock(
+        __next__=MagicMock(side_effect=requests.ConnectionError("reset"))
+    )
+
+    with pytest.raises(requests.ConnectionError):
+        media_upload.getbytes(0, 512)
+    response.close.assert_called_once_with()
+
+
+def test_link_media_upload_close():
+    media_upload = link_media_upload()
+    media_upload.close()
+    media_upload.getbytes(0, 512)
+    media_upload.close()
+    media_upload._session.get.return_value.close.assert_called_once_with()
+
+
+KiB = 1024
+
+
+class FakeUploadHttp:
+    """Resumable upload endpoint, failing the chunks listed in failures."""
+
+    def __init__(self, failures=()):
+        self.received = bytearray()
+        self.chunk_sizes = []
+        self.status_queries = 0
+        self.failures = list(failures)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if uri == "http://upload/init":
+            return (
+                httplib2.Response({"status": "200", "location": "http://upload"}),
+                b"",
+            )
+        if headers.get("Content-Range", "").startswith("bytes */"):
+            self.status_queries += 1
+            return self._incomplete(), b""
+        data = body.read() if hasattr(body, "read") else body
+        self.chunk_sizes.append(len(data))
+        failure = self.failures.pop(0) if self.failures else None
+        if isinstance(failure, int):
+            raise HttpError(httplib2.Response({"status": failure}), b"")
+        if failure is not None:
+            # Half of the chunk arrives before the connection drops.
+            self.received.extend(data[: len(data) // 2])
+            raise failure
+        self.received.extend(data)
+        total = headers["Content-Range"].split("/")[1]
+        if total != "*" and len(self.received) == int(total):
+            return httplib2.Response({"status": "200"}), b'{"versionCode": 7}'
+        return self._incomplete(), b""
+
+    def _incomplete(self):
+        info = {"status": "308"}
+        if self.received:
+            info["range"] = f"bytes=0-{len(self.received) - 1}"
+        return httplib2.Response(info)
+
+
+@pytest.fixture
+def upload_config():
+    config = {
+        "UPLOAD_MIN_CHUNK_SIZE": 256 * KiB,
+        "UPLOAD_MAX_CHUNK_SIZE": 1024 * KiB,
+        "UPLOAD_CHUNK_SECONDS": 10,
+        "RETRY_MAX_ATTEMPTS": 3,
+    }
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        with patch.object(retry_utils, "_budget", None):
+            yield main.app.config
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "app.aab"
+    path.write_bytes(bytes(range(256)) * 12 * KiB)
+    return str(path)
+
+
+def upload_request(http, media):
+    return HttpRequest(
+        http,
+        lambda resp, content: json.loads(content),
+        "http://upload/init",
+        method="POST",
+        resumable=media,
+    )
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@patch.object(media_uploads.metrics_utils, "ffwd_metric")
+def test_upload_grows_chunk_size(ffwd_metric_mock, upload_config, artifact):
+    http = FakeUploadHttp()
+    media = AdaptiveMediaFileUpload(artifact, chunksize=256 * KiB)
+
+    response = media_uploads.upload(upload_request(http, media))
+
+    assert response == {"versionCode": 7}
+    assert bytes(http.received) == read_file(artifact)
+    assert http.chunk_sizes == [256 * KiB, 512 * KiB, 1024 * KiB, 1024 * KiB, 256 * KiB]
+    progress = [
+        c[0][1] for c in ffwd_metric_mock.call_args_list if c[0][0] == "upload-progress"
+    ]
+    assert progress == [256 / 3072, 768 / 3072, 1792 / 3072, 2816 / 3072, 1.0]
+    ffwd_metric_mock.assert_any_call("upload-throughput", ANY)
+
+
+def test_upload_shrinks_chunk_size(upload_config, artifact):
+    upload_config["UPLOAD_CHUNK_SECONDS"] = 1e-9
+    http = FakeUploadHttp()
+    media = AdaptiveMediaFileUpload(artifact, chunksize=1024 * KiB)
+
+    media_uploads.upload(upload_request(http, media))
+
+    assert http.chunk_sizes[:3] == [1024 * KiB, 256 * KiB, 256 * KiB]
+    assert bytes(http.received) == read_file(artifact)
+
+
+@patch.object(retry_utils.time, "sleep")
+@patch.object(retry_utils.metrics_utils, "ffwd_metric")
+def test_upload_resumes_from_acknowledged_offset(
+    ffwd_metric_mock, sleep_mock, upload_config, artifact
+):
+    http = FakeUploadHttp([None, ConnectionError("reset"), 503])
+    media = AdaptiveMediaFileUpload(artifact, chunksize=1024 * KiB)
+
+    response = media_uploads.upload(upload_request(http, media))
+
+    assert response == {"versionCode": 7}
+    assert bytes(http.received) == read_file(artifact)
+    assert http.chunk_sizes[:3] == [1024 * KiB, 1024 * KiB, 512 * KiB]
+    assert http.status_queries == 2
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry", 1, {"operation": "upload", "reason": "connection"}
+    )
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry", 1, {"operation": "upload", "reason": "server-error"}
+    )
+    assert sleep_mock.call_count == 2
+
+
+@patch.object(retry_utils.time, "sleep")
+def test_upload_gives_up_after_retries(sleep_mock, upload_config, artifact):
+    http = FakeUploadHttp([ConnectionError("reset")] * 3)
+    media = AdaptiveMediaFileUpload(artifact, chunksize=256 * KiB)
+
+    with pytest.raises(ConnectionError):
+        media_uploads.upload(upload_request(http, media))
+    assert len(http.chunk_sizes) == 3
+
+
+@patch.object(retry_utils.time, "sleep")
+def test_upload_does_not_resume_client_errors(sleep_mock, upload_config, artifact):
+    http = FakeUploadHttp([403])
+    media = AdaptiveMediaFileUpload(artifact, chunksize=256 * KiB)
+
+    with pytest.raises(HttpError):
+        media_uploads.upload(upload_request(http, media))
+    sleep_mock.assert_not_called()
+
+
+def test_upload_executes_non_resumable_request():
+    request = MagicMock(resumable=None)
+    assert media_uploads.upload(request) is request.execute.return_value
+    request.execute.assert_called_once_with()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest.mock import patch
+
+from android_store_service.utils import metrics_utils
+
+
+@patch.object(metrics_utils, "_metric_relay", None)
+@patch.object(metrics_utils, "shumway")
+def test_ffwd_metric(shumway_mock):
+    relay = metrics_utils.setup_metrics(
+        {"METRICS_KEY": "key", "METRICS_FFWD_HOST": "host"}
+    )
+    attrs = {"endpoint": "foo"}
+
+    metrics_utils.ffwd_metric("metric", 1, attrs)
+
+    shumway_mock.MetricRelay.assert_called_once_with("key", "host")
+    relay.emit.assert_called_once_with(
+        "metric", 1, attributes={"endpoint": "foo", "project": "some_project"}
+    )
+    assert attrs == {"endpoint": "foo"}
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import io
+import json
+
+import pytest
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.main import app
+from android_store_service.utils import multipart_form
+from android_store_service.utils.file_utils import StagedFile
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def multipart_request(data):
+    return app.test_request_context(
+        "/", method="POST", data=data, content_type="multipart/form-data"
+    )
+
+
+metadata = {
+    "tracks": ["alpha"],
+    "bundles": [
+        {"sha1": "1", "sha256": "2", "media_body": "bundle", "deobfuscation_file": ""},
+        {"sha1": "3", "sha256": "4", "media_body": "other", "deobfuscation_file": "m"},
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "metadata_part",
+    [json.dumps(metadata), (io.BytesIO(json.dumps(metadata).encode()), "meta.json")],
+)
+def test_load(tmp_path, metadata_part):
+    data = {
+        "metadata": metadata_part,
+        "bundle": (io.BytesIO(b"\x00bundle"), "app.aab"),
+        "other": (io.BytesIO(b"\x01other"), "other.aab"),
+        "m": (io.BytesIO(b"mapping"), "mapping.txt"),
+    }
+    with multipart_request(data) as ctx:
+        result = multipart_form.load(ctx.request, tmp_path)
+
+    assert result["tracks"] == ["alpha"]
+    first, second = result["bundles"]
+    assert isinstance(first["media_body"], StagedFile)
+    assert read_file(first["media_body"]) == b"\x00bundle"
+    assert first["media_body"].sha1 == hashlib.sha1(b"\x00bundle").hexdigest()
+    assert first["media_body"].sha256 == hashlib.sha256(b"\x00bundle").hexdigest()
+    assert first["deobfuscation_file"] == ""
+    assert read_file(second["media_body"]) == b"\x01other"
+    assert read_file(second["deobfuscation_file"]) == b"mapping"
+    assert str(tmp_path) in first["media_body"]
+
+
+negative_params = [
+    ({"bundle": (io.BytesIO(b"bundle"), "app.aab")}, "Missing 'metadata' part"),
+    ({"metadata": "{not json"}, "Invalid JSON in 'metadata' part"),
+    ({"metadata": json.dumps(metadata)}, "Missing file part 'bundle'"),
+    (
+        {"metadata": json.dumps(metadata), "bundle": "not a file", "other": "x"},
+        "Missing file part 'bundle'",
+    ),
+]
+
+
+@pytest.mark.parametrize("data,exp_message", negative_params)
+def test_load_negative(tmp_path, data, exp_message):
+    with multipart_request(data) as ctx:
+        with pytest.raises(BadRequestException) as e:
+            multipart_form.load(ctx.request, tmp_path)
+    assert exp_message in str(e.value)
+
+
+def test_load_missing_boundary(tmp_path):
+    with app.test_request_context(
+        "/", method="POST", data=b"foo", content_type="multipart/form-data"
+    ) as ctx:
+        with pytest.raises(BadRequestException) as e:
+            multipart_form.load(ctx.request, tmp_path)
+    assert "Invalid multipart payload" in str(e.value)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import multiprocessing
+from unittest.mock import patch
+
+import pytest
+from freezegun import freeze_time
+
+from android_store_service import main
+from android_store_service.exceptions import TooManyRequestsException
+from android_store_service.utils import rate_limiter
+
+
+@pytest.fixture
+def rate_limit_config():
+    config = {"RATE_LIMIT_RATE": 2, "RATE_LIMIT_BURST": 3, "RATE_LIMIT_WAIT": 5}
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        with patch.object(rate_limiter, "_buckets", {}):
+            yield main.app.config
+
+
+@pytest.fixture
+def clock():
+    with freeze_time("2021-06-01 12:00:00") as frozen:
+        with patch.object(rate_limiter.time, "sleep", side_effect=frozen.tick):
+            yield frozen
+
+
+def test_acquire_without_rate_limit():
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"RATE_LIMIT_RATE": None}):
+            for _ in range(100):
+                rate_limiter.acquire("googleplayapiaccess")
+
+
+@patch.object(rate_limiter.metrics_utils, "ffwd_metric")
+def test_acquire_waits_for_tokens(ffwd_metric_mock, rate_limit_config, clock):
+    for _ in range(3):
+        rate_limiter.acquire("googleplayapiaccess")
+    rate_limiter.time.sleep.assert_not_called()
+
+    rate_limiter.acquire("googleplayapiaccess")
+    rate_limiter.time.sleep.assert_called_once_with(0.5)
+    rate_limiter.acquire("com.other")
+    rate_limiter.time.sleep.assert_called_once()
+
+    attrs = {"secret": "googleplayapiaccess"}
+    ffwd_metric_mock.assert_any_call("play-api-rate-limit-queued", 1, attrs)
+    ffwd_metric_mock.assert_any_call("play-api-rate-limit-wait", 0.5, attrs)
+
+
+@patch.object(rate_limiter.metrics_utils, "ffwd_metric")
+def test_acquire_rejects_after_wait(ffwd_metric_mock, rate_limit_config, clock):
+    rate_limit_config["RATE_LIMIT_RATE"] = 0.1
+    for _ in range(3):
+        rate_limiter.acquire("googleplayapiaccess")
+
+    with pytest.raises(TooManyRequestsException) as e:
+        rate_limiter.acquire("googleplayapiaccess")
+    assert e.value.code == 429
+    assert e.value.retry_after == 10
+    rate_limiter.time.sleep.assert_not_called()
+    ffwd_metric_mock.assert_any_call(
+        "play-api-rate-limit-rejected", 1, {"secret": "googleplayapiaccess"}
+    )
+
+    rate_limiter.acquire("googleplayapiaccess", wait=10)
+    rate_limiter.time.sleep.assert_called_once_with(pytest.approx(10))
+
+
+def _acquire_in_worker(path, results):
+    config = {"RATE_LIMIT_RATE": 0.001, "RATE_LIMIT_BURST": 5, "RATE_LIMIT_PATH": path}
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        for _ in range(4):
+            try:
+                rate_limiter.acquire("googleplayapiaccess", wait=0)
+                results.put(True)
+            except TooManyRequestsException:
+                results.put(False)
+
+
+def test_acquire_shares_buckets_between_workers(tmp_path):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_acquire_in_worker, args=(str(tmp_path), results))
+        for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+
+    acquired = [results.get(timeout=5) for _ in range(12)]
+    assert acquired.count(True) == 5
+    assert (tmp_path / "googleplayapiaccess.json").exists()
+
+
+def test_too_many_requests_response():
+    with main.app.test_request_context():
+        response = main.handle_retry_later(
+            TooManyRequestsException("Rate limit exceeded", retry_after=3)
+        )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert response.get_json() == {"error": {"message": "Rate limit exceeded"}}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import email.utils
+import json
+import socket
+import time
+from unittest.mock import Mock, call, patch
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from android_store_service import main
+from android_store_service.utils import retry_utils
+from android_store_service.utils.retry_utils import RetryBudget
+
+
+def http_error(status, reason=None, **headers):
+    content = {"error": {"code": status, "errors": [{"reason": reason}]}}
+    return HttpError(
+        httplib2.Response({"status": status, **headers}), json.dumps(content).encode()
+    )
+
+
+@pytest.fixture(autouse=True)
+def retry_config():
+    config = {
+        "RETRY_MAX_ATTEMPTS": 4,
+        "RETRY_BASE_DELAY": 1,
+        "RETRY_MAX_DELAY": 5,
+        "RETRY_DEADLINE": 60,
+        "RETRY_BUDGET_MAX": 10,
+        "RETRY_BUDGET_RATIO": 0.5,
+    }
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        with patch.object(retry_utils, "_budget", None):
+            with patch.object(retry_utils.time, "sleep") as sleep_mock:
+                yield sleep_mock
+
+
+@pytest.mark.parametrize(
+    "error,reason",
+    [
+        (http_error(429), "rate-limit"),
+        (http_error(403, "userRateLimitExceeded"), "rate-limit"),
+        (http_error(403, "forbidden"), None),
+        (http_error(500), "server-error"),
+        (http_error(503), "server-error"),
+        (http_error(400), None),
+        (HttpError(httplib2.Response({"status": 403}), b"not json"), None),
+        (socket.timeout("timed out"), "timeout"),
+        (ConnectionError("reset"), "connection"),
+        (ValueError("bug"), None),
+    ],
+)
+def test_retry_reason(error, reason):
+    assert retry_utils.retry_reason(error) == reason
+
+
+@patch.object(retry_utils.random, "uniform", lambda low, high: high)
+@patch.object(retry_utils.metrics_utils, "ffwd_metric")
+def test_call_retries_with_exponential_backoff(ffwd_metric_mock, retry_config):
+    function = Mock(
+        side_effect=[http_error(500), ConnectionError(), http_error(503), 7]
+    )
+
+    assert retry_utils.call(function, "edits.insert") == 7
+
+    assert function.call_count == 4
+    assert retry_config.call_args_list == [call(2), call(4), call(5)]
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry", 1, {"operation": "edits.insert", "reason": "connection"}
+    )
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry-delay",
+        5,
+        {"operation": "edits.insert", "reason": "server-error"},
+    )
+
+
+def test_call_gives_up_after_max_attempts(retry_config):
+    function = Mock(side_effect=http_error(500))
+    with pytest.raises(HttpError):
+        retry_utils.call(function, "edits.commit")
+    assert function.call_count == 4
+
+
+def test_call_does_not_retry_client_errors(retry_config):
+    function = Mock(side_effect=http_error(404))
+    with pytest.raises(HttpError):
+        retry_utils.call(function, "edits.commit")
+    function.assert_called_once()
+    retry_config.assert_not_called()
+
+
+@patch.object(retry_utils.random, "uniform", lambda low, high: low)
+def test_call_honors_retry_after(retry_config):
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    function = Mock(
+        side_effect=[
+            http_error(429, **{"retry-after": "12"}),
+            http_error(503, **{"retry-after": retry_at}),
+            "ok",
+        ]
+    )
+
+    assert retry_utils.call(function, "edits.tracks.list") == "ok"
+
+    first, second = [delay for (delay,), _ in retry_config.call_args_list]
+    assert first == 12
+    assert 25 < second <= 30
+
+
+@patch.object(retry_utils.metrics_utils, "ffwd_metric")
+def test_call_respects_deadline(ffwd_metric_mock, retry_config):
+    function = Mock(side_effect=http_error(429, **{"retry-after": "120"}))
+    with pytest.raises(HttpError):
+        retry_utils.call(function, "edits.insert")
+    function.assert_called_once()
+    retry_config.assert_not_called()
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry-deadline-exceeded",
+        1,
+        {"operation": "edits.insert", "reason": "rate-limit"},
+    )
+
+
+@patch.object(retry_utils.metrics_utils, "ffwd_metric")
+def test_call_respects_retry_budget(ffwd_metric_mock):
+    with patch.object(retry_utils, "_budget", RetryBudget(2, 0)):
+        function = Mock(side_effect=http_error(500))
+        with pytest.raises(HttpError):
+            retry_utils.call(function, "edits.insert")
+        assert function.call_count == 3
+
+        function.reset_mock()
+        with pytest.raises(HttpError):
+            retry_utils.call(function, "edits.insert")
+        function.assert_called_once()
+    ffwd_metric_mock.assert_any_call(
+        "play-api-retry-budget-exhausted",
+        1,
+        {"operation": "edits.insert", "reason": "server-error"},
+    )
+
+
+def test_retry_budget():
+    budget = RetryBudget(2, 0.5)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_retry_budget_is_shared():
+    budget = retry_utils.retry_budget()
+    assert retry_utils.retry_budget() is budget
+    assert budget.max_tokens == 10
+    assert budget.ratio == 0.5
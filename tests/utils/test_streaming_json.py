@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import hashlib
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+from android_store_service.exceptions import BadRequestException
+from android_store_service.utils import streaming_json
+from android_store_service.utils.file_utils import StagedFile
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+plain_documents = [
+    {},
+    [],
+    {"tracks": ["alpha", "beta"], "dry_run": True},
+    {"nested": {"list": [1, -2.5, 3e2, None, False, "", {}]}},
+    {"escaped": 'quote " backslash \\ slash / tab \t unicode å 😀'},
+    "just a string",
+    42,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+@pytest.mark.parametrize("document", plain_documents)
+def test_load_plain_documents(tmp_path, chunk_size, document):
+    for ensure_ascii in (True, False):
+        payload = json.dumps(document, ensure_ascii=ensure_ascii).encode("utf-8")
+        with patch.object(streaming_json, "_CHUNK_SIZE", chunk_size):
+            assert streaming_json.load(io.BytesIO(payload), tmp_path) == document
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64 * 1024])
+def test_load_stages_binary_fields(tmp_path, chunk_size):
+    payload = (
+        b'{"apks": [{"sha1": "123", "media_body": "SGVsbG8s\\nIFdvcmxk",'
+        b' "deobfuscation_file": "\\/\\/8="}], "tracks": ["alpha"]}'
+    )
+    with patch.object(streaming_json, "_CHUNK_SIZE", chunk_size):
+        data = streaming_json.load(io.BytesIO(payload), tmp_path)
+
+    apk = data["apks"][0]
+    assert data["tracks"] == ["alpha"]
+    assert apk["sha1"] == "123"
+    assert isinstance(apk["media_body"], StagedFile)
+    assert isinstance(apk["deobfuscation_file"], StagedFile)
+    assert read_file(apk["media_body"]) == b"Hello, World"
+    assert apk["media_body"].sha1 == hashlib.sha1(b"Hello, World").hexdigest()
+    assert apk["media_body"].sha256 == hashlib.sha256(b"Hello, World").hexdigest()
+    assert read_file(apk["deobfuscation_file"]) == b"\xff\xff"
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_load_stages_large_binary_in_chunks(tmp_path):
+    content = bytes(range(256)) * 4096
+    payload = json.dumps({"media_body": base64.b64encode(content).decode()}).encode()
+    with patch.object(streaming_json, "_CHUNK_SIZE", 1000):
+        data = streaming_json.load(io.BytesIO(payload), tmp_path)
+    assert read_file(data["media_body"]) == content
+
+
+def test_load_only_stages_string_members(tmp_path):
+    payload = b'{"media_body": null, "list": ["media_body"], "media_body_x": "a"}'
+    data = streaming_json.load(io.BytesIO(payload), tmp_path)
+    assert data == {"media_body": None, "list": ["media_body"], "media_body_x": "a"}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_load_keeps_empty_binary_strings_unstaged(tmp_path):
+    payload = b'{"media_body": "SGVsbG8s", "deobfuscation_file": ""}'
+    data = streaming_json.load(io.BytesIO(payload), tmp_path)
+    assert data["deobfuscation_file"] == ""
+    assert list(tmp_path.iterdir()) == [tmp_path / data["media_body"]]
+
+
+negative_payloads = [
+    (b"", "Unexpected end of data"),
+    (b'{"tracks": ["alpha"', "Unexpected end of data"),
+    (b'{"tracks" ["alpha"]}', "Expecting ':'"),
+    (b"{'tracks': []}", "Expecting property name"),
+    (b'{"dry_run": tru}', "Invalid JSON payload"),
+    (b'{"a": 1} {"b": 2}', "Extra data"),
+    (b'{"a": "\xff"}', "Invalid JSON payload"),
+    (b'{"media_body": "SGVsbG8"}', "Invalid base64 in 'media_body'"),
+    (b'{"media_body": "SGVsbG8sIFdvcmxk', "Unexpected end of data"),
+]
+
+
+@pytest.mark.parametrize("payload,exp_message", negative_payloads)
+def test_load_invalid_payloads(tmp_path, payload, exp_message):
+    with pytest.raises(BadRequestException) as e:
+        streaming_json.load(io.BytesIO(payload), tmp_path)
+    assert exp_message in str(e.value)
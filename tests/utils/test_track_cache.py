@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import Counter
+from unittest.mock import ANY, Mock, patch
+
+import pytest
+
+from android_store_service import main
+from android_store_service.utils import edit_pool, track_cache
+
+package_name = "com.package.name"
+
+
+@pytest.fixture
+def cache_config(tmp_path):
+    config = {"TRACKS_CACHE_TTL": 30, "TRACKS_CACHE_PATH": str(tmp_path)}
+    with main.app.app_context(), patch.dict(main.app.config, config):
+        with patch.object(track_cache, "_tracks", None):
+            with patch.object(edit_pool, "_generations", Counter()):
+                yield main.app.config
+
+
+def test_get_without_ttl():
+    load = Mock(return_value=["alpha"])
+    with main.app.app_context():
+        with patch.dict(main.app.config, {"TRACKS_CACHE_TTL": 0}):
+            assert track_cache.get(package_name, load) == (["alpha"], None)
+            assert track_cache.get(package_name, load) == (["alpha"], None)
+    assert load.call_count == 2
+
+
+@patch.object(track_cache.metrics_utils, "ffwd_metric")
+def test_get_is_shared_between_workers(ffwd_metric_mock, cache_config, tmp_path):
+    load = Mock(return_value=["alpha"])
+    assert track_cache.get(package_name, load) == (["alpha"], None)
+
+    # Another worker, with an empty in-process cache.
+    with patch.object(track_cache, "_tracks", None):
+        tracks, age = track_cache.get(package_name, load)
+    assert tracks == ["alpha"]
+    assert age >= 0
+    load.assert_called_once_with(package_name)
+    assert (tmp_path / f"{package_name}.json").exists()
+    ffwd_metric_mock.assert_any_call("tracks-cache", 1, {"result": "hit"})
+
+
+def test_invalidate(cache_config, tmp_path):
+    load = Mock(return_value=["alpha"])
+    track_cache.get(package_name, load)
+
+    track_cache.invalidate(package_name)
+    track_cache.invalidate(package_name)
+
+    assert not (tmp_path / f"{package_name}.json").exists()
+    assert track_cache.get(package_name, load) == (["alpha"], None)
+    assert load.call_count == 2
+
+
+def test_commit_in_other_worker_invalidates(cache_config, tmp_path):
+    load = Mock(return_value=["alpha"])
+    track_cache.get(package_name, load)
+
+    with patch.object(edit_pool, "_generations", Counter()):
+        edit_pool.bump_generation(package_name)
+
+    assert track_cache.get(package_name, load) == (["alpha"], None)
+    assert load.call_count == 2
+    assert (tmp_path / f"{package_name}.generation").exists()
+
+
+@patch.object(track_cache.metrics_utils, "ffwd_metric")
+def test_get_coalesces_concurrent_loads(ffwd_metric_mock, cache_config):
+    with patch.object(track_cache, "_flights") as flights_mock:
+        flights_mock.do.return_value = (["alpha"], True)
+        load = Mock()
+        assert track_cache.get(package_name, load) == (["alpha"], None)
+
+    flights_mock.do.assert_called_once_with(package_name, ANY)
+    ffwd_metric_mock.assert_any_call("tracks-coalesced", 1)
+    # Only the call that loaded the tracks caches them.
+    assert track_cache._read_file(package_name) is None